@@ -0,0 +1,98 @@
+import queue
+import threading
+import time
+
+
+class BatchWriter:
+    """
+    Takes items without touching the database and writes them from a background
+    thread in batches, whenever batch_size items are waiting or flush_interval
+    seconds have passed. put() never blocks: with max_pending set, an item that
+    doesn't fit is refused. Subclasses implement _write(batch), which handles
+    its own errors; a batch is never retried.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_pending=0, thread_name="batch-writer"):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.thread_name = thread_name
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def put(self, item):
+        """Queues item for the writer thread; False if the queue is full."""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return False
+        self._ensure_thread()
+        return True
+
+    def pending(self):
+        """Items put but not yet written, counting a batch being written."""
+        return self._queue.unfinished_tasks
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        try:
+            self._write(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _drain(self, max_items):
+        batch = []
+        while len(batch) < max_items:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Writes everything put so far before returning."""
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                self._write_batch(batch)
+        # A batch the writer thread already took off the queue is written by it
+        self._queue.join()
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name=self.thread_name)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                with self._flush_lock:
+                    self._write_batch(batch)
+
+    def shutdown(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
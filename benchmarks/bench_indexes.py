@@ -0,0 +1,153 @@
+"""
+Query plans and timings for the hot recipient/unsubscribe/log queries, first
+with the old single-column indexes and then with the migration 1 indexes.
+
+    python benchmarks/bench_indexes.py [users] [recipients_per_user]
+
+Seeds a throwaway SQLite file by default; set BENCH_DATABASE_URL to run it
+against a local Postgres database instead (its tables are dropped and rebuilt).
+"""
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL", f"sqlite:///{_tmpdir}/bench.db")
+
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from database import engine, Base
+from migrations import INDEXES_0001
+
+OLD_INDEXES = [
+    "CREATE INDEX ix_recipients_user_id ON recipients (user_id)",
+    "CREATE INDEX ix_recipients_email ON recipients (email)",
+    "CREATE INDEX ix_unsubscribes_user_id ON unsubscribes (user_id)",
+    "CREATE INDEX ix_unsubscribes_email ON unsubscribes (email)",
+    "CREATE INDEX ix_campaign_logs_user_id ON campaign_logs (user_id)",
+]
+
+QUERIES = {
+    "status counts": (
+        "SELECT status, COUNT(id) FROM recipients WHERE user_id = :uid GROUP BY status",
+        {},
+    ),
+    "pending chunk (keyset)": (
+        "SELECT id, email, data FROM recipients"
+        " WHERE user_id = :uid AND status = 'pending' AND id > :after ORDER BY id LIMIT 500",
+        {"after": 0},
+    ),
+    "unsubscribe lookup": (
+        "SELECT 1 FROM unsubscribes WHERE user_id = :uid AND email = :email",
+        {"email": "person42@example.com"},
+    ),
+    "log tail": (
+        "SELECT timestamp, message FROM campaign_logs WHERE user_id = :uid ORDER BY timestamp DESC LIMIT 200",
+        {},
+    ),
+}
+
+# A campaign 70% of the way through: rows are sent in id order, so the pending
+# tail sits behind every row that was already processed.
+DONE_FRACTION = 0.7
+DONE_STATUSES = ["sent"] * 9 + ["failed"]
+
+
+def seed(users, per_user):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(7)
+    start = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        for u in range(users):
+            uid = f"user-{u}"
+            conn.execute(text(
+                "INSERT INTO recipients (user_id, email, data, status, created_at) VALUES (:uid, :email, '{}', :status, :ts)"
+            ), [
+                {"uid": uid, "email": f"person{i}@example.com", "status": "pending" if i >= per_user * DONE_FRACTION else rng.choice(DONE_STATUSES), "ts": start}
+                for i in range(per_user)
+            ])
+            conn.execute(text(
+                "INSERT INTO unsubscribes (user_id, email, created_at) VALUES (:uid, :email, :ts)"
+            ), [
+                {"uid": uid, "email": f"person{i}@example.com", "ts": start}
+                for i in range(0, per_user, 20)
+            ])
+            conn.execute(text(
+                "INSERT INTO campaign_logs (user_id, timestamp, message, type) VALUES (:uid, :ts, :msg, 'info')"
+            ), [
+                {"uid": uid, "ts": start + timedelta(seconds=rng.randrange(10 ** 7)), "msg": f"Sent to person{i}@example.com"}
+                for i in range(per_user // 2)
+            ])
+
+
+def drop_all_indexes(conn):
+    for ddl in OLD_INDEXES + INDEXES_0001:
+        name = re.search(r"INDEX (?:IF NOT EXISTS )?(\w+)", ddl).group(1)
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def use_indexes(statements):
+    with engine.begin() as conn:
+        drop_all_indexes(conn)
+        for ddl in statements:
+            conn.execute(text(ddl))
+        conn.execute(text("ANALYZE"))
+
+
+def explain(conn, sql, params):
+    if engine.dialect.name == "postgresql":
+        rows = conn.execute(text("EXPLAIN ANALYZE " + sql), params).all()
+        return [r[0] for r in rows]
+    rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).all()
+    return [r[-1] for r in rows]
+
+
+def time_query(conn, sql, params, repeat=50):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(text(sql), params).all()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def run(label, uid):
+    print(f"\n== {label} ==")
+    results = {}
+    with engine.connect() as conn:
+        for name, (sql, extra) in QUERIES.items():
+            params = {"uid": uid, **extra}
+            results[name] = time_query(conn, sql, params)
+            print(f"{name:24} {results[name]:8.3f} ms")
+            for line in explain(conn, sql, params):
+                print(f"    {line}")
+    return results
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    print(f"Seeding {users} users x {per_user} recipients on {engine.dialect.name}...")
+    seed(users, per_user)
+    uid = f"user-{users // 2}"
+
+    use_indexes(OLD_INDEXES)
+    before = run("single-column indexes", uid)
+    use_indexes(INDEXES_0001)
+    after = run("migration 1 indexes", uid)
+
+    print("\nspeedup (median)")
+    for name in QUERIES:
+        print(f"{name:24} {before[name] / after[name]:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares building each message with MIMEMultipart/MIMEText + send_message-style
+serialization against the cached MessageSkeleton, in time per message and peak
+allocated memory.
+
+    python benchmarks/bench_message_build.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+from email import message_from_bytes
+from email.generator import BytesGenerator
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_builder import MessageSkeleton
+
+SUBJECT = "How Ghanaians Are Making ₵200–₵500/Day With AI & Phone"
+FROM_NAME = "MG from Prmoted"
+FROM_EMAIL = "sender@example.com"
+
+
+def mime_bytes(to, html):
+    # What the send loop did before: build the tree, then send_message flattens it
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = SUBJECT
+    msg["From"] = formataddr((FROM_NAME, FROM_EMAIL))
+    msg["To"] = to
+    msg.attach(MIMEText(html, "html"))
+    buf = BytesIO()
+    BytesGenerator(buf).flatten(msg, linesep="\r\n")
+    return buf.getvalue()
+
+
+def peak_allocated(fn, n=50):
+    """Peak bytes traced by tracemalloc while building n messages."""
+    tracemalloc.start()
+    for i in range(n):
+        fn(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(template_kb, number=200):
+    html = ("<p>Akwaaba! Ɛte sɛn? ₵200–₵500 per day.</p>\n" * (template_kb * 1024 // 45))
+    skeleton = MessageSkeleton(SUBJECT, FROM_NAME, FROM_EMAIL)
+
+    parsed = message_from_bytes(skeleton.build("ama@example.com", html))
+    assert parsed.get_payload()[0].get_payload(decode=True).decode("utf-8") == html
+
+    old = min(timeit.repeat(lambda: mime_bytes("ama@example.com", html), number=number, repeat=3)) / number
+    new = min(timeit.repeat(lambda: skeleton.build("ama@example.com", html), number=number, repeat=3)) / number
+    old_peak = peak_allocated(lambda i: mime_bytes(f"r{i}@example.com", html))
+    new_peak = peak_allocated(lambda i: skeleton.build(f"r{i}@example.com", html))
+    print(f"{template_kb:>4} KB   MIME objects {old * 1e6:9.1f} us  peak {old_peak / 1024:8.1f} KB   "
+          f"skeleton {new * 1e6:8.1f} us  peak {new_peak / 1024:8.1f} KB   speedup {old / new:5.1f}x")
+
+
+if __name__ == "__main__":
+    for kb in (5, 50, 200):
+        run(kb)
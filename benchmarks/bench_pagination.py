@@ -0,0 +1,105 @@
+"""
+First-page vs deep-page latency for the cursor-paginated /recipients and
+/history endpoints, plus a check that paging through returns every row once.
+
+    python benchmarks/bench_pagination.py [recipients] [log_lines]
+
+Seeds a throwaway SQLite file by default; set BENCH_DATABASE_URL to use another
+database (its tables are dropped and rebuilt).
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from database import engine, Base, init_db, session_scope, CampaignLog, Recipient
+import server
+
+USER = "bench-user"
+STATUSES = ["sent"] * 6 + ["pending"] * 3 + ["failed"]
+REPEATS = 20
+
+
+class BenchUser:
+    id = USER
+
+
+def seed(recipients, log_lines):
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    with session_scope() as db:
+        rows = [
+            {"user_id": USER, "email": f"person{i:07d}@example.com", "status": rng.choice(STATUSES),
+             "data": {"first_name": f"Name{i}", "company": "Example"}, "created_at": start}
+            for i in range(recipients)
+        ]
+        for i in range(0, len(rows), 10000):
+            db.execute(Recipient.__table__.insert(), rows[i:i + 10000])
+        logs = [
+            {"user_id": USER, "timestamp": start + timedelta(seconds=i), "message": f"SUCCESS -> person{i:07d}@example.com", "type": "info"}
+            for i in range(log_lines)
+        ]
+        for i in range(0, len(logs), 10000):
+            db.execute(CampaignLog.__table__.insert(), logs[i:i + 10000])
+
+
+def timed(client, path, params):
+    samples = []
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        r = client.get(path, params=params)
+        samples.append(time.perf_counter() - t0)
+        assert r.status_code == 200, r.text
+    return statistics.median(samples) * 1000, r.json()
+
+
+def walk(client, path, key, params):
+    """Pages through everything; returns (rows seen, pages, cursor of the last full page)."""
+    seen, pages, cursor, last = [], 0, None, None
+    while True:
+        r = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        seen.extend(r[key])
+        pages += 1
+        if not r["next_cursor"]:
+            return seen, pages, last
+        last = cursor = r["next_cursor"]
+
+
+def main():
+    recipients = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    log_lines = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    seed(recipients, log_lines)
+    server.app.dependency_overrides[server.get_current_user] = lambda: BenchUser()
+    client = TestClient(server.app)
+
+    cases = [
+        ("/recipients", "recipients", {"limit": 500}),
+        ("/recipients", "recipients", {"limit": 500, "status": "pending"}),
+        ("/recipients", "recipients", {"limit": 500, "sort": "email", "order": "desc"}),
+        ("/recipients", "recipients", {"limit": 100, "status": "sent", "q": "person001", "sort": "email"}),
+        ("/history", "logs", {"limit": 500}),
+        ("/history", "logs", {"limit": 200, "q": "person00"}),
+    ]
+    for path, key, params in cases:
+        seen, pages, deep_cursor = walk(client, path, key, params)
+        unique = len({json.dumps(r, sort_keys=True) for r in seen})
+        first_ms, _ = timed(client, path, params)
+        deep_ms, _ = timed(client, path, {**params, "cursor": deep_cursor}) if deep_cursor else (first_ms, None)
+        print(f"{path} {params}: {len(seen)} rows in {pages} pages ({unique} distinct); "
+              f"first page {first_ms:.1f}ms, last page {deep_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
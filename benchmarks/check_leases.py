@@ -0,0 +1,124 @@
+"""
+Runs several worker processes against one database to check that due schedules
+fire exactly once and that a user's campaign lease is never held twice.
+
+    python benchmarks/check_leases.py [workers] [schedules]
+
+Uses a throwaway SQLite file by default; set BENCH_DATABASE_URL to point every
+worker at a local Postgres database instead (its schedules and leases are wiped).
+Exits non-zero on a duplicate trigger or overlapping leases.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Spawned workers re-import this module and inherit the URL chosen by the parent
+if "BENCH_DATABASE_URL" not in os.environ:
+    os.environ["BENCH_DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/leases.db"
+os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+
+from datetime import datetime, timedelta
+
+CONTENDED_USER = "contended-user"
+ROUNDS = 40
+
+
+class StubManager:
+    """Stands in for EmailManager: takes the lease and holds it for a moment."""
+
+    def __init__(self, user_id, events):
+        self.user_id = user_id
+        self.events = events
+        self.is_running = False
+
+    def start_process(self):
+        from leases import campaign_leases
+        token = campaign_leases.acquire(self.user_id)
+        if not token:
+            return False
+        self.is_running = True
+        self.events.put(("trigger", self.user_id, os.getpid()))
+
+        def finish():
+            time.sleep(0.5)
+            self.is_running = False
+            campaign_leases.release(token)
+        threading.Thread(target=finish, daemon=True).start()
+        return True
+
+
+def worker(start_at, events):
+    from leases import campaign_leases
+    from scheduler import CampaignScheduler
+
+    managers = {}
+    scheduler = CampaignScheduler(lambda uid: managers.setdefault(uid, StubManager(uid, events)))
+    scheduler.start_scheduler()
+
+    # Meanwhile, race the other workers for one user's lease
+    time.sleep(max(0, start_at - time.time()))
+    for _ in range(ROUNDS):
+        token = campaign_leases.acquire(CONTENDED_USER)
+        if token:
+            held_from = time.time()
+            time.sleep(0.01)
+            events.put(("lease", held_from, time.time()))
+            campaign_leases.release(token)
+        time.sleep(0.005)
+
+    time.sleep(6)
+    scheduler.stop_scheduler()
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    schedules = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    from database import init_db, session_scope, Schedule, CampaignLease
+    init_db()
+    due = datetime.now() + timedelta(seconds=3)
+    with session_scope() as db:
+        db.query(Schedule).delete()
+        db.query(CampaignLease).delete()
+        for i in range(schedules):
+            db.add(Schedule(user_id=f"user-{i}", name=f"campaign {i}", scheduled_time=due, recurring="none", status="pending"))
+
+    ctx = multiprocessing.get_context("spawn")
+    events = ctx.Queue()
+    start_at = time.time() + 2
+    procs = [ctx.Process(target=worker, args=(start_at, events)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    triggers, leases = [], []
+    while not events.empty():
+        event = events.get()
+        (triggers if event[0] == "trigger" else leases).append(event[1:])
+
+    with session_scope() as db:
+        completed = db.query(Schedule).filter(Schedule.status == "completed").count()
+
+    users = [t[0] for t in triggers]
+    pids = {t[1] for t in triggers}
+    leases.sort()
+    overlaps = sum(1 for a, b in zip(leases, leases[1:]) if b[0] < a[1])
+
+    print(f"workers={workers} schedules={schedules}")
+    print(f"triggers={len(triggers)} distinct_users={len(set(users))} completed_rows={completed} triggering_workers={len(pids)}")
+    print(f"contended lease acquisitions={len(leases)} overlaps={overlaps}")
+
+    ok = len(users) == len(set(users)) == schedules == completed and overlaps == 0
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Latency and throughput of the dashboard's read endpoints under concurrent load,
+against a real uvicorn server and a local database.
+
+    python benchmarks/load_api.py [--app-dir DIR] [--requests N] [--concurrency C]
+
+--app-dir points at a checkout of the app (default: this one), so two versions
+can be compared on the same machine, e.g. one from `git worktree add`. Seeds a
+throwaway SQLite file by default; set BENCH_DATABASE_URL to use another database
+(its tables are dropped and rebuilt). Tokens are signed locally with a
+throwaway SUPABASE_JWT_SECRET, so Supabase is never called.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JWT_SECRET = "load-test-secret"
+USERS = [f"load-user-{i}" for i in range(4)]
+STATUSES = ["sent"] * 6 + ["pending"] * 3 + ["failed"]
+
+ENDPOINTS = [
+    ("/status", {}),
+    ("/analytics", {}),
+    ("/recipients", {"limit": 100}),
+    ("/recipients", {"limit": 100, "status": "pending"}),
+    ("/history", {"limit": 100}),
+    ("/template", {}),
+]
+
+
+def label(path, params):
+    return path + ("?" + "&".join(f"{k}={v}" for k, v in params.items()) if params else "")
+
+
+def token(user_id):
+    def b64(data):
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+    header = b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = b64(json.dumps({"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600}).encode())
+    signature = hmac.new(JWT_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64(signature)}"
+
+
+def seed(app_dir, recipients, log_lines):
+    # Uses the app's own models, so the schema is whatever that checkout expects
+    sys.path.insert(0, app_dir)
+    from datetime import datetime, timedelta
+    from database import engine, Base, init_db, session_scope, CampaignLog, Recipient
+    from template_store import template_store
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    rng = random.Random(7)
+    start = datetime(2024, 1, 1)
+    with session_scope() as db:
+        for user_id in USERS:
+            rows = [
+                {"user_id": user_id, "email": f"person{i:07d}@example.com", "status": rng.choice(STATUSES),
+                 "data": {"first_name": f"Name{i}", "company": "Example"}, "created_at": start}
+                for i in range(recipients)
+            ]
+            for i in range(0, len(rows), 10000):
+                db.execute(Recipient.__table__.insert(), rows[i:i + 10000])
+            logs = [
+                {"user_id": user_id, "timestamp": start + timedelta(seconds=i), "message": f"SUCCESS -> person{i:07d}@example.com", "type": "info"}
+                for i in range(log_lines)
+            ]
+            for i in range(0, len(logs), 10000):
+                db.execute(CampaignLog.__table__.insert(), logs[i:i + 10000])
+    for user_id in USERS:
+        template_store.save(user_id, "<html><body>Hi {first_name}</body></html>")
+    engine.dispose()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cpu_seconds(pid):
+    # CPU used by the server process, from /proc (None elsewhere). On a machine
+    # where client and server share cores, ms of server CPU per request is the
+    # figure to compare; requests/s partly measures the client.
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def start_server(app_dir, port, env):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/status").status_code == 401:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+async def hammer(base_url, total, concurrency):
+    headers = {user_id: {"Authorization": f"Bearer {token(user_id)}"} for user_id in USERS}
+    latencies = {label(path, params): [] for path, params in ENDPOINTS}
+    errors = 0
+    issued = 0
+
+    async def worker(client, rng):
+        nonlocal errors, issued
+        while issued < total:
+            issued += 1
+            path, params = rng.choice(ENDPOINTS)
+            t0 = time.perf_counter()
+            r = await client.get(path, params=params, headers=headers[rng.choice(USERS)])
+            latencies[label(path, params)].append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # Warm up caches and pools before measuring
+        for path, params in ENDPOINTS:
+            for user_id in USERS:
+                await client.get(path, params=params, headers=headers[user_id])
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, random.Random(i)) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(samples, p):
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-dir", default=ROOT)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--recipients", type=int, default=50000, help="per user")
+    parser.add_argument("--log-lines", type=int, default=20000, help="per user")
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app_dir)
+
+    env = dict(os.environ)
+    env["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/load.db"
+    env["SUPABASE_JWT_SECRET"] = JWT_SECRET
+    os.environ.update(env)
+    seed(app_dir, args.recipients, args.log_lines)
+
+    port = free_port()
+    server = start_server(app_dir, port, env)
+    try:
+        cpu_before = cpu_seconds(server.pid)
+        latencies, errors, elapsed = asyncio.run(hammer(f"http://127.0.0.1:{port}", args.requests, args.concurrency))
+        cpu_after = cpu_seconds(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    everything = [s for samples in latencies.values() for s in samples]
+    print(f"{app_dir}: {len(everything)} requests, concurrency {args.concurrency}, {errors} errors")
+    print(f"{'endpoint':<40} {'n':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, samples in latencies.items():
+        print(f"{name:<40} {len(samples):>6} {percentile(samples, 50):>8.1f} {percentile(samples, 99):>8.1f}")
+    print(f"{'all':<40} {len(everything):>6} {percentile(everything, 50):>8.1f} {percentile(everything, 99):>8.1f}")
+    print(f"throughput: {len(everything) / elapsed:.0f} requests/s")
+    if cpu_before is not None:
+        # Includes the warm-up requests, which are few
+        print(f"server CPU: {1000 * (cpu_after - cpu_before) / len(everything):.2f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Load test for open tracking.
+
+    python benchmarks/load_tracking.py writer [events]
+        Feeds the TrackingWriter directly and reports how many events per second
+        reach tracking_events / campaign_counters.
+    python benchmarks/load_tracking.py http [seconds] [concurrency]
+        Serves the app with uvicorn in a separate process and hammers
+        GET /track/open, reporting requests per second, latency percentiles and
+        how long the writer takes to catch up.
+
+Uses a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+"""
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["DATABASE_URL"] = os.environ.get("BENCH_DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/tracking.db")
+
+from sqlalchemy import func
+from database import init_db, session_scope, CampaignCounter, TrackingEvent
+
+CAMPAIGNS = 20
+RECIPIENTS = 5000
+
+
+def random_open(rng):
+    return "u1", f"campaign-{rng.randrange(CAMPAIGNS)}", f"person{rng.randrange(RECIPIENTS)}@example.com"
+
+
+def wait_for_writer(writer, expected, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = writer.stats()
+        if stats["written"] + stats["dropped"] >= expected:
+            return stats
+        time.sleep(0.05)
+    return writer.stats()
+
+
+def counters_total():
+    with session_scope() as db:
+        opens, unique_opens = db.query(func.sum(CampaignCounter.opens), func.sum(CampaignCounter.unique_opens)).one()
+        events = db.query(func.count(TrackingEvent.id)).scalar()
+    return events, opens or 0, unique_opens or 0
+
+
+def run_writer(events):
+    from tracking import TrackingWriter
+    # Room for the whole burst, so this measures write throughput rather than shedding
+    tracking = TrackingWriter(max_pending=events)
+    rng = random.Random(1)
+    opens = [random_open(rng) for _ in range(events)]
+
+    start = time.perf_counter()
+    for user_id, campaign_id, email in opens:
+        tracking.record("open", user_id, campaign_id, email, "bench")
+    enqueued = time.perf_counter() - start
+    stats = wait_for_writer(tracking, events)
+    elapsed = time.perf_counter() - start
+
+    stored, counted, unique = counters_total()
+    print(f"events={events} enqueue={events / enqueued:,.0f}/s end-to-end={stats['written'] / elapsed:,.0f}/s")
+    print(f"batches={stats['batches']} dropped={stats['dropped']}")
+    print(f"tracking_events={stored} counter opens={counted} unique_opens={unique} "
+          f"(expected unique {len(set(opens))})")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def hammer(base_url, seconds, concurrency):
+    import httpx
+    latencies = []
+    rng = random.Random(2)
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client):
+        while time.perf_counter() < deadline:
+            user_id, campaign_id, email = random_open(rng)
+            t0 = time.perf_counter()
+            r = await client.get("/track/open", params={"email": email, "uid": user_id, "cid": campaign_id})
+            latencies.append(time.perf_counter() - t0)
+            assert r.status_code == 200
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+    return latencies
+
+
+def wait_for_events(expected, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stored = counters_total()[0]
+        if stored >= expected:
+            break
+        time.sleep(0.2)
+    return counters_total()
+
+
+def run_http(seconds, concurrency):
+    port = free_port()
+    # The server runs in its own process so the load generator doesn't share its GIL
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy(),
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        start = time.perf_counter()
+        latencies = asyncio.run(hammer(f"http://127.0.0.1:{port}", seconds, concurrency))
+        requests = len(latencies)
+        stored, counted, unique = wait_for_events(requests)
+        drained = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"requests={requests} in {seconds}s -> {requests / seconds:,.0f} req/s (concurrency {concurrency})")
+    print(f"latency p50={p(0.50):.2f}ms p99={p(0.99):.2f}ms mean={statistics.mean(latencies) * 1000:.2f}ms")
+    print(f"tracking_events={stored} counter opens={counted} unique_opens={unique} "
+          f"(all written {drained - seconds:.1f}s after the load stopped)")
+
+
+def main():
+    init_db()
+    mode = sys.argv[1] if len(sys.argv) > 1 else "writer"
+    if mode == "writer":
+        run_writer(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+    elif mode == "http":
+        run_http(int(sys.argv[2]) if len(sys.argv) > 2 else 10, int(sys.argv[3]) if len(sys.argv) > 3 else 50)
+    else:
+        sys.exit(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Stress test for connection lifecycle: many threads poll the EmailManager helpers
+the dashboard and send loop use, then the pool must have every connection back.
+
+    DATABASE_URL=postgresql://localhost/mailflow python benchmarks/stress_pool.py
+    python benchmarks/stress_pool.py            # local SQLite file
+
+Exits non-zero if connections leak or any checkout timed out.
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "mailflow_stress.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_db, session_scope, pool_stats, Recipient, SendQueueItem, SMTPConfig
+from email_manager import EmailManager
+from campaign_logger import campaign_log
+from send_queue import send_queue
+
+THREADS = 40
+ROUNDS = 50
+USERS = 4
+
+
+def seed():
+    init_db()
+    with session_scope() as db:
+        for u in range(USERS):
+            user_id = f"stress-{u}"
+            db.query(SendQueueItem).filter(SendQueueItem.user_id == user_id).delete()
+            db.query(Recipient).filter(Recipient.user_id == user_id).delete()
+            db.query(SMTPConfig).filter(SMTPConfig.user_id == user_id).delete()
+            db.add_all(Recipient(user_id=user_id, email=f"r{i}@example.com") for i in range(200))
+            db.add(SMTPConfig(user_id=user_id, server="smtp.example.com", port=587,
+                              email=f"sender{u}@example.com", password="x"))
+    for u in range(USERS):
+        send_queue.prepare(f"stress-{u}")
+
+
+def poll(manager, rounds):
+    # What one dashboard tab plus the send loop do, with every cache bypassed
+    for i in range(rounds):
+        manager.invalidate_status()
+        manager.get_status()
+        manager.get_configs()
+        manager.get_analytics()
+        manager.is_unsubscribed(f"r{i}@example.com")
+        # The send loop's reads: the next chunk of the outbox and the next retry
+        send_queue.ready_chunk(manager.user_id, 0, manager.RECIPIENT_CHUNK_SIZE)
+        send_queue.next_retry_at(manager.user_id)
+
+
+def main():
+    seed()
+    managers = [EmailManager(f"stress-{u}") for u in range(USERS)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        futures = [pool.submit(poll, managers[t % USERS], ROUNDS) for t in range(THREADS)]
+        for f in futures:
+            f.result()
+    elapsed = time.perf_counter() - start
+    campaign_log.shutdown()
+
+    stats = pool_stats()
+    calls = THREADS * ROUNDS * 7
+    print(f"{calls} helper calls from {THREADS} threads in {elapsed:.2f}s")
+    for k, v in stats.items():
+        print(f"  {k:>18}: {v}")
+
+    leaked = stats["checked_out"] != 0 or stats["checkouts"] != stats["checkins"]
+    if leaked or stats["timeouts"]:
+        print("FAIL: connections were not returned to the pool")
+        sys.exit(1)
+    print("OK: every connection was returned")
+
+
+if __name__ == "__main__":
+    main()
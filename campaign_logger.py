@@ -0,0 +1,97 @@
+import asyncio
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+from batch_writer import BatchWriter
+from database import session_scope, CampaignLog
+
+
+def format_line(timestamp, message):
+    return f"[{timestamp}] {message}"
+
+
+class CampaignLogWriter(BatchWriter):
+    """
+    Buffers campaign log lines in memory and writes them to campaign_logs in
+    batched inserts (see BatchWriter). Each user also gets a bounded ring of
+    recent lines so the dashboard never has to read its log tail back from the
+    database.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=1.0, ring_size=200):
+        super().__init__(batch_size, flush_interval, thread_name="campaign-log-writer")
+        self.ring_size = ring_size
+
+        self._rings = {}  # user_id -> deque of formatted lines
+        self._unseeded = {}  # user_id -> time its ring was started, until the DB tail before it is loaded
+        self._rings_lock = threading.Lock()
+
+    def _ring(self, user_id, now):
+        # Caller holds _rings_lock. A new ring starts empty so writers never wait on
+        # the database; _seeded() later puts the lines logged before now in front.
+        ring = self._rings.get(user_id)
+        if ring is None:
+            ring = deque(maxlen=self.ring_size)
+            self._rings[user_id] = ring
+            self._unseeded[user_id] = now
+        return ring
+
+    def _seeded(self, user_id):
+        with self._rings_lock:
+            self._ring(user_id, datetime.utcnow())
+            before = self._unseeded.get(user_id)
+        if before is not None:
+            # Queried outside the lock; only lines older than the ring, so a line
+            # flushed meanwhile is never in both
+            tail = self._load_tail(user_id, self.ring_size, before)
+            with self._rings_lock:
+                if self._unseeded.pop(user_id, None) is not None:
+                    self._rings[user_id] = deque(tail + list(self._rings[user_id]), maxlen=self.ring_size)
+
+    def _load_tail(self, user_id, limit, before=None):
+        try:
+            with session_scope() as db:
+                query = db.query(CampaignLog).filter(CampaignLog.user_id == user_id)
+                if before is not None:
+                    query = query.filter(CampaignLog.timestamp < before)
+                logs = query.order_by(CampaignLog.timestamp.desc()).limit(limit).all()
+                return [format_line(l.timestamp, l.message) for l in logs][::-1]
+        except Exception as e:
+            print(f"Loading logs failed: {e}")
+            return []
+
+    def write(self, user_id, message, type="info"):
+        """Queues one log line and returns it formatted as the dashboard shows it."""
+        now = datetime.utcnow()
+        line = format_line(now, message)
+        with self._rings_lock:
+            self._ring(user_id, now).append(line)
+        self.put({"user_id": user_id, "timestamp": now, "message": message, "type": type})
+        return line
+
+    def recent(self, user_id, limit=50):
+        if limit > self.ring_size:
+            # Older than the ring holds: make sure everything buffered is in the table first
+            self.flush()
+            return self._load_tail(user_id, limit)
+        self._seeded(user_id)
+        with self._rings_lock:
+            return list(self._rings[user_id])[-limit:]
+
+    async def recent_async(self, user_id, limit=50):
+        """recent() for the event loop: a read that has to query runs on a thread."""
+        if limit > self.ring_size or user_id not in self._rings or user_id in self._unseeded:
+            return await asyncio.to_thread(self.recent, user_id, limit)
+        return self.recent(user_id, limit)
+
+    def _write(self, rows):
+        try:
+            with session_scope() as db:
+                db.execute(CampaignLog.__table__.insert(), rows)
+        except Exception as e:
+            print(f"Logging failed ({len(rows)} lines dropped): {e}")
+
+
+campaign_log = CampaignLogWriter()
+atexit.register(campaign_log.shutdown)
@@ -0,0 +1,189 @@
+import sys
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from sqlalchemy import delete, func, insert, select
+from database import (upsert_insert, CampaignCounter, CampaignOpen, Recipient, SendQueueItem,
+                      TrackingEvent, Unsubscribe)
+
+COUNTER_COLUMNS = ("sent", "failed", "opens", "unique_opens", "clicks", "unsubscribed")
+
+# tracking_events.kind -> the counter it feeds
+EVENT_COLUMNS = {"open": "opens", "click": "clicks"}
+
+
+def increment(db, deltas):
+    """
+    Adds to campaign_counters in a single upsert. deltas maps
+    (user_id, campaign_id, day) to {column: amount}; amounts may be negative.
+    """
+    if not deltas:
+        return
+    table = CampaignCounter.__table__
+    rows = [
+        {"user_id": user_id, "campaign_id": campaign_id, "day": day,
+         **{column: amounts.get(column, 0) for column in COUNTER_COLUMNS}}
+        for (user_id, campaign_id, day), amounts in deltas.items()
+    ]
+    stmt = upsert_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "campaign_id", "day"],
+        set_={column: table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS},
+    )
+    db.execute(stmt, rows)
+
+
+def count_unsubscribes(db, unsubscribes, amount=1):
+    """Counts Unsubscribe rows being added (1) or removed (-1) against the campaign and day they came from."""
+    deltas = defaultdict(Counter)
+    for u in unsubscribes:
+        deltas[(u.user_id, u.campaign_id or "", u.created_at.date())]["unsubscribed"] += amount
+    increment(db, deltas)
+
+
+def _sums():
+    return [func.coalesce(func.sum(getattr(CampaignCounter, c)), 0).label(c) for c in COUNTER_COLUMNS]
+
+
+# Reports come as a statement plus a function shaping its rows, so the sync
+# helpers below and the async endpoints in server.py run the same query.
+
+def totals_query(user_id, campaign_id=None):
+    """All-time totals for a user (or one of their campaigns); shape with as_totals."""
+    query = select(*_sums()).where(CampaignCounter.user_id == user_id)
+    if campaign_id is not None:
+        query = query.where(CampaignCounter.campaign_id == campaign_id)
+    return query
+
+
+def as_totals(row):
+    return dict(zip(COUNTER_COLUMNS, row))
+
+
+def daily_query(user_id, since, campaign_id=None):
+    """Per-day totals from since (a date) onwards, oldest first; shape with as_daily."""
+    query = select(CampaignCounter.day, *_sums()).where(
+        CampaignCounter.user_id == user_id,
+        CampaignCounter.day >= since
+    )
+    if campaign_id is not None:
+        query = query.where(CampaignCounter.campaign_id == campaign_id)
+    return query.group_by(CampaignCounter.day).order_by(CampaignCounter.day)
+
+
+def as_daily(rows):
+    return [{"day": r.day.isoformat(), **{c: getattr(r, c) for c in COUNTER_COLUMNS}} for r in rows]
+
+
+def by_campaign_query(user_id):
+    """Totals per campaign, most recently started first; shape with as_campaigns."""
+    return select(
+        CampaignCounter.campaign_id,
+        func.min(CampaignCounter.day).label("first_day"),
+        func.max(CampaignCounter.day).label("last_day"),
+        *_sums()
+    ).where(CampaignCounter.user_id == user_id).group_by(
+        CampaignCounter.campaign_id
+    ).order_by(func.min(CampaignCounter.day).desc())
+
+
+def as_campaigns(rows):
+    return [
+        {"campaign_id": r.campaign_id, "first_day": r.first_day.isoformat(), "last_day": r.last_day.isoformat(),
+         **{c: getattr(r, c) for c in COUNTER_COLUMNS}}
+        for r in rows
+    ]
+
+
+def totals(db, user_id, campaign_id=None):
+    return as_totals(db.execute(totals_query(user_id, campaign_id)).one())
+
+
+def _day(value):
+    # func.date() is a date on Postgres and an ISO string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def rebuild(conn, user_id=None):
+    """
+    Recomputes campaign_counters (and campaign_opens) from the raw rows: tracking
+    events, the send queue, and unsubscribes; for one user, or everyone. Run it
+    inside one transaction while the app is quiet: increments landing during a
+    rebuild may be counted twice or not at all. Returns the number of counter rows.
+    """
+    def for_user(query, column):
+        return query.where(column == user_id) if user_id is not None else query
+
+    deltas = defaultdict(Counter)
+
+    day = func.date(TrackingEvent.created_at)
+    rows = conn.execute(for_user(
+        select(TrackingEvent.user_id, TrackingEvent.campaign_id, day, TrackingEvent.kind, func.count())
+        .group_by(TrackingEvent.user_id, TrackingEvent.campaign_id, day, TrackingEvent.kind),
+        TrackingEvent.user_id))
+    for uid, cid, d, kind, n in rows:
+        if kind in EVENT_COLUMNS:
+            deltas[(uid, cid, _day(d))][EVENT_COLUMNS[kind]] += n
+
+    # First opens: the earliest open event per recipient and campaign
+    conn.execute(for_user(delete(CampaignOpen), CampaignOpen.user_id))
+    conn.execute(insert(CampaignOpen).from_select(
+        ["user_id", "campaign_id", "email", "first_opened_at"],
+        for_user(
+            select(TrackingEvent.user_id, TrackingEvent.campaign_id, TrackingEvent.email, func.min(TrackingEvent.created_at))
+            .where(TrackingEvent.kind == "open")
+            .group_by(TrackingEvent.user_id, TrackingEvent.campaign_id, TrackingEvent.email),
+            TrackingEvent.user_id)
+    ))
+    day = func.date(CampaignOpen.first_opened_at)
+    rows = conn.execute(for_user(
+        select(CampaignOpen.user_id, CampaignOpen.campaign_id, day, func.count())
+        .group_by(CampaignOpen.user_id, CampaignOpen.campaign_id, day),
+        CampaignOpen.user_id))
+    for uid, cid, d, n in rows:
+        deltas[(uid, cid, _day(d))]["unique_opens"] += n
+
+    for state, at in (("sent", SendQueueItem.sent_at), ("failed", SendQueueItem.updated_at)):
+        day = func.date(at)
+        rows = conn.execute(for_user(
+            select(SendQueueItem.user_id, SendQueueItem.campaign_id, day, func.count())
+            .where(SendQueueItem.state == state)
+            .group_by(SendQueueItem.user_id, SendQueueItem.campaign_id, day),
+            SendQueueItem.user_id))
+        for uid, cid, d, n in rows:
+            deltas[(uid, cid, _day(d))][state] += n
+
+    # Sent before the send queue existed: no campaign or send time, so counted
+    # under campaign "" on the day the recipient was added
+    day = func.date(Recipient.created_at)
+    rows = conn.execute(for_user(
+        select(Recipient.user_id, Recipient.status, day, func.count())
+        .where(Recipient.status.in_(("sent", "failed")), Recipient.id.not_in(select(SendQueueItem.recipient_id)))
+        .group_by(Recipient.user_id, Recipient.status, day),
+        Recipient.user_id))
+    for uid, status, d, n in rows:
+        deltas[(uid, "", _day(d))][status] += n
+
+    day = func.date(Unsubscribe.created_at)
+    campaign = func.coalesce(Unsubscribe.campaign_id, "")
+    rows = conn.execute(for_user(
+        select(Unsubscribe.user_id, campaign, day, func.count())
+        .group_by(Unsubscribe.user_id, campaign, day),
+        Unsubscribe.user_id))
+    for uid, cid, d, n in rows:
+        deltas[(uid, cid, _day(d))]["unsubscribed"] += n
+
+    conn.execute(for_user(delete(CampaignCounter), CampaignCounter.user_id))
+    increment(conn, deltas)
+    return len(deltas)
+
+
+if __name__ == "__main__":
+    # python counters.py rebuild [user_id]
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python counters.py rebuild [user_id]")
+    from database import engine, init_db
+    init_db()
+    started = datetime.now()
+    with engine.begin() as conn:
+        rows = rebuild(conn, sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Rebuilt {rows} counter rows in {(datetime.now() - started).total_seconds():.1f}s")
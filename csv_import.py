@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+import re
+import time
+from datetime import datetime
+from sqlalchemy import select
+from database import Recipient, RecipientStaging
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+# Only the first few rejected rows are returned to the client; the total is always counted
+MAX_REPORTED_REJECTS = 500
+
+COPY_SQL = "COPY recipients_staging (job_id, user_id, email, data, status, created_at) FROM STDIN WITH (FORMAT csv)"
+COLUMNS = ("job_id", "user_id", "email", "data", "status", "created_at")
+DATA = COLUMNS.index("data")
+
+
+def normalize_email(raw):
+    if raw is None:
+        return None
+    email = raw.strip().lower()
+    return email if EMAIL_RE.match(email) else None
+
+
+class RecipientImporter:
+    """
+    Streams a CSV upload into recipients_staging under a job id. Rows are parsed,
+    normalized and de-duplicated in chunks, then bulk-loaded with COPY on Postgres
+    or batched executemany inserts elsewhere. swap() then replaces the user's list
+    with the staged rows in one transaction, so readers never see a partial list.
+    """
+
+    def __init__(self, job_id, user_id, chunk_size=5000, on_progress=None):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+
+        self.parsed = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects = []
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return round(self.parsed / elapsed, 1) if elapsed > 0 else 0.0
+
+    def result(self):
+        return {
+            "parsed": self.parsed,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "rows_per_second": self.rows_per_second,
+            "rejects": self.rejects,
+        }
+
+    def _reject(self, line, email, reason):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({"line": line, "email": email, "reason": reason})
+
+    def iter_chunks(self, reader):
+        email_field = next((f for f in reader.fieldnames or [] if f and f.strip().lower() == "email"), None)
+        if email_field is None:
+            raise ValueError("CSV has no 'email' column")
+
+        seen = set()
+        chunk = []
+        created_at = datetime.utcnow()
+        for row in reader:
+            self.parsed += 1
+            line = reader.line_num
+            raw = row.get(email_field)
+            email = normalize_email(raw)
+            if not email:
+                self._reject(line, raw, "missing email" if not raw or not raw.strip() else "invalid email")
+                continue
+            if email in seen:
+                self._reject(line, raw, "duplicate")
+                continue
+            seen.add(email)
+
+            extra_data = {k: v for k, v in row.items() if k and k != email_field}
+            chunk.append((self.job_id, self.user_id, email, extra_data, "pending", created_at))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def load(self, db, rows):
+        """Bulk-inserts staged rows (see COLUMNS) on db's connection."""
+        if db.get_bind().dialect.name == "postgresql":
+            buf = io.StringIO()
+            # COPY takes the attributes as JSON text; the column parses it into JSONB
+            csv.writer(buf).writerows(r[:DATA] + (json.dumps(r[DATA]),) + r[DATA + 1:] for r in rows)
+            buf.seek(0)
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(COPY_SQL, buf)
+            finally:
+                cursor.close()
+        else:
+            db.execute(RecipientStaging.__table__.insert(), [dict(zip(COLUMNS, r)) for r in rows])
+        self.inserted += len(rows)
+
+    def stage(self, db, fileobj):
+        """Parses the upload into recipients_staging, committing chunk by chunk."""
+        self.started_at = time.monotonic()
+        # Decode the upload incrementally instead of reading it into memory
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        try:
+            for chunk in self.iter_chunks(csv.DictReader(text)):
+                self.load(db, chunk)
+                db.commit()
+                if self.on_progress:
+                    self.on_progress(self)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            self.finished_at = time.monotonic()
+            # Leave the underlying upload file open for its owner to close
+            text.detach()
+        return self.result()
+
+    def swap(self, db):
+        """Atomically replaces the user's recipients with this job's staged rows."""
+        staged = select(
+            RecipientStaging.user_id, RecipientStaging.email, RecipientStaging.data,
+            RecipientStaging.status, RecipientStaging.created_at
+        ).where(RecipientStaging.job_id == self.job_id).order_by(RecipientStaging.id)
+        try:
+            db.query(Recipient).filter(Recipient.user_id == self.user_id).delete(synchronize_session=False)
+            db.execute(Recipient.__table__.insert().from_select(
+                ["user_id", "email", "data", "status", "created_at"], staged
+            ))
+            db.query(RecipientStaging).filter(RecipientStaging.job_id == self.job_id).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    def discard(self, db):
+        db.query(RecipientStaging).filter(RecipientStaging.job_id == self.job_id).delete(synchronize_session=False)
+        db.commit()
@@ -1,43 +1,119 @@
-import smtplib
-import time
-import json
-import os
+import asyncio
 import threading
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
-from datetime import datetime
-from sqlalchemy.orm import Session
-from database import get_db, SMTPConfig, Recipient, CampaignLog, Unsubscribe, init_db
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from sqlalchemy import func, select
+from database import session_scope, upsert_insert, AppConfig, SMTPConfig, Recipient, Unsubscribe, init_db
+from smtp_pool import smtp_pool
+from send_engine import SendEngine
+from rate_limiter import AccountRateLimiter, rate_limit_store
+from template_engine import compile_template
+from template_store import template_store
+from message_builder import MessageSkeleton
+from campaign_logger import campaign_log
+from suppression import suppression, normalize as normalize_email
+from leases import campaign_leases
+from send_queue import send_queue, message_id_for, SENT, FAILED, SKIPPED
+from smtp_errors import classify, BOUNCE, THROTTLED
+from tracking import pixel_url, rewrite_links
+import counters
+
+# app_configs key of the URL tracking and unsubscribe links point at
+PUBLIC_URL_KEY = "public_url"
 
 class EmailManager:
     def __init__(self, user_id: str):
         self.user_id = user_id
+        # Live status subscribers (see subscribe); must exist before status is set
+        self._subscribers = set()
+        self._subscribers_lock = threading.Lock()
+
         # State
         self.is_running = False
         self.stop_event = threading.Event()
         self.thread = None
+        self._lease = None  # token while this worker owns the user's campaign
+        self._campaign_id = None  # outbox run being sent (see send_queue.py)
+        self._segment = None  # recipients a new run targets (see segments.py)
+        self._resume = False  # whether this run takes over an interrupted one as it was
         self.status = "IDLE"
         self.current_email = ""
+        self.account_status = {}
+        self.account_wait_until = {}  # sender email -> UTC time a waiting account may send again
+        self._template = None  # CompiledTemplate for the running campaign
+        self._skeletons = {}  # sender email -> MessageSkeleton
+        self._throttles = {}  # sender email -> AccountRateLimiter of the running campaign
+
+        # Status snapshot caches (see get_status)
+        self._status_lock = threading.Lock()
+        self._status_counts = None
+        self._counts_loaded_at = 0.0
         
-        # Configs
-        self.SWITCH_LIMIT = 200
-        self.BATCH_SIZE = 30
-        self.SHORT_WAIT_SECONDS = 120
-        self.LONG_WAIT_SECONDS = 2800
+        # Quotas per SMTP account (token buckets; accounts send concurrently)
+        self.RATE_LIMITS = {
+            "minute": 1,
+            "hour": 30,
+            "day": 500,
+        }
         self.DAILY_LIMIT_PAUSE_SECONDS = 12 * 3600
+        self.THROTTLE_PAUSE_SECONDS = 15 * 60
+        self.RECIPIENT_CHUNK_SIZE = 500
+        self.STATUS_COUNTS_TTL = 30
         
-        self.public_url = "" 
+        self.SUBJECT = "How Ghanaians Are Making ₵200–₵500/Day With AI & Phone" # TODO: Make subject dynamic
+        self.public_url = ""  # tracking/unsubscribe links; stored in app_configs (see save_public_url)
+        self._missing_url_logged = False
         
         # Initialize DB (Global init, safe to call multiple times)
         init_db()
 
-    def get_db_session(self):
-        return next(get_db())
+    @property
+    def status(self):
+        return self._status
 
-    def get_configs(self):
-        db = self.get_db_session()
-        configs = db.query(SMTPConfig).filter(SMTPConfig.user_id == self.user_id).all()
+    @status.setter
+    def status(self, value):
+        self._status = value
+        self._notify_status()
+
+    def subscribe(self, loop, maxsize=200):
+        """Registers an asyncio.Queue on loop that receives (event, data) status pushes."""
+        queue = asyncio.Queue(maxsize=maxsize)
+        with self._subscribers_lock:
+            self._subscribers.add((loop, queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._subscribers_lock:
+            self._subscribers = {(l, q) for l, q in self._subscribers if q is not queue}
+
+    @staticmethod
+    def _offer(queue, item):
+        # Runs on the subscriber's event loop
+        if queue.full():
+            # Slow client: drop what it hasn't read and have it resync from a snapshot
+            while not queue.empty():
+                queue.get_nowait()
+            item = ("resync", None)
+        queue.put_nowait(item)
+
+    def _publish(self, event, data):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, (event, data))
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(queue)
+
+    def _notify_status(self):
+        if self._subscribers:
+            self._publish("status", self._status_fields())
+
+    @staticmethod
+    def _config_dicts(configs):
         return [
             {
                 "SERVER": c.server,
@@ -48,81 +124,182 @@ class EmailManager:
             } for c in configs
         ]
 
+    def get_configs(self):
+        with session_scope() as db:
+            return self._config_dicts(db.query(SMTPConfig).filter(SMTPConfig.user_id == self.user_id).all())
+
+    def save_public_url(self, url):
+        """Sets the public tracking URL and stores it, so a run resumed or scheduled on any worker uses it."""
+        self.public_url = url
+        self._missing_url_logged = False
+        stmt = upsert_insert(AppConfig.__table__).values(user_id=self.user_id, key=PUBLIC_URL_KEY, value=url)
+        with session_scope() as db:
+            db.execute(stmt.on_conflict_do_update(index_elements=["user_id", "key"], set_={"value": url}))
+
+    def _load_public_url(self):
+        with session_scope() as db:
+            url = db.query(AppConfig.value).filter(
+                AppConfig.user_id == self.user_id, AppConfig.key == PUBLIC_URL_KEY).scalar()
+        if url:
+            self.public_url = url
+        return self.public_url
+
+    async def get_public_url_async(self, db):
+        url = await db.scalar(select(AppConfig.value).where(
+            AppConfig.user_id == self.user_id, AppConfig.key == PUBLIC_URL_KEY))
+        return url or self.public_url
+
+    async def get_configs_async(self, db):
+        result = await db.execute(select(SMTPConfig).where(SMTPConfig.user_id == self.user_id))
+        return self._config_dicts(result.scalars().all())
+
     def save_configs(self, new_configs):
-        db = self.get_db_session()
-        db.query(SMTPConfig).filter(SMTPConfig.user_id == self.user_id).delete()
-        for c in new_configs:
-            config = SMTPConfig(
-                user_id=self.user_id,
-                server=c.get("SERVER", "smtp.gmail.com"),
-                port=int(c.get("PORT", 587)),
-                email=c["EMAIL"],
-                password=c["PASSWORD"],
-                display_name=c.get("DISPLAY_NAME", "")
-            )
-            db.add(config)
-        db.commit()
+        # Drop pooled sessions logged in with the old credentials
+        for old in self.get_configs():
+            smtp_pool.discard(old)
+        with session_scope() as db:
+            db.query(SMTPConfig).filter(SMTPConfig.user_id == self.user_id).delete()
+            for c in new_configs:
+                config = SMTPConfig(
+                    user_id=self.user_id,
+                    server=c.get("SERVER", "smtp.gmail.com"),
+                    port=int(c.get("PORT", 587)),
+                    email=c["EMAIL"],
+                    password=c["PASSWORD"],
+                    display_name=c.get("DISPLAY_NAME", "")
+                )
+                db.add(config)
         self.log("Configurations updated in DB.")
 
     def is_unsubscribed(self, email):
-        db = self.get_db_session()
-        return db.query(Unsubscribe).filter(Unsubscribe.user_id == self.user_id, Unsubscribe.email == email).first() is not None
+        # In-memory set, loaded once per user (see suppression.SuppressionList)
+        return suppression.contains(self.user_id, email)
 
     def unsubscribe_user(self, email):
         if not self.is_unsubscribed(email):
-            db = self.get_db_session()
-            db.add(Unsubscribe(user_id=self.user_id, email=email))
-            db.commit()
+            with session_scope() as db:
+                row = Unsubscribe(user_id=self.user_id, email=normalize_email(email), created_at=datetime.utcnow())
+                db.add(row)
+                counters.count_unsubscribes(db, [row])
+            suppression.add(self.user_id, email)
             self.log(f"Unsubscribed: {email}")
 
     def get_analytics(self):
-        db = self.get_db_session()
-        total_sent = db.query(Recipient).filter(Recipient.user_id == self.user_id, Recipient.status == 'sent').count()
-        unsubscribes = db.query(Unsubscribe).filter(Unsubscribe.user_id == self.user_id).count()
+        # Summed from the rollups (see counters.py), not counted from recipients
+        with session_scope() as db:
+            return self._analytics(counters.totals(db, self.user_id))
+
+    async def get_analytics_async(self, db):
+        row = (await db.execute(counters.totals_query(self.user_id))).one()
+        return self._analytics(counters.as_totals(row))
+
+    @staticmethod
+    def _analytics(counts):
         return {
-            "total_sent": total_sent,
-            "opens": 0, 
-            "unsubscribes": unsubscribes
+            "total_sent": counts["sent"],
+            "failed": counts["failed"],
+            "opens": counts["unique_opens"],
+            "total_opens": counts["opens"],
+            "clicks": counts["clicks"],
+            "unsubscribes": counts["unsubscribed"]
         }
 
     def log(self, message):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{self.user_id}] [{timestamp}] {message}")
-        
-        try:
-            db = self.get_db_session()
-            db.add(CampaignLog(user_id=self.user_id, message=message))
-            db.commit()
-        except Exception as e:
-            print(f"Logging failed: {e}")
+
+        # Buffered: written to campaign_logs in batches by the log writer thread
+        line = campaign_log.write(self.user_id, message)
+        self._publish("log", line)
 
     def get_recent_logs(self, limit=50):
-        db = self.get_db_session()
-        logs = db.query(CampaignLog).filter(CampaignLog.user_id == self.user_id).order_by(CampaignLog.timestamp.desc()).limit(limit).all()
-        return [f"[{l.timestamp}] {l.message}" for l in logs][::-1]
+        return campaign_log.recent(self.user_id, limit)
 
-    def get_status(self):
-        db = self.get_db_session()
-        total = db.query(Recipient).filter(Recipient.user_id == self.user_id).count()
-        sent = db.query(Recipient).filter(Recipient.user_id == self.user_id, Recipient.status == 'sent').count()
-        
+    def _status_counts_query(self):
+        # One aggregate query instead of a COUNT per status
+        return select(Recipient.status, func.count(Recipient.id)).where(
+            Recipient.user_id == self.user_id
+        ).group_by(Recipient.status)
+
+    def _cached_status_counts(self):
+        with self._status_lock:
+            fresh = self._status_counts is not None and time.monotonic() - self._counts_loaded_at < self.STATUS_COUNTS_TTL
+            return dict(self._status_counts) if fresh else None
+
+    def _store_status_counts(self, rows):
+        counts = {status: count for status, count in rows}
+        with self._status_lock:
+            self._status_counts = counts
+            self._counts_loaded_at = time.monotonic()
+        return dict(counts)
+
+    def _get_status_counts(self):
+        counts = self._cached_status_counts()
+        if counts is None:
+            with session_scope() as db:
+                counts = self._store_status_counts(db.execute(self._status_counts_query()).all())
+        return counts
+
+    def _move_status_count(self, old, new):
+        """Applies a recipient status change from the send loop to the cached counts."""
+        with self._status_lock:
+            if self._status_counts is None:
+                return
+            self._status_counts[old] = self._status_counts.get(old, 0) - 1
+            self._status_counts[new] = self._status_counts.get(new, 0) + 1
+        self._notify_status()
+
+    def invalidate_status(self):
+        """Drops cached counts, e.g. after the recipient list was replaced."""
+        with self._status_lock:
+            self._status_counts = None
+        self._notify_status()
+
+    def _status_fields(self, counts=None):
+        if counts is None:
+            counts = self._get_status_counts()
         return {
             "status": self.status,
-            "current_index": sent,
-            "total_recipients": total,
+            "current_index": counts.get('sent', 0),
+            "total_recipients": sum(counts.values()),
             "current_email": self.current_email,
-            "logs": self.get_recent_logs(),
-            "configs": self.get_configs()
+            "accounts": dict(self.account_status),
+            # The client counts down to these itself, so a wait is published once
+            "waiting_until": {e: t.isoformat() + "Z" for e, t in dict(self.account_wait_until).items()},
         }
 
-    def _inject_tracking(self, html, email):
+    def get_status(self):
+        """
+        Status for the dashboard, served from per-user caches: recipient counts come
+        from one aggregate query refreshed every STATUS_COUNTS_TTL seconds (and kept
+        current by the send loop), logs from the log writer's in-memory ring.
+        """
+        snapshot = self._status_fields()
+        snapshot["logs"] = self.get_recent_logs()
+        return snapshot
+
+    async def get_status_async(self, db):
+        """get_status for the event loop: a stale count refresh runs on the request's AsyncSession, a first log read on a thread."""
+        counts = self._cached_status_counts()
+        if counts is None:
+            counts = self._store_status_counts((await db.execute(self._status_counts_query())).all())
+        snapshot = self._status_fields(counts)
+        snapshot["logs"] = await campaign_log.recent_async(self.user_id)
+        return snapshot
+
+    def _inject_tracking(self, html, email, campaign_id=None):
         if not self.public_url:
             return html
-        
-        # Append user_id to tracking links so backend knows which user to attribute to
-        pixel_url = f"{self.public_url}/track/open?email={email}&uid={self.user_id}"
-        pixel_tag = f'<img src="{pixel_url}" width="1" height="1" style="display:none;" />'
-        unsub_url = f"{self.public_url}/unsubscribe?email={email}&uid={self.user_id}"
+
+        # Test sends (no campaign) get the unsubscribe footer but aren't tracked
+        pixel_tag = ""
+        if campaign_id:
+            html = rewrite_links(html, self.public_url, self.user_id, campaign_id, email)
+            pixel_tag = f'<img src="{pixel_url(self.public_url, self.user_id, campaign_id, email)}" width="1" height="1" style="display:none;" />'
+        unsub_params = {"email": email, "uid": self.user_id}
+        if campaign_id:
+            unsub_params["cid"] = campaign_id
+        unsub_url = f"{self.public_url}/unsubscribe?" + urlencode(unsub_params)
         footer = f'''
         <div style="text-align: center; font-size: 12px; color: #888; margin-top: 20px; border-top: 1px solid #eee; padding-top: 10px;">
             <a href="{unsub_url}" style="color: #888;">Unsubscribe</a>
@@ -135,11 +312,7 @@ class EmailManager:
         return html
 
     def _personalize_email(self, html_template, row_data):
-        html = html_template
-        for key, value in row_data.items():
-            placeholder = f"{{{key}}}"
-            html = html.replace(placeholder, str(value) if value else "")
-        return html
+        return compile_template(html_template).render(row_data)
 
     def send_test_email(self, recipient_email):
         self.log(f"Sending test email to {recipient_email}...")
@@ -150,38 +323,47 @@ class EmailManager:
             
             config = configs[0]
             
-            # Load template from DB or file (fallback to file for now as template isn't in DB yet)
-            # TODO: Move template to DB
-            if os.path.exists("mail.html"):
-                with open("mail.html", encoding="utf-8") as f:
-                    html_template = f.read()
-            else:
-                html_template = "<h1>Hello {first_name},</h1><p>This is a test.</p>"
+            template = template_store.latest(self.user_id)
+            html_template = template.content if template else "<h1>Hello {first_name},</h1><p>This is a test.</p>"
 
             test_data = {"first_name": "Test", "email": recipient_email}
             html = self._personalize_email(html_template, test_data)
             html = self._inject_tracking(html, recipient_email)
             
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = "[TEST] Campaign Email"
-            msg["From"] = formataddr((config["DISPLAY_NAME"], config["EMAIL"]))
-            msg["To"] = recipient_email
-            msg.attach(MIMEText(html, "html"))
-            
-            with smtplib.SMTP(config["SERVER"], config["PORT"], timeout=30) as s:
-                s.starttls()
-                s.login(config["EMAIL"], config["PASSWORD"])
-                s.send_message(msg)
-                
+            skeleton = MessageSkeleton("[TEST] Campaign Email", config["DISPLAY_NAME"], config["EMAIL"])
+            smtp_pool.sendmail(config, config["EMAIL"], [recipient_email], skeleton.build(recipient_email, html))
+
             self.log(f"Test email sent to {recipient_email}")
             return True, "Sent"
         except Exception as e:
             self.log(f"Test email failed: {e}")
             return False, str(e)
 
-    def start_process(self):
+    def start_process(self, segment=None, resume=False, scheduled=False):
+        """
+        Starts the campaign unless it is already running here or on another worker.
+        segment limits the run to matching recipients; an unfinished run started with
+        another segment or template version is replaced (see SendQueue.prepare).
+        resume only takes over a run whose worker died (its lease lapsed), keeping
+        that run's settings, and quietly returns False when another worker got there first.
+        Resumed and scheduled starts are refused until a public URL is saved, since
+        their mail would go out without an unsubscribe link.
+        """
         if self.is_running:
-            return
+            return False
+        if not self._load_public_url() and (resume or scheduled):
+            if not self._missing_url_logged:
+                self._missing_url_logged = True
+                self.log("Not starting automatically: set the Public Tracking Domain in Settings first.")
+            return False
+        lease = campaign_leases.acquire(self.user_id, on_revoked=self._on_lease_revoked, expired_only=resume)
+        if not lease:
+            if not resume:
+                self.log("Campaign is already running for this account.")
+            return False
+        self._lease = lease
+        self._segment = segment
+        self._resume = resume
         self.is_running = True
         self.stop_event.clear()
         self.status = "RUNNING"
@@ -189,44 +371,169 @@ class EmailManager:
         self.thread.daemon = True
         self.thread.start()
         self.log("Process started.")
+        return True
 
     def stop_process(self):
         if not self.is_running:
+            # The campaign may be running on another worker
+            if campaign_leases.request_stop(self.user_id):
+                self.log("Stop requested from the worker running the campaign.")
             return
         self.log("Stopping process...")
         self.stop_event.set()
         self.is_running = False
         self.status = "STOPPED"
 
-    def _sleep_interruptible(self, seconds, message="Waiting"):
-        for i in range(seconds, 0, -1):
-            if self.stop_event.is_set():
-                return False
-            if i % 10 == 0 or i < 10:
-                self.status = f"{message} ({i}s)"
-            time.sleep(1)
-        self.status = "RUNNING"
+    def _on_lease_revoked(self, reason):
+        self.log(reason)
+        self.stop_process()
+
+    def _on_account_wait(self, config, seconds):
+        # Called about once a second while an account waits; subscribers only hear
+        # about it when the wait starts or its deadline moves
+        email = config["EMAIL"]
+        until = datetime.utcnow() + timedelta(seconds=seconds)
+        previous = self.account_wait_until.get(email)
+        if previous is None or abs((until - previous).total_seconds()) > 1:
+            self.account_status[email] = "Waiting"
+            self.account_wait_until[email] = until
+            self._notify_status()
+
+    def _send_to_recipient(self, config, item):
+        """Sends one outbox item from config. Runs on a sender worker thread."""
+        item_id, recipient_id, email, data = item
+        self.current_email = email
+        self.account_status[config["EMAIL"]] = "Sending"
+        self.account_wait_until.pop(config["EMAIL"], None)
+        self._notify_status()
+
+        # Check Unsubscribe
+        if self.is_unsubscribed(email):
+            self.log(f"Skipping {email}: Unsubscribed")
+            self._finish(item_id, recipient_id, SKIPPED, 'unsubscribed', "unsubscribed")
+            return None
+
+        skeleton = self._skeletons[config["EMAIL"]]
+        claim = send_queue.claim(item_id, self._lease, message_id_for(self._campaign_id, item_id, skeleton.domain))
+        if claim is None:
+            return None  # sent or rescheduled since it was read
+        attempts, message_id = claim
+
+        # Attributes arrive decoded from the JSON column
+        row_data = dict(data or {})
+        row_data['email'] = email
+
+        html = self._template.render(row_data)
+        html = self._inject_tracking(html, email, self._campaign_id)
+
+        raw = skeleton.build(email, html, message_id)
+
+        try:
+            smtp_pool.sendmail(config, config["EMAIL"], [email], raw)
+        except Exception as e:
+            return self._handle_send_error(config, item_id, recipient_id, email, attempts, e)
+
+        self.log(f"SUCCESS -> {email} via {config['EMAIL']}")
+        self._finish(item_id, recipient_id, SENT, 'sent')
         return True
 
+    def _handle_send_error(self, config, item_id, recipient_id, email, attempts, exc):
+        account = config["EMAIL"]
+        error = classify(exc)
+        if error.outcome == THROTTLED:
+            # The account's problem, not the recipient's: park the account and let
+            # another one take the message
+            pause = self.DAILY_LIMIT_PAUSE_SECONDS if error.daily_limit else self.THROTTLE_PAUSE_SECONDS
+            self.log(f"{account} throttled ({error}); parking it for {pause // 60} min.")
+            self._throttles[account].park(pause)
+            if send_queue.defer(item_id, recipient_id, attempts, str(error)):
+                self.log(f"Giving up on {email} after {attempts} attempts.")
+                self._move_status_count('pending', 'failed')
+            return None
+        if error.outcome == BOUNCE:
+            self.log(f"Bounced -> {email} via {account}: {error}")
+            self._finish(item_id, recipient_id, FAILED, 'failed', str(error))
+            return None
+        self.log(f"Error -> {email} via {account}: {error}")
+        if send_queue.fail(item_id, recipient_id, attempts, str(error)):
+            self.log(f"Giving up on {email} after {attempts} attempts.")
+            self._move_status_count('pending', 'failed')
+        return False
+
+    def _on_send_error(self, config, item, exc):
+        """An exception escaped _send_to_recipient (DB, template...): log it and hand the item back."""
+        item_id, recipient_id, email, _ = item
+        self.log(f"Error -> {email} via {config['EMAIL']}: {exc!r}")
+        try:
+            if send_queue.release(item_id, recipient_id, repr(exc)):
+                self._move_status_count('pending', 'failed')
+        except Exception as e:
+            # Left as it was: a claimed item is picked up again once its claim expires
+            self.log(f"Could not hand back {email}: {e}")
+
+    def _finish(self, item_id, recipient_id, state, status, error=None):
+        send_queue.finish(item_id, recipient_id, state, status, error)
+        # Only pending recipients are queued for the send loop
+        self._move_status_count('pending', status)
+
+    def _iter_send_queue(self, engine):
+        """
+        Streams this user's ready outbox items as (item_id, recipient_id, email, data),
+        keyset-paginated by id with a short-lived session per chunk. After each pass
+        it lets the engine finish what it was handed (so nothing is handed out twice),
+        then sleeps until the next retry is due and scans again, until none are left.
+        """
+        while not self.stop_event.is_set():
+            last_id = 0
+            while not self.stop_event.is_set():
+                chunk = send_queue.ready_chunk(self.user_id, last_id, self.RECIPIENT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+                for row in chunk:
+                    yield tuple(row)
+            while not engine.idle():
+                if not engine.working():
+                    self.log("All senders stopped; ending the run.")
+                    return
+                if self.stop_event.wait(0.5):
+                    return
+            retry_at = send_queue.next_retry_at(self.user_id)
+            if retry_at is None:
+                return
+            wait = (retry_at - datetime.utcnow()).total_seconds()
+            if wait > 0:
+                self.stop_event.wait(min(wait, 60))
+
+    def _make_throttle(self, config):
+        throttle = AccountRateLimiter(self.user_id, config["EMAIL"], self.RATE_LIMITS, store=rate_limit_store)
+        self._throttles[config["EMAIL"]] = throttle
+        return throttle
+
     def _run_loop(self):
+        lease = self._lease
         try:
-            db = self.get_db_session()
-            
-            # Load Template
-            if os.path.exists("mail.html"):
-                with open("mail.html", encoding="utf-8") as f:
-                    html_template = f.read()
-            else:
-                self.log("Error: mail.html not found.")
+            latest = template_store.latest(self.user_id)
+            if not latest:
+                self.log("Error: No email template saved.")
                 self.is_running = False
                 self.status = "ERROR"
                 return
 
-            # Fetch Pending Recipients
-            recipients = db.query(Recipient).filter(Recipient.status == 'pending').all()
-            total_recipients = db.query(Recipient).count()
-            
-            if not recipients:
+            # Drop everyone already on the unsubscribe list in one statement
+            excluded = suppression.exclude_pending(self.user_id)
+            if excluded:
+                self.log(f"Excluded {excluded} unsubscribed recipients.")
+                self.invalidate_status()
+
+            # Queue every pending recipient, or pick up an interrupted run where it stopped
+            self._campaign_id, queued, resumed, version, replaced = send_queue.prepare(
+                self.user_id, self._segment, latest.version, replace=not self._resume)
+            if replaced:
+                self.log("Unfinished campaign replaced: started with a different segment or template.")
+            # The run renders the version it started with, compiled once, even if the template is edited meanwhile
+            self._template = template_store.compiled(self.user_id, version)
+            if not queued:
                 self.log("No pending recipients.")
                 self.is_running = False
                 self.status = "FINISHED"
@@ -239,68 +546,26 @@ class EmailManager:
                 self.status = "ERROR"
                 return
 
-            self.log(f"Starting campaign with {len(recipients)} pending recipients.")
+            action = "Resuming" if resumed else "Starting"
+            self.log(f"{action} campaign with {queued} queued recipients across {len(configs)} accounts (template v{version}).")
 
-            sent_count_in_batch = 0
-            
-            for i, recipient in enumerate(recipients):
-                if self.stop_event.is_set():
-                    break
-                
-                self.current_email = recipient.email
-                
-                # Check Unsubscribe
-                if self.is_unsubscribed(recipient.email):
-                    self.log(f"Skipping {recipient.email}: Unsubscribed")
-                    recipient.status = 'unsubscribed'
-                    db.commit()
-                    continue
-
-                # Config Rotation
-                config_index = (i // self.SWITCH_LIMIT) % len(configs)
-                current_config = configs[config_index]
-
-                # Prepare Data
-                row_data = json.loads(recipient.data) if recipient.data else {}
-                row_data['email'] = recipient.email
-                
-                html = self._personalize_email(html_template, row_data)
-                html = self._inject_tracking(html, recipient.email)
-
-                msg = MIMEMultipart("alternative")
-                msg["Subject"] = "How Ghanaians Are Making ₵200–₵500/Day With AI & Phone" # TODO: Make subject dynamic
-                msg["From"] = formataddr((current_config["DISPLAY_NAME"], current_config["EMAIL"]))
-                msg["To"] = recipient.email
-                msg.attach(MIMEText(html, "html"))
-
-                try:
-                    with smtplib.SMTP(current_config["SERVER"], current_config["PORT"], timeout=30) as s:
-                        s.starttls()
-                        s.login(current_config["EMAIL"], current_config["PASSWORD"])
-                        s.send_message(msg)
-                    
-                    self.log(f"SUCCESS -> {recipient.email}")
-                    recipient.status = 'sent'
-                    db.commit()
-                    sent_count_in_batch += 1
-
-                except Exception as e:
-                    self.log(f"Error -> {recipient.email}: {e}")
-                    # Don't mark as failed immediately? Or maybe 'retry'?
-                    # For now, keep as pending or mark failed
-                    # recipient.status = 'failed' 
-                    # db.commit()
-                    time.sleep(5)
-
-                # Rate Limiting
-                if sent_count_in_batch >= self.BATCH_SIZE:
-                    self.log(f"Batch limit reached. Sleeping {self.LONG_WAIT_SECONDS}s...")
-                    if not self._sleep_interruptible(self.LONG_WAIT_SECONDS, "Batch Pause"):
-                        break
-                    sent_count_in_batch = 0
-                else:
-                    if not self._sleep_interruptible(self.SHORT_WAIT_SECONDS, "Waiting"):
-                        break
+            self.account_status = {c["EMAIL"]: "Idle" for c in configs}
+            self.account_wait_until = {}
+            # Headers and MIME framing are encoded once per sending account
+            self._skeletons = {
+                c["EMAIL"]: MessageSkeleton(self.SUBJECT, c["DISPLAY_NAME"], c["EMAIL"]) for c in configs
+            }
+            engine = SendEngine(
+                configs,
+                send_one=self._send_to_recipient,
+                make_throttle=self._make_throttle,
+                stop_event=self.stop_event,
+                on_wait=self._on_account_wait,
+                on_error=self._on_send_error,
+            )
+            engine.run(self._iter_send_queue(engine))
+            # No account is waiting any more; the final status change publishes this
+            self.account_wait_until = {}
 
             self.is_running = False
             self.status = "FINISHED" if not self.stop_event.is_set() else "STOPPED"
@@ -310,3 +575,5 @@ class EmailManager:
             self.log(f"Critical Loop Error: {e}")
             self.is_running = False
             self.status = "ERROR"
+        finally:
+            campaign_leases.release(lease)
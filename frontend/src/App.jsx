@@ -60,17 +60,56 @@ function AppContent({ session }) {
         status: 'IDLE',
         current_index: 0,
         total_recipients: 0,
-        logs: [],
-        configs: []
+        logs: []
     });
     const [template, setTemplate] = useState('');
     const [recipients, setRecipients] = useState([]);
+    const [recipientsCursor, setRecipientsCursor] = useState(null);
+    const [recipientFilters, setRecipientFilters] = useState({ status: '', q: '' });
     const logsEndRef = useRef(null);
 
+    // Live status over Server-Sent Events instead of polling /status every second.
+    // The stream URL carries a short-lived stream token, not the access token; once
+    // it has expired a dropped stream can't reconnect with it, so fetch a new one.
     useEffect(() => {
-        const interval = setInterval(fetchStatus, 1000);
-        return () => clearInterval(interval);
-    }, []);
+        if (!session?.access_token) return;
+        let source = null;
+        let retry = null;
+        let closed = false;
+        const connect = async () => {
+            try {
+                const res = await axios.post(`${API_URL}/status/stream-token`);
+                if (closed) return;
+                source = new EventSource(
+                    `${API_URL}/status/stream?token=${encodeURIComponent(res.data.token)}`
+                );
+            } catch (err) {
+                console.error("Failed to open status stream", err);
+                if (!closed) retry = setTimeout(connect, 5000);
+                return;
+            }
+            source.addEventListener('snapshot', (e) => setStatus(JSON.parse(e.data)));
+            source.addEventListener('status', (e) => {
+                const update = JSON.parse(e.data);
+                setStatus(prev => ({ ...prev, ...update }));
+            });
+            source.addEventListener('log', (e) => {
+                const line = JSON.parse(e.data);
+                setStatus(prev => ({ ...prev, logs: [...prev.logs, line].slice(-50) }));
+            });
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED && !closed) {
+                    retry = setTimeout(connect, 1000);
+                }
+            };
+        };
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(retry);
+            source?.close();
+        };
+    }, [session?.access_token]);
 
     useEffect(() => {
         logsEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -106,17 +145,42 @@ function AppContent({ session }) {
         const formData = new FormData();
         formData.append('file', file);
         try {
-            await axios.post(`${API_URL}/upload_csv`, formData);
-            alert("CSV Uploaded!");
+            const res = await axios.post(`${API_URL}/upload_csv`, formData);
+            const job = await waitForImport(res.data.job_id);
+            if (job.status === 'failed') {
+                alert("CSV import failed: " + job.error);
+                return;
+            }
+            alert(job.rejected
+                ? `Imported ${job.inserted} recipients (${job.rejected} rows rejected)`
+                : `Imported ${job.inserted} recipients`);
             await fetchRecipients();
         } catch (err) {
             alert("Failed to upload CSV: " + err.message);
         }
     };
 
-    const fetchRecipients = async () => {
-        const res = await axios.get(`${API_URL}/recipients`);
-        setRecipients(res.data.recipients);
+    const waitForImport = async (jobId) => {
+        while (true) {
+            const res = await axios.get(`${API_URL}/imports/${jobId}`);
+            if (res.data.status === 'completed' || res.data.status === 'failed') return res.data;
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    };
+
+    const fetchRecipients = async (filters = recipientFilters, cursor = null) => {
+        const params = { limit: 100, sort: 'email' };
+        if (filters.status) params.status = filters.status;
+        if (filters.q) params.q = filters.q;
+        if (cursor) params.cursor = cursor;
+        const res = await axios.get(`${API_URL}/recipients`, { params });
+        setRecipients(prev => cursor ? [...prev, ...res.data.recipients] : res.data.recipients);
+        setRecipientsCursor(res.data.next_cursor);
+    };
+
+    const handleRecipientFilters = (filters) => {
+        setRecipientFilters(filters);
+        fetchRecipients(filters);
     };
 
     const fetchTemplate = async () => {
@@ -175,13 +239,20 @@ function AppContent({ session }) {
                             <TemplateMobile template={template} setTemplate={setTemplate} onSave={handleSaveTemplate} />
                         )}
                         {activeTab === 'recipients' && (
-                            <RecipientsMobile recipients={recipients} onUpload={handleFileUpload} />
+                            <RecipientsMobile
+                                recipients={recipients}
+                                total={status.total_recipients}
+                                filters={recipientFilters}
+                                onFilter={handleRecipientFilters}
+                                onLoadMore={recipientsCursor ? () => fetchRecipients(recipientFilters, recipientsCursor) : null}
+                                onUpload={handleFileUpload}
+                            />
                         )}
                         {activeTab === 'history' && (
                             <HistoryMobile />
                         )}
                         {activeTab === 'settings' && (
-                            <SettingsMobile configs={status.configs} onSave={handleSaveConfig} />
+                            <SettingsMobile onSave={handleSaveConfig} />
                         )}
                     </motion.div>
                 </AnimatePresence>
@@ -359,6 +430,8 @@ const DashboardMobile = ({ status, onStart, onStop, logsEndRef }) => {
                 </div>
             </div>
 
+            <AccountsMobile accounts={status.accounts} waitingUntil={status.waiting_until} />
+
             {/* Control Buttons */}
             <div className="flex gap-3">
                 <button
@@ -485,6 +558,40 @@ const StatCardMobile = ({ label, value, color }) => {
     );
 };
 
+// Sending accounts, counting down locally to when a waiting one may send again
+// (the server publishes a wait once, not every second)
+const AccountsMobile = ({ accounts, waitingUntil }) => {
+    const [now, setNow] = useState(Date.now());
+    const waiting = Object.keys(waitingUntil || {}).length > 0;
+
+    useEffect(() => {
+        if (!waiting) return;
+        const interval = setInterval(() => setNow(Date.now()), 1000);
+        return () => clearInterval(interval);
+    }, [waiting]);
+
+    const names = Object.keys(accounts || {});
+    if (names.length === 0) return null;
+
+    return (
+        <div className="bg-white dark:bg-gray-800 rounded-2xl p-4 shadow-sm space-y-2">
+            <span className="text-sm font-medium text-gray-700 dark:text-gray-300">Sending Accounts</span>
+            {names.map((email) => {
+                const until = waitingUntil?.[email];
+                const seconds = until ? Math.max(0, Math.ceil((Date.parse(until) - now) / 1000)) : null;
+                return (
+                    <div key={email} className="flex justify-between items-center text-xs">
+                        <span className="font-mono text-gray-600 dark:text-gray-400 truncate">{email}</span>
+                        <span className="font-semibold text-indigo-600 dark:text-indigo-400">
+                            {seconds !== null ? `Waiting ${seconds}s` : accounts[email]}
+                        </span>
+                    </div>
+                );
+            })}
+        </div>
+    );
+};
+
 // Template Mobile View
 const TemplateMobile = ({ template, setTemplate, onSave }) => {
     const [testEmail, setTestEmail] = useState("");
@@ -537,7 +644,7 @@ const TemplateMobile = ({ template, setTemplate, onSave }) => {
 };
 
 // Recipients Mobile View
-const RecipientsMobile = ({ recipients, onUpload }) => (
+const RecipientsMobile = ({ recipients, total, filters, onFilter, onLoadMore, onUpload }) => (
     <div className="p-4 space-y-4">
         <div className="bg-white dark:bg-gray-800 rounded-2xl p-4 shadow-sm">
             <div className="flex items-center justify-between mb-4">
@@ -549,7 +656,27 @@ const RecipientsMobile = ({ recipients, onUpload }) => (
                 </label>
             </div>
             <div className="text-sm text-gray-600 dark:text-gray-400 mb-4">
-                Total: <span className="font-bold text-gray-900 dark:text-white">{recipients.length}</span> recipients
+                Total: <span className="font-bold text-gray-900 dark:text-white">{total}</span> recipients
+            </div>
+            <div className="flex space-x-2 mb-4">
+                <input
+                    type="search"
+                    placeholder="Email starts with..."
+                    defaultValue={filters.q}
+                    onKeyDown={(e) => e.key === 'Enter' && onFilter({ ...filters, q: e.target.value.trim() })}
+                    className="flex-1 min-w-0 p-2 text-sm rounded-lg border border-gray-200 dark:border-gray-700 bg-gray-50 dark:bg-gray-900 text-gray-900 dark:text-white"
+                />
+                <select
+                    value={filters.status}
+                    onChange={(e) => onFilter({ ...filters, status: e.target.value })}
+                    className="p-2 text-sm rounded-lg border border-gray-200 dark:border-gray-700 bg-gray-50 dark:bg-gray-900 text-gray-900 dark:text-white"
+                >
+                    <option value="">All</option>
+                    <option value="pending">Pending</option>
+                    <option value="sent">Sent</option>
+                    <option value="failed">Failed</option>
+                    <option value="unsubscribed">Unsubscribed</option>
+                </select>
             </div>
             <div className="space-y-2 max-h-96 overflow-y-auto">
                 {recipients.map((row, i) => (
@@ -562,17 +689,29 @@ const RecipientsMobile = ({ recipients, onUpload }) => (
                         ))}
                     </div>
                 ))}
+                {onLoadMore && (
+                    <button onClick={onLoadMore} className="w-full py-2 text-sm font-semibold text-indigo-600 dark:text-indigo-400">
+                        Load more
+                    </button>
+                )}
             </div>
         </div>
     </div>
 );
 
-// History Mobile View
+// History Mobile View (newest first)
 const HistoryMobile = () => {
     const [logs, setLogs] = useState([]);
+    const [cursor, setCursor] = useState(null);
+
+    const loadLogs = async (after = null) => {
+        const res = await axios.get(`${API_URL}/history`, { params: after ? { cursor: after } : {} });
+        setLogs(prev => after ? [...prev, ...res.data.logs] : res.data.logs);
+        setCursor(res.data.next_cursor);
+    };
 
     useEffect(() => {
-        axios.get(`${API_URL}/history`).then(res => setLogs(res.data.logs));
+        loadLogs();
     }, []);
 
     return (
@@ -585,6 +724,11 @@ const HistoryMobile = () => {
                             {log}
                         </div>
                     ))}
+                    {cursor && (
+                        <button onClick={() => loadLogs(cursor)} className="w-full py-2 text-sm font-semibold text-indigo-600 dark:text-indigo-400">
+                            Load older
+                        </button>
+                    )}
                 </div>
             </div>
         </div>
@@ -592,16 +736,17 @@ const HistoryMobile = () => {
 };
 
 // Settings Mobile View
-const SettingsMobile = ({ configs, onSave }) => {
-    const [localConfigs, setLocalConfigs] = useState(configs);
+const SettingsMobile = ({ onSave }) => {
+    const [localConfigs, setLocalConfigs] = useState([]);
     const [publicUrl, setPublicUrl] = useState("");
 
+    // Configs are no longer part of the polled /status payload
     useEffect(() => {
-        if (configs.length > 0) setLocalConfigs(configs);
         axios.get(`${API_URL}/config`).then(res => {
+            if (res.data.configs.length > 0) setLocalConfigs(res.data.configs);
             if (res.data.public_url) setPublicUrl(res.data.public_url);
         });
-    }, [configs]);
+    }, []);
 
     const handleChange = (index, field, value) => {
         const newConfigs = [...localConfigs];
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from database import SessionLocal, session_scope, ImportJob, RecipientStaging
+from csv_import import RecipientImporter
+
+
+class ImportJobRunner:
+    """
+    Runs CSV imports in the background. Each job stages its rows under a job id,
+    reports progress on its import_jobs row and swaps the user's list in one
+    transaction when parsing finishes.
+    """
+
+    def __init__(self, max_workers=2, stale_after=timedelta(minutes=5)):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import")
+        self.stale_after = stale_after
+        # Called with the user_id after a list has been swapped in
+        self.on_complete = None
+
+    def submit(self, user_id, fileobj, filename=None):
+        # Spool the upload to disk so it outlives the request
+        tmp = tempfile.NamedTemporaryFile(prefix="import_", suffix=".csv", delete=False)
+        with tmp:
+            shutil.copyfileobj(fileobj, tmp, 1024 * 1024)
+
+        job_id = uuid.uuid4().hex
+        with session_scope() as db:
+            db.add(ImportJob(id=job_id, user_id=user_id, filename=filename, status="queued"))
+
+        self.executor.submit(self._run, job_id, user_id, tmp.name)
+        return job_id
+
+    def _update(self, db, job_id, **fields):
+        fields["updated_at"] = datetime.utcnow()
+        db.query(ImportJob).filter(ImportJob.id == job_id).update(fields)
+        db.commit()
+
+    def _progress_fields(self, importer):
+        return {
+            "parsed": importer.parsed,
+            "inserted": importer.inserted,
+            "rejected": importer.rejected,
+            "rows_per_second": importer.rows_per_second,
+        }
+
+    def _run(self, job_id, user_id, path):
+        db = SessionLocal()
+        importer = RecipientImporter(
+            job_id, user_id,
+            on_progress=lambda imp: self._update(db, job_id, **self._progress_fields(imp))
+        )
+        try:
+            self._update(db, job_id, status="running")
+            with open(path, "rb") as f:
+                importer.stage(db, f)
+            importer.swap(db)
+            if self.on_complete:
+                self.on_complete(user_id)
+            self._update(
+                db, job_id,
+                status="completed",
+                rejects=json.dumps(importer.rejects),
+                finished_at=datetime.utcnow(),
+                **self._progress_fields(importer)
+            )
+        except Exception as e:
+            print(f"Import {job_id} failed: {e}")
+            try:
+                importer.discard(db)
+                self._update(
+                    db, job_id,
+                    status="failed",
+                    error=str(e),
+                    rejects=json.dumps(importer.rejects),
+                    finished_at=datetime.utcnow(),
+                    **self._progress_fields(importer)
+                )
+            except Exception as e2:
+                print(f"Recording import failure failed: {e2}")
+        finally:
+            db.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def to_dict(job, include_rejects=True):
+        data = {
+            "job_id": job.id,
+            "filename": job.filename,
+            "status": job.status,
+            "parsed": job.parsed or 0,
+            "inserted": job.inserted or 0,
+            "rejected": job.rejected or 0,
+            "rows_per_second": job.rows_per_second or 0,
+            "error": job.error,
+            "created_at": str(job.created_at),
+            "finished_at": str(job.finished_at) if job.finished_at else None,
+        }
+        if include_rejects:
+            data["rejects"] = json.loads(job.rejects) if job.rejects else []
+        return data
+
+    def fail_interrupted(self):
+        """Marks jobs whose worker died (no progress for stale_after) as failed and drops their staged rows."""
+        with session_scope() as db:
+            cutoff = datetime.utcnow() - self.stale_after
+            stale = db.query(ImportJob).filter(
+                ImportJob.status.in_(["queued", "running"]),
+                ImportJob.updated_at < cutoff
+            ).all()
+            for job in stale:
+                db.query(RecipientStaging).filter(RecipientStaging.job_id == job.id).delete(synchronize_session=False)
+                job.status = "failed"
+                job.error = "Interrupted by a server restart"
+                job.finished_at = datetime.utcnow()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+import_jobs = ImportJobRunner()
@@ -0,0 +1,146 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import exc as sa_exc, func
+from database import session_scope, CampaignLease
+
+LEASE_SECONDS = 60
+HEARTBEAT_SECONDS = 15
+
+# Identifies this process in lease tokens (and in the logs of whoever is blocked by one)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class CampaignLeases:
+    """
+    Per-user campaign ownership shared by every worker through campaign_leases.
+    acquire() either inserts the user's row or takes over one that has expired,
+    in a single conditional statement, so at most one worker holds it. A heartbeat
+    thread renews held leases; when renewal fails (the lease was taken over) or
+    another worker asked for a stop, the holder's on_revoked callback is called.
+    Expiry is compared against each worker's UTC clock, so nodes need NTP.
+    """
+
+    def __init__(self, ttl=LEASE_SECONDS, heartbeat=HEARTBEAT_SECONDS):
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self._held = {}  # token -> (user_id, on_revoked)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def acquire(self, user_id, on_revoked=None, expired_only=False):
+        """
+        Returns a lease token, or None if another run holds the user's lease.
+        expired_only takes over a lapsed lease (an interrupted run) but never starts a new one.
+        """
+        token = f"{WORKER_ID}:{uuid.uuid4().hex[:12]}"
+        now = datetime.utcnow()
+        values = {"owner": token, "expires_at": now + timedelta(seconds=self.ttl), "stop_requested": False}
+        try:
+            with session_scope() as db:
+                taken = db.query(CampaignLease).filter(
+                    CampaignLease.user_id == user_id,
+                    CampaignLease.expires_at < now
+                ).update(values, synchronize_session=False)
+                if not taken:
+                    if expired_only:
+                        return None
+                    # Fails on the primary key if a live lease exists
+                    db.add(CampaignLease(user_id=user_id, **values))
+        except sa_exc.IntegrityError:
+            return None
+        with self._lock:
+            self._held[token] = (user_id, on_revoked)
+        self._ensure_thread()
+        return token
+
+    def release(self, token):
+        with self._lock:
+            self._held.pop(token, None)
+        try:
+            with session_scope() as db:
+                db.query(CampaignLease).filter(CampaignLease.owner == token).delete(synchronize_session=False)
+        except Exception as e:
+            print(f"Releasing campaign lease failed: {e}")
+
+    def holder(self, user_id):
+        """The token of the live lease on user_id, if any worker holds one."""
+        with session_scope() as db:
+            return db.query(CampaignLease.owner).filter(
+                CampaignLease.user_id == user_id,
+                CampaignLease.expires_at >= datetime.utcnow()
+            ).scalar()
+
+    def expired_users(self):
+        """Users whose campaign lease lapsed without a release, i.e. whose worker died mid-run."""
+        with session_scope() as db:
+            rows = db.query(CampaignLease.user_id).filter(CampaignLease.expires_at < datetime.utcnow()).all()
+        return [r.user_id for r in rows]
+
+    def next_expiry(self):
+        """Seconds until the first live lease (held by any worker) runs out, or None if there are none."""
+        now = datetime.utcnow()
+        with session_scope() as db:
+            expires_at = db.query(func.min(CampaignLease.expires_at)).filter(CampaignLease.expires_at >= now).scalar()
+        return None if expires_at is None else (expires_at - now).total_seconds()
+
+    def request_stop(self, user_id):
+        """Flags the user's live lease; its holder stops at the next heartbeat."""
+        with session_scope() as db:
+            return db.query(CampaignLease).filter(
+                CampaignLease.user_id == user_id,
+                CampaignLease.expires_at >= datetime.utcnow()
+            ).update({CampaignLease.stop_requested: True}, synchronize_session=False) > 0
+
+    def _renew(self, token):
+        # Returns None if the lease is gone, else whether a stop was requested
+        with session_scope() as db:
+            renewed = db.query(CampaignLease).filter(CampaignLease.owner == token).update(
+                {CampaignLease.expires_at: datetime.utcnow() + timedelta(seconds=self.ttl)},
+                synchronize_session=False
+            )
+            if not renewed:
+                return None
+            return db.query(CampaignLease.stop_requested).filter(CampaignLease.owner == token).scalar()
+
+    def _revoke(self, token, reason):
+        with self._lock:
+            entry = self._held.pop(token, None)
+        if entry and entry[1]:
+            try:
+                entry[1](reason)
+            except Exception as e:
+                print(f"Lease revocation handler failed: {e}")
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="campaign-lease-heartbeat")
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat):
+            with self._lock:
+                tokens = list(self._held)
+            for token in tokens:
+                try:
+                    stop_requested = self._renew(token)
+                except Exception as e:
+                    # Keep running; the lease survives a missed beat or two
+                    print(f"Campaign lease heartbeat failed: {e}")
+                    continue
+                if stop_requested is None:
+                    self._revoke(token, "Campaign lease lost to another worker.")
+                elif stop_requested:
+                    self._revoke(token, "Stop requested from another worker.")
+
+    def shutdown(self):
+        self._stop.set()
+
+
+campaign_leases = CampaignLeases()
@@ -3,6 +3,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
 from datetime import datetime
+from smtp_pool import smtp_pool
 
 # --- Global Configuration ---
 # Number of messages to send per configuration before switching
@@ -149,12 +150,9 @@ for i, row in enumerate(rows[start_index:], start=start_index):
     msg.attach(MIMEText(html, "html"))
     
     try:
-        # 3. Connect to the SMTP server and send
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30) as s:
-            s.starttls()
-            s.login(SENDER_EMAIL, PASSWORD)
-            s.send_message(msg)
-            
+        # 3. Send over a pooled, already-authenticated session for this config
+        smtp_pool.send_message(current_config, msg)
+
         print(f"SUCCESS {i+1}/{total_recipients} -> {email}")
         sent_count_in_batch += 1
         
@@ -210,5 +208,6 @@ for i, row in enumerate(rows[start_index:], start=start_index):
             pause_with_countdown(SHORT_WAIT_SECONDS, "waiting...")
 
 # --- Final Cleanup ---
+smtp_pool.close_all()
 write_heartbeat("FINISHED")
 print("\nMailing process completed.")
\ No newline at end of file
@@ -0,0 +1,62 @@
+import base64
+import random
+import sys
+from email.header import Header
+from email.utils import formataddr, formatdate, make_msgid
+
+CRLF = b"\r\n"
+
+
+def _encode_header(value):
+    """RFC 2047-encodes a header value only when it isn't plain ASCII."""
+    try:
+        value.encode("ascii")
+        return value
+    except UnicodeEncodeError:
+        return Header(value, "utf-8").encode(linesep="\r\n")
+
+
+def _encode_address(name, address):
+    if not name:
+        return address
+    return formataddr((name, address), charset="utf-8")
+
+
+class MessageSkeleton:
+    """
+    The parts of a campaign message that are identical for every recipient
+    (headers, MIME boundaries, part headers), encoded to wire bytes once.
+    build() only encodes the per-recipient To/Date/Message-ID headers and the
+    HTML body, producing bytes ready for smtplib's sendmail().
+    """
+
+    def __init__(self, subject, from_name, from_email):
+        self.from_email = from_email
+        self.domain = from_email.rsplit("@", 1)[-1] if "@" in from_email else None
+        boundary = "=" * 15 + "%019d" % random.randrange(sys.maxsize) + "=="
+
+        self.head = (
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+            "MIME-Version: 1.0\r\n"
+            f"Subject: {_encode_header(subject)}\r\n"
+            f"From: {_encode_address(from_name, from_email)}\r\n"
+        ).encode("ascii")
+        self.body_open = (
+            "\r\n"
+            f"--{boundary}\r\n"
+            'Content-Type: text/html; charset="utf-8"\r\n'
+            "MIME-Version: 1.0\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+            "\r\n"
+        ).encode("ascii")
+        self.body_close = f"--{boundary}--\r\n".encode("ascii")
+
+    def build(self, to, html, message_id=None):
+        recipient_headers = (
+            f"To: {_encode_header(to)}\r\n"
+            f"Date: {formatdate(localtime=True)}\r\n"
+            f"Message-ID: {message_id or make_msgid(domain=self.domain)}\r\n"
+        ).encode("ascii")
+        # encodebytes wraps at 76 columns with bare LF; SMTP wants CRLF
+        body = base64.encodebytes(html.encode("utf-8")).replace(b"\n", CRLF)
+        return b"".join((self.head, recipient_headers, self.body_open, body, self.body_close))
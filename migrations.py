@@ -0,0 +1,220 @@
+"""
+Schema migrations for databases created before a model change.
+
+create_all() only creates missing tables, so anything that alters an existing
+table (new indexes, constraints, keys) is a numbered step here. Applied versions
+are recorded in schema_migrations; init_db() runs whatever is missing on startup.
+Steps must also be no-ops on a fresh database, where create_all() has already
+built the tables from the current models.
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+# Held while migrating so several app instances starting together don't race
+PG_LOCK_KEY = 724190315
+
+# --- 1: composite indexes and per-user uniqueness -----------------------------
+
+INDEXES_0001 = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_recipients_user_email ON recipients (user_id, email)",
+    "CREATE INDEX IF NOT EXISTS ix_recipients_user_status_id ON recipients (user_id, status, id)",
+    "CREATE INDEX IF NOT EXISTS ix_recipients_pending ON recipients (user_id, id) WHERE status = 'pending'",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_unsubscribes_user_email ON unsubscribes (user_id, email)",
+    "CREATE INDEX IF NOT EXISTS ix_campaign_logs_user_timestamp ON campaign_logs (user_id, timestamp DESC)",
+]
+
+# Single-column indexes that are now a prefix of (or covered by) one of the above
+REDUNDANT_INDEXES_0001 = [
+    "ix_recipients_user_id",
+    "ix_recipients_email",
+    "ix_unsubscribes_user_id",
+    "ix_unsubscribes_email",
+    "ix_campaign_logs_user_id",
+    "ix_app_configs_key",
+    "ix_app_configs_user_id",
+]
+
+
+def _dedupe_recipients(conn):
+    # A duplicate that was already sent/failed wins over a pending copy, so the
+    # surviving row never re-sends to someone who was already mailed.
+    conn.execute(text(
+        "DELETE FROM recipients WHERE status = 'pending' AND EXISTS ("
+        " SELECT 1 FROM recipients r2 WHERE r2.user_id = recipients.user_id"
+        " AND r2.email = recipients.email AND r2.status <> 'pending')"
+    ))
+    conn.execute(text(
+        "DELETE FROM recipients WHERE id NOT IN ("
+        " SELECT MIN(id) FROM recipients GROUP BY user_id, email)"
+    ))
+
+
+def _dedupe_unsubscribes(conn):
+    # Older rows were stored as typed; suppression compares normalized addresses
+    conn.execute(text("UPDATE unsubscribes SET email = LOWER(TRIM(email)) WHERE email <> LOWER(TRIM(email))"))
+    conn.execute(text(
+        "DELETE FROM unsubscribes WHERE id NOT IN ("
+        " SELECT MIN(id) FROM unsubscribes GROUP BY user_id, email)"
+    ))
+
+
+def _app_configs_per_user(conn):
+    pk = inspect(conn).get_pk_constraint("app_configs")
+    if sorted(pk["constrained_columns"]) == ["key", "user_id"]:
+        return
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(f'ALTER TABLE app_configs DROP CONSTRAINT "{pk["name"]}"'))
+        conn.execute(text("ALTER TABLE app_configs ADD PRIMARY KEY (user_id, key)"))
+    else:
+        # SQLite can't alter a primary key; rebuild the table
+        conn.execute(text(
+            "CREATE TABLE app_configs_new ("
+            " user_id VARCHAR NOT NULL, key VARCHAR NOT NULL, value TEXT NOT NULL,"
+            " PRIMARY KEY (user_id, key))"
+        ))
+        conn.execute(text("INSERT INTO app_configs_new (user_id, key, value) SELECT user_id, key, value FROM app_configs"))
+        conn.execute(text("DROP TABLE app_configs"))
+        conn.execute(text("ALTER TABLE app_configs_new RENAME TO app_configs"))
+
+
+def migrate_0001(conn):
+    _dedupe_recipients(conn)
+    _dedupe_unsubscribes(conn)
+    for ddl in INDEXES_0001:
+        conn.execute(text(ddl))
+    for name in REDUNDANT_INDEXES_0001:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    _app_configs_per_user(conn)
+
+
+# --- 2: send/failure/unsubscribe rollups in campaign_counters -----------------
+
+COLUMNS_0002 = [
+    ("campaign_counters", "sent", "INTEGER NOT NULL DEFAULT 0"),
+    ("campaign_counters", "failed", "INTEGER NOT NULL DEFAULT 0"),
+    ("campaign_counters", "unsubscribed", "INTEGER NOT NULL DEFAULT 0"),
+    ("unsubscribes", "campaign_id", "VARCHAR"),
+]
+
+
+def migrate_0002(conn):
+    import counters
+    for table, column, ddl in COLUMNS_0002:
+        existing = {c["name"] for c in inspect(conn).get_columns(table)}
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    # Backfill from what was sent and unsubscribed so far
+    counters.rebuild(conn)
+
+
+# --- 3: indexes for paging through /recipients ------------------------------
+
+INDEXES_0003 = [
+    "CREATE INDEX IF NOT EXISTS ix_recipients_user_id_id ON recipients (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_recipients_user_status_email ON recipients (user_id, status, email)",
+]
+
+
+def migrate_0003(conn):
+    for ddl in INDEXES_0003:
+        conn.execute(text(ddl))
+
+
+# --- 4: recipient attributes as JSONB ------------------------------------------
+
+def migrate_0004(conn):
+    # SQLite keeps the JSON text as it is; the JSON column type decodes it on read
+    if conn.dialect.name != "postgresql":
+        return
+    for table in ("recipients", "recipients_staging"):
+        column = next(c for c in inspect(conn).get_columns(table) if c["name"] == "data")
+        if column["type"].__class__.__name__ != "JSONB":
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN data TYPE JSONB USING NULLIF(data, '')::jsonb"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_recipients_data ON recipients USING GIN (data jsonb_path_ops)"))
+
+
+# --- 5: campaigns pin a template version ---------------------------------------
+
+def migrate_0005(conn):
+    if "template_version" not in {c["name"] for c in inspect(conn).get_columns("campaigns")}:
+        conn.execute(text("ALTER TABLE campaigns ADD COLUMN template_version INTEGER"))
+
+
+# --- 6: one rate limit row per account window, and persisted parking ----------
+
+def migrate_0006(conn):
+    if "parked_until" not in {c["name"] for c in inspect(conn).get_columns("rate_limit_states")}:
+        conn.execute(text("ALTER TABLE rate_limit_states ADD COLUMN parked_until FLOAT"))
+    # Concurrent first saves could insert a window twice; the newest row is the live one.
+    # "window" is a keyword in PostgreSQL
+    conn.execute(text(
+        "DELETE FROM rate_limit_states WHERE id NOT IN ("
+        ' SELECT MAX(id) FROM rate_limit_states GROUP BY user_id, account, "window")'
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_rate_limit_states_user_account_window"
+        ' ON rate_limit_states (user_id, account, "window")'
+    ))
+    conn.execute(text("DROP INDEX IF EXISTS ix_rate_limit_states_user_id"))
+
+
+# --- 7: email prefix search in byte order ----------------------------------------
+
+def migrate_0007(conn):
+    # SQLite compares in byte order already; Postgres needs a "C" index for the range
+    if conn.dialect.name == "postgresql":
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_recipients_user_email_c ON recipients (user_id, email COLLATE "C")'))
+
+
+MIGRATIONS = [
+    (1, "composite indexes, unique (user_id, email), per-user app_configs key", migrate_0001),
+    (2, "sent, failed and unsubscribed counters", migrate_0002),
+    (3, "recipients paging indexes", migrate_0003),
+    (4, "recipient attributes as JSONB with a GIN index", migrate_0004),
+    (5, "campaigns.template_version", migrate_0005),
+    (6, "unique rate limit windows, rate_limit_states.parked_until", migrate_0006),
+    (7, "recipients email prefix index in the C collation", migrate_0007),
+]
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+    conn.commit()
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine):
+    """Applies every migration not yet recorded, each in its own transaction."""
+    with engine.connect() as conn:
+        is_pg = conn.dialect.name == "postgresql"
+        if is_pg:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": PG_LOCK_KEY})
+            conn.commit()
+        try:
+            _ensure_table(conn)
+            done = applied_versions(conn)
+            conn.commit()
+            for version, name, step in MIGRATIONS:
+                if version in done:
+                    continue
+                try:
+                    step(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                        {"v": version, "n": name, "t": datetime.utcnow()},
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                print(f"Applied migration {version}: {name}")
+        finally:
+            if is_pg:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PG_LOCK_KEY})
+                conn.commit()
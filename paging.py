@@ -0,0 +1,59 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, true
+from database import engine
+
+MAX_PAGE_SIZE = 1000
+
+
+class BadCursor(ValueError):
+    pass
+
+
+def page_size(limit, default=100):
+    return min(max(limit or default, 1), MAX_PAGE_SIZE)
+
+
+def encode_cursor(*values):
+    """Opaque cursor for the position after a row; datetimes survive the round trip."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    """The values encode_cursor was given, converted to types (int, str, datetime)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(types):
+            raise ValueError("wrong length")
+        return [datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)]
+    except (ValueError, TypeError) as e:
+        raise BadCursor(f"Invalid cursor: {e}")
+
+
+def after(columns, values, descending=False):
+    """Keyset condition: rows strictly past values in (columns) order."""
+    first, rest = columns[0], columns[1:]
+    past = first < values[0] if descending else first > values[0]
+    if not rest:
+        return past
+    # Spelled out (rather than a row comparison) so an index on the first column
+    # is used for the range
+    bound = first <= values[0] if descending else first >= values[0]
+    return and_(bound, or_(past, and_(first == values[0], after(rest, values[1:], descending))))
+
+
+def prefix_filter(column, prefix):
+    """
+    column starts with prefix, written as a range an index on column can seek
+    into. The range only holds in byte order, so on Postgres it is compared in
+    the "C" collation: others (en_US ignores punctuation) can sort a match
+    outside it. An empty prefix matches everything.
+    """
+    if not prefix:
+        return true()
+    if engine.dialect.name == "postgresql":
+        column = column.collate("C")
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
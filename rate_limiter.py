@@ -0,0 +1,134 @@
+import time
+from database import session_scope, upsert_insert, RateLimitState
+from smtp_errors import backoff_delay
+
+WINDOW_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+
+class TokenBucket:
+    """Holds up to `capacity` tokens and refills them evenly over `period` seconds."""
+
+    def __init__(self, capacity, period, tokens=None, refilled_at=None):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity if tokens is None else min(float(tokens), self.capacity)
+        self.refilled_at = time.time() if refilled_at is None else refilled_at
+
+    def refill(self, now):
+        elapsed = max(0.0, now - self.refilled_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.refilled_at = now
+
+    def wait_time(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self.refill(now)
+        self.tokens -= 1
+
+
+class AccountRateLimiter:
+    """
+    Per-minute, per-hour and per-day token buckets for one SMTP account. Implements
+    the throttle interface SendEngine expects (delay / record_send / record_failure)
+    and persists bucket levels after every send so quotas survive a restart.
+    Consecutive failures back the account off exponentially, and park() takes it
+    out of rotation for a fixed time (e.g. until a provider quota resets), which
+    is persisted too.
+    """
+
+    def __init__(self, user_id, account, limits, store=None, error_wait=5, max_error_wait=300):
+        self.user_id = user_id
+        self.account = account
+        self.store = store
+        self.error_wait = error_wait
+        self.max_error_wait = max_error_wait
+        self.failures = 0
+        self.backoff_until = 0.0
+
+        saved, parked_until = store.load(user_id, account) if store else ({}, None)
+        self.parked_until = parked_until or 0.0
+        self.buckets = {}
+        for window, capacity in limits.items():
+            if not capacity:
+                continue
+            tokens, refilled_at = saved.get(window, (None, None))
+            self.buckets[window] = TokenBucket(capacity, WINDOW_SECONDS[window], tokens, refilled_at)
+
+    def delay(self):
+        now = time.time()
+        waits = [b.wait_time(now) for b in self.buckets.values()]
+        waits.append(self.backoff_until - now)
+        waits.append(self.parked_until - now)
+        return max(0.0, *waits)
+
+    def record_send(self):
+        now = time.time()
+        for bucket in self.buckets.values():
+            bucket.consume(now)
+        self.failures = 0
+        if self.store:
+            self.store.save(self.user_id, self.account, self.buckets, self.parked_until)
+
+    def record_failure(self):
+        self.failures += 1
+        wait = backoff_delay(self.failures, self.error_wait, self.max_error_wait)
+        self.backoff_until = max(self.backoff_until, time.time() + wait)
+
+    def park(self, seconds):
+        self.parked_until = max(self.parked_until, time.time() + seconds)
+        if self.store:
+            self.store.save(self.user_id, self.account, self.buckets, self.parked_until)
+
+
+# Row that carries the parking of an account with no windows to save it on
+PARKED_WINDOW = "parked"
+
+
+class RateLimitStore:
+    """Loads and saves bucket levels, and parking, in the rate_limit_states table."""
+
+    def load(self, user_id, account):
+        """({window: (tokens, refilled_at)}, parked_until or None)"""
+        with session_scope() as db:
+            rows = db.query(RateLimitState).filter(
+                RateLimitState.user_id == user_id,
+                RateLimitState.account == account
+            ).all()
+            parked = [r.parked_until for r in rows if r.parked_until]
+            buckets = {r.window: (r.tokens, r.refilled_at) for r in rows if r.window != PARKED_WINDOW}
+            return buckets, max(parked, default=None)
+
+    def save(self, user_id, account, buckets, parked_until=None):
+        table = RateLimitState.__table__
+        rows = [
+            {"user_id": user_id, "account": account, "window": window, "tokens": bucket.tokens,
+             "refilled_at": bucket.refilled_at, "parked_until": parked_until or None}
+            for window, bucket in buckets.items()
+        ]
+        if not rows:
+            if not parked_until:
+                return
+            rows = [{"user_id": user_id, "account": account, "window": PARKED_WINDOW, "tokens": 0.0,
+                     "refilled_at": time.time(), "parked_until": parked_until}]
+        stmt = upsert_insert(table)
+        # One statement, so two workers saving the same account never insert a window twice
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "account", "window"],
+            set_={c: stmt.excluded[c] for c in ("tokens", "refilled_at", "parked_until")},
+        )
+        try:
+            with session_scope() as db:
+                db.execute(stmt, rows)
+        except Exception as e:
+            print(f"Saving rate limit state failed: {e}")
+
+
+rate_limit_store = RateLimitStore()
@@ -1,78 +1,222 @@
+import heapq
 import threading
-import time
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from database import get_db, Schedule
+from database import session_scope, Schedule
+from leases import campaign_leases
+
+# Schedules created by another instance (or edited in the DB) are picked up on
+# the next reconcile; local /schedules changes wake the loop immediately.
+RECONCILE_SECONDS = 300
+# A schedule whose user already has a campaign running is retried this much later
+BUSY_RETRY_SECONDS = 30
+# Checked this long after a lease's expiry, so it has lapsed by then if nobody renewed it
+SWEEP_MARGIN_SECONDS = 1
 
 class CampaignScheduler:
+    """
+    Keeps pending schedules in a min-heap ordered by scheduled_time and sleeps
+    on a condition until the earliest one is due. add()/remove() wake it early.
+    Heap entries are never removed in place: _due holds each pending schedule's
+    current time, and entries that no longer match it are skipped when popped.
+
+    Every worker runs one of these over the same table. A due row is claimed with
+    a conditional pending -> completed update before its campaign starts, and the
+    campaign itself only starts if the user's lease (leases.py) is free. A start
+    that is refused puts the row back to pending and retries it BUSY_RETRY_SECONDS
+    later; a recurring schedule's next run is only added once a start succeeded.
+
+    The loop also resumes interrupted campaigns, so a run whose worker died is
+    picked up by a surviving worker, or by the same one after a restart once the
+    old lease has lapsed. It looks for lapsed leases on every reconcile and, while
+    any live lease exists, again when the earliest one is due to expire; with no
+    campaign running it doesn't poll.
+    """
+
     def __init__(self, get_manager_func):
         self.get_manager = get_manager_func
         self.is_running = False
         self.thread = None
-        
+        self._heap = []  # (scheduled_time, schedule_id)
+        self._due = {}   # schedule_id -> scheduled_time
+        self._cond = threading.Condition()
+        self._reconcile_at = None
+        self._sweep_at = None
+
     def start_scheduler(self):
         if self.is_running:
             return
         self.is_running = True
+        self._reconcile_at = None
+        self._sweep_at = None
         self.thread = threading.Thread(target=self._scheduler_loop, daemon=True)
         self.thread.start()
         print("Campaign scheduler started")
-    
+
     def stop_scheduler(self):
-        self.is_running = False
+        with self._cond:
+            self.is_running = False
+            self._cond.notify_all()
         print("Campaign scheduler stopped")
-    
+
+    def add(self, schedule_id, scheduled_time):
+        with self._cond:
+            self._push(schedule_id, scheduled_time)
+            self._cond.notify_all()
+
+    def remove(self, schedule_id):
+        with self._cond:
+            self._due.pop(schedule_id, None)
+            self._cond.notify_all()
+
+    def _push(self, schedule_id, scheduled_time):
+        # Caller holds _cond
+        self._due[schedule_id] = scheduled_time
+        heapq.heappush(self._heap, (scheduled_time, schedule_id))
+
+    def _reload(self):
+        with session_scope() as db:
+            rows = db.query(Schedule.id, Schedule.scheduled_time).filter(Schedule.status == 'pending').all()
+        with self._cond:
+            self._due = {r.id: r.scheduled_time for r in rows}
+            self._heap = [(t, i) for i, t in self._due.items()]
+            heapq.heapify(self._heap)
+        self._reconcile_at = datetime.now() + timedelta(seconds=RECONCILE_SECONDS)
+        self._sweep()
+
+    def _pop_due(self, now):
+        # Caller holds _cond. Returns due schedule ids, or the seconds until the next one.
+        due = []
+        while self._heap:
+            scheduled_time, schedule_id = self._heap[0]
+            if self._due.get(schedule_id) != scheduled_time:
+                heapq.heappop(self._heap)  # removed or rescheduled
+                continue
+            if scheduled_time > now:
+                break
+            heapq.heappop(self._heap)
+            del self._due[schedule_id]
+            due.append(schedule_id)
+        if due:
+            return due, 0
+        until_reconcile = (self._reconcile_at - now).total_seconds()
+        if not self._heap:
+            return [], until_reconcile
+        return [], min((self._heap[0][0] - now).total_seconds(), until_reconcile)
+
+    def resume_interrupted(self):
+        # A lease that expired instead of being released belongs to a run that was
+        # cut off; restarting it drains the rest of its send queue. Taking over the
+        # lapsed lease is one conditional update, so one worker resumes each campaign.
+        for user_id in campaign_leases.expired_users():
+            if self.get_manager(user_id).start_process(resume=True):
+                print(f"Resumed interrupted campaign for user {user_id}")
+
+    def _sweep(self):
+        self.resume_interrupted()
+        # Look again once the earliest remaining lease could have lapsed; heartbeats
+        # keep pushing a live one's expiry back, so that's about once a lease period
+        expires_in = campaign_leases.next_expiry()
+        if expires_in is None:
+            self._sweep_at = None
+        else:
+            self._sweep_at = datetime.now() + timedelta(seconds=max(expires_in, 0) + SWEEP_MARGIN_SECONDS)
+
     def _scheduler_loop(self):
         while self.is_running:
             try:
-                db = next(get_db())
-                now = datetime.now()
-                
-                # Find pending schedules due now or in the past
-                pending_schedules = db.query(Schedule).filter(
-                    Schedule.status == 'pending',
-                    Schedule.scheduled_time <= now
-                ).all()
-                
-                for schedule in pending_schedules:
-                    print(f"Triggering scheduled campaign: {schedule.name} for user {schedule.user_id}")
-                    
-                    # Get manager for this user
-                    manager = self.get_manager(schedule.user_id)
-                    
-                    if not manager.is_running:
-                        manager.start_process()
-                        
-                        # Update status
-                        schedule.status = "completed"
-                        
-                        # Handle Recurring
-                        if schedule.recurring and schedule.recurring != "none":
-                            next_time = None
-                            if schedule.recurring == "daily":
-                                next_time = schedule.scheduled_time + timedelta(days=1)
-                            elif schedule.recurring == "weekly":
-                                next_time = schedule.scheduled_time + timedelta(weeks=1)
-                            
-                            if next_time:
-                                # Create new schedule for next run
-                                new_schedule = Schedule(
-                                    user_id=schedule.user_id,
-                                    name=schedule.name,
-                                    scheduled_time=next_time,
-                                    recurring=schedule.recurring,
-                                    status="pending"
-                                )
-                                db.add(new_schedule)
-                                print(f"Rescheduled '{schedule.name}' for {next_time}")
-
-                        db.commit()
-                    else:
-                        print(f"Skipping schedule {schedule.id}: Manager already running for user {schedule.user_id}")
-                
-                db.close()
-                time.sleep(30) # Check every 30s
-                
+                if self._reconcile_at is None or datetime.now() >= self._reconcile_at:
+                    self._reload()
+                elif self._sweep_at is not None and datetime.now() >= self._sweep_at:
+                    self._sweep()
+                with self._cond:
+                    due, wait = self._pop_due(datetime.now())
+                    if not due:
+                        if self._sweep_at is not None:
+                            wait = min(wait, (self._sweep_at - datetime.now()).total_seconds())
+                        self._cond.wait(timeout=max(wait, 0))
+                        continue
+                with session_scope() as db:
+                    self._trigger_due(db, due)
             except Exception as e:
                 print(f"Scheduler error: {e}")
-                time.sleep(30)
+                # Retry from the DB rather than spinning on a broken heap
+                with self._cond:
+                    self._reconcile_at = datetime.now() + timedelta(seconds=BUSY_RETRY_SECONDS)
+                    self._cond.wait(timeout=BUSY_RETRY_SECONDS)
+
+    def _trigger_due(self, db, schedule_ids):
+        now = datetime.now()
+
+        # Re-read the rows: they may have been deleted or triggered elsewhere.
+        # Rows another worker is claiming right now are skipped, not waited on.
+        pending_schedules = db.query(Schedule).filter(
+            Schedule.id.in_(schedule_ids),
+            Schedule.status == 'pending',
+            Schedule.scheduled_time <= now
+        ).with_for_update(skip_locked=True).all()
+
+        for schedule in pending_schedules:
+            schedule_id, user_id, name = schedule.id, schedule.user_id, schedule.name
+
+            # Get manager for this user
+            manager = self.get_manager(user_id)
+
+            # Claim the row: only one worker sees it change from pending (SQLite
+            # has no row locks, so this is what keeps the trigger exactly-once there)
+            claimed = db.query(Schedule).filter(
+                Schedule.id == schedule_id,
+                Schedule.status == 'pending'
+            ).update({Schedule.status: "completed"}, synchronize_session=False)
+            if not claimed:
+                continue
+
+            if manager.is_running or campaign_leases.holder(user_id):
+                print(f"Skipping schedule {schedule_id}: Campaign already running for user {user_id}")
+                self._retry_later(db, schedule_id, now)
+                continue
+
+            # Commit before starting: the campaign lease is taken on another connection
+            db.commit()
+            print(f"Triggering scheduled campaign: {name} for user {user_id}")
+            try:
+                started = manager.start_process(scheduled=True)
+            except Exception as e:
+                print(f"Schedule {schedule_id} failed to start: {e}")
+                started = False
+            if not started:
+                # Lost the lease to a run that started meanwhile: try again later
+                # rather than dropping this send
+                print(f"Schedule {schedule_id} not started; retrying in {BUSY_RETRY_SECONDS}s")
+                self._retry_later(db, schedule_id, now)
+                continue
+
+            # Handle Recurring
+            new_schedule = None
+            if schedule.recurring and schedule.recurring != "none":
+                next_time = None
+                if schedule.recurring == "daily":
+                    next_time = schedule.scheduled_time + timedelta(days=1)
+                elif schedule.recurring == "weekly":
+                    next_time = schedule.scheduled_time + timedelta(weeks=1)
+
+                if next_time:
+                    # Create new schedule for next run
+                    new_schedule = Schedule(
+                        user_id=user_id,
+                        name=name,
+                        scheduled_time=next_time,
+                        recurring=schedule.recurring,
+                        status="pending"
+                    )
+                    db.add(new_schedule)
+                    print(f"Rescheduled '{name}' for {next_time}")
+
+            db.commit()
+            if new_schedule is not None:
+                self.add(new_schedule.id, new_schedule.scheduled_time)
+
+    def _retry_later(self, db, schedule_id, now):
+        db.query(Schedule).filter(Schedule.id == schedule_id).update(
+            {Schedule.status: "pending"}, synchronize_session=False)
+        db.commit()
+        self.add(schedule_id, now + timedelta(seconds=BUSY_RETRY_SECONDS))
@@ -0,0 +1,55 @@
+from sqlalchemy import and_, or_, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from database import engine, Recipient
+
+MAX_SEGMENT_KEYS = 20
+
+
+class InvalidSegment(ValueError):
+    pass
+
+
+def validate(segment):
+    """
+    A segment maps recipient attributes to the value they must have, or to a
+    list of allowed values: {"city": "Accra", "plan": ["pro", "team"]}. Keys are
+    ANDed. Values compare as stored, and CSV imports store every attribute as a string.
+    """
+    if not isinstance(segment, dict) or not segment:
+        raise InvalidSegment("segment must be a non-empty object")
+    if len(segment) > MAX_SEGMENT_KEYS:
+        raise InvalidSegment(f"segment can have at most {MAX_SEGMENT_KEYS} attributes")
+    for key, value in segment.items():
+        if not key or '"' in key or "\\" in key:
+            raise InvalidSegment(f"invalid attribute name: {key!r}")
+        values = value if isinstance(value, list) else [value]
+        if not values or not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+            raise InvalidSegment(f"{key} must be a string, a number, or a non-empty list of them")
+    return segment
+
+
+def _contains(values):
+    # data @> '{"key": value}', answered by the GIN index on recipients.data
+    return type_coerce(Recipient.data, JSONB).contains(values)
+
+
+def _matches(key, value):
+    if engine.dialect.name == "postgresql":
+        return _contains({key: value})
+    attr = Recipient.data[key]
+    return attr.as_string() == value if isinstance(value, str) else attr.as_float() == value
+
+
+def segment_filter(segment):
+    """SQL condition selecting the recipients in segment (see validate)."""
+    conditions = []
+    exact = {k: v for k, v in validate(segment).items() if not isinstance(v, list)}
+    if exact and engine.dialect.name == "postgresql":
+        # All single-valued keys in one containment test
+        conditions.append(_contains(exact))
+    else:
+        conditions.extend(_matches(k, v) for k, v in exact.items())
+    for key, values in segment.items():
+        if isinstance(values, list):
+            conditions.append(or_(*(_matches(key, v) for v in values)))
+    return and_(*conditions)
@@ -0,0 +1,106 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SendEngine:
+    """
+    Runs one worker per SMTP config on a thread pool. Workers pull recipients from
+    a shared bounded queue, so total throughput scales with the number of accounts
+    while each account is paced by its own throttle. A worker whose account is out
+    of budget waits on its own; the others keep draining the queue.
+
+    send_one(config, recipient) performs the send and returns True (sent, counts
+    against the account's throttle), False (failed, backs the account off) or None
+    (nothing to count: skipped, bounced, or handed back to the queue).
+    make_throttle(config) builds the per-account throttle, an object
+    with delay() / record_send() / record_failure() (see
+    rate_limiter.AccountRateLimiter). on_error(config, recipient, exc) is told
+    about an exception escaping send_one; the worker moves on to the next one.
+    """
+
+    def __init__(self, configs, send_one, make_throttle, stop_event, queue_size=100, on_wait=None, on_error=None):
+        self.configs = configs
+        self.send_one = send_one
+        self.make_throttle = make_throttle
+        self.stop_event = stop_event
+        self.on_wait = on_wait
+        self.on_error = on_error
+        self.queue = queue.Queue(maxsize=queue_size)
+
+    def run(self, recipients):
+        self._exhausted = threading.Event()
+        self._alive = len(self.configs)
+        self._alive_lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=len(self.configs), thread_name_prefix="sender") as pool:
+            workers = [pool.submit(self._worker, config) for config in self.configs]
+            try:
+                self._produce(recipients)
+            finally:
+                self._exhausted.set()
+            for w in workers:
+                w.result()
+
+    def _produce(self, recipients):
+        for recipient in recipients:
+            while True:
+                if self.stop_event.is_set() or not self._alive:
+                    return
+                try:
+                    self.queue.put(recipient, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+
+    def _drained(self):
+        return self._exhausted.is_set() and self.queue.empty()
+
+    def idle(self):
+        """True when every recipient handed to the engine so far has been processed."""
+        with self.queue.mutex:
+            return self.queue.unfinished_tasks == 0
+
+    def working(self):
+        """False once every worker has exited, after which nothing queued will be processed."""
+        return self._alive > 0
+
+    def _worker(self, config):
+        try:
+            self._work(config)
+        finally:
+            with self._alive_lock:
+                self._alive -= 1
+
+    def _work(self, config):
+        throttle = self.make_throttle(config)
+        while not self.stop_event.is_set():
+            delay = throttle.delay()
+            if delay > 0:
+                if self.on_wait:
+                    self.on_wait(config, delay)
+                # Wait in slices so an account that is out of budget notices when
+                # the other accounts have already finished the list
+                if self.stop_event.wait(min(delay, 1.0)) or self._drained():
+                    break
+                continue
+
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._exhausted.is_set():
+                    break
+                continue
+            try:
+                if self.stop_event.is_set():
+                    break
+                result = self.send_one(config, item)
+            except Exception as e:
+                result = None
+                if self.on_error:
+                    self.on_error(config, item, e)
+            finally:
+                self.queue.task_done()
+            if result:
+                throttle.record_send()
+            elif result is False:
+                throttle.record_failure()
@@ -0,0 +1,253 @@
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, func, literal, or_, select, update
+from database import session_scope, Campaign, Recipient, SendQueueItem
+from segments import segment_filter
+from smtp_errors import backoff_delay
+import counters
+
+QUEUED = "queued"
+CLAIMED = "claimed"
+RETRY = "retry"
+SENT = "sent"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+ACTIVE_STATES = (QUEUED, CLAIMED, RETRY)
+DONE_STATES = (SENT, FAILED, SKIPPED)
+
+# Final states that count towards campaign_counters
+COUNTED_STATES = {SENT: "sent", FAILED: "failed"}
+
+
+def message_id_for(campaign_id, item_id, domain):
+    """Message-ID of an outbox item; stable across retries so duplicates can be spotted."""
+    return f"<{campaign_id}.{item_id}@{domain or 'localhost'}>"
+
+
+class SendQueue:
+    """
+    Durable outbox for campaign sends. Each pending recipient gets a row when a
+    run starts; a sender claims the row (attempts + 1, lease expiry) right before
+    the SMTP call and marks it sent/failed together with the recipient afterwards.
+    A row left claimed by a crashed worker becomes ready again once its lease
+    expires, so delivery is at-least-once: the only duplicate window is a crash
+    between the server accepting a message and the commit after it, and the
+    retry reuses the same Message-ID. Finished rows are kept as the delivery
+    history that counters.rebuild() recomputes sent/failed totals from.
+    """
+
+    def __init__(self, claim_seconds=300, max_attempts=5, retry_seconds=60, max_retry_seconds=3600):
+        self.claim_seconds = claim_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+
+    def _ready(self, now):
+        return or_(
+            SendQueueItem.state == QUEUED,
+            and_(SendQueueItem.state == RETRY, SendQueueItem.retry_at <= now),
+            and_(SendQueueItem.state == CLAIMED, SendQueueItem.lease_expires_at < now),
+        )
+
+    def prepare(self, user_id, segment=None, template_version=None, replace=True):
+        """
+        Brings the user's outbox in line with their pending recipients before a run,
+        limited to segment (see segments.py) if one is given. An unfinished run is
+        resumed under its campaign id when it was started with the same segment and
+        template version, or whatever it was started with if replace is False;
+        otherwise its remaining items are dropped and a new run starts with these.
+        Returns (campaign_id, active items, resumed, template_version, replaced).
+        """
+        now = datetime.utcnow()
+        with session_scope() as db:
+            pending = select(Recipient.id).where(Recipient.user_id == user_id, Recipient.status == 'pending')
+            # Recipients removed by an upload, or handled outside the queue
+            db.query(SendQueueItem).filter(
+                SendQueueItem.user_id == user_id,
+                SendQueueItem.state.in_(ACTIVE_STATES),
+                SendQueueItem.recipient_id.not_in(pending)
+            ).delete(synchronize_session=False)
+
+            campaign_id = db.query(SendQueueItem.campaign_id).filter(
+                SendQueueItem.user_id == user_id,
+                SendQueueItem.state.in_(ACTIVE_STATES)
+            ).order_by(SendQueueItem.id).limit(1).scalar()
+            replaced = False
+            if campaign_id is not None:
+                campaign = db.query(Campaign.segment, Campaign.template_version).filter(Campaign.id == campaign_id).first()
+                if campaign and not replace:
+                    segment = campaign.segment
+                    template_version = campaign.template_version or template_version
+                elif campaign and ((campaign.segment or None) != (segment or None) or
+                                   campaign.template_version not in (None, template_version)):
+                    # Started again with other settings: the old run ends here, and its
+                    # recipients (still pending) go to the new one
+                    db.query(SendQueueItem).filter(
+                        SendQueueItem.user_id == user_id,
+                        SendQueueItem.state.in_(ACTIVE_STATES)
+                    ).delete(synchronize_session=False)
+                    campaign_id = None
+                    replaced = True
+            resumed = campaign_id is not None
+            if not resumed:
+                campaign_id = uuid.uuid4().hex
+                db.add(Campaign(id=campaign_id, user_id=user_id, segment=segment,
+                                template_version=template_version, created_at=now))
+
+            queued = select(SendQueueItem.recipient_id).where(
+                SendQueueItem.user_id == user_id,
+                SendQueueItem.state.in_(ACTIVE_STATES)
+            )
+            new_items = select(
+                Recipient.user_id, literal(campaign_id), Recipient.id, literal(QUEUED),
+                literal(0), literal(now), literal(now)
+            ).where(
+                Recipient.user_id == user_id,
+                Recipient.status == 'pending',
+                Recipient.id.not_in(queued)
+            ).order_by(Recipient.id)
+            if segment:
+                new_items = new_items.where(segment_filter(segment))
+            db.execute(SendQueueItem.__table__.insert().from_select(
+                ["user_id", "campaign_id", "recipient_id", "state", "attempts", "created_at", "updated_at"],
+                new_items
+            ))
+
+            active = db.query(func.count(SendQueueItem.id)).filter(
+                SendQueueItem.user_id == user_id,
+                SendQueueItem.state.in_(ACTIVE_STATES)
+            ).scalar()
+        return campaign_id, active, resumed, template_version, replaced
+
+    def ready_chunk(self, user_id, after_id, limit):
+        """Ready items after after_id, in id order, as (item_id, recipient_id, email, data)."""
+        with session_scope() as db:
+            return db.query(
+                SendQueueItem.id, SendQueueItem.recipient_id, Recipient.email, Recipient.data
+            ).join(Recipient, Recipient.id == SendQueueItem.recipient_id).filter(
+                SendQueueItem.user_id == user_id,
+                SendQueueItem.id > after_id,
+                self._ready(datetime.utcnow())
+            ).order_by(SendQueueItem.id).limit(limit).all()
+
+    def next_retry_at(self, user_id):
+        """
+        When the user's next unfinished item becomes ready again: a retry coming due,
+        or a claim lapsing. The latter are items a crashed worker was sending, which
+        a resumed run has to wait for rather than finish without. None if there are none.
+        """
+        ready_at = case(
+            (SendQueueItem.state == RETRY, SendQueueItem.retry_at),
+            else_=SendQueueItem.lease_expires_at,
+        )
+        with session_scope() as db:
+            return db.query(func.min(ready_at)).filter(
+                SendQueueItem.user_id == user_id,
+                SendQueueItem.state.in_((RETRY, CLAIMED))
+            ).scalar()
+
+    def claim(self, item_id, owner, message_id):
+        """
+        Takes an item for sending. Returns (attempts, message_id), or None when the
+        item is no longer ready (already sent, claimed, or not yet due for retry).
+        """
+        now = datetime.utcnow()
+        with session_scope() as db:
+            claimed = db.query(SendQueueItem).filter(
+                SendQueueItem.id == item_id,
+                self._ready(now)
+            ).update({
+                SendQueueItem.state: CLAIMED,
+                SendQueueItem.claimed_by: owner,
+                SendQueueItem.lease_expires_at: now + timedelta(seconds=self.claim_seconds),
+                SendQueueItem.attempts: SendQueueItem.attempts + 1,
+                SendQueueItem.message_id: func.coalesce(SendQueueItem.message_id, message_id),
+                SendQueueItem.updated_at: now,
+            }, synchronize_session=False)
+            if not claimed:
+                return None
+            row = db.query(SendQueueItem.attempts, SendQueueItem.message_id).filter(SendQueueItem.id == item_id).one()
+        return row.attempts, row.message_id
+
+    def finish(self, item_id, recipient_id, state, recipient_status, error=None):
+        """
+        Records a final outcome on the item, its recipient and the campaign's
+        sent/failed counters in one transaction. An item that already has an
+        outcome (finished by another worker after its lease ran out) keeps it and
+        isn't counted again.
+        """
+        now = datetime.utcnow()
+        with session_scope() as db:
+            finished = db.execute(update(SendQueueItem).where(
+                SendQueueItem.id == item_id,
+                SendQueueItem.state.not_in(DONE_STATES)
+            ).values(
+                state=state,
+                last_error=error,
+                lease_expires_at=None,
+                sent_at=now if state == SENT else None,
+                updated_at=now,
+            ).returning(SendQueueItem.user_id, SendQueueItem.campaign_id)).first()
+            if finished and state in COUNTED_STATES:
+                counters.increment(db, {(finished.user_id, finished.campaign_id, now.date()): {COUNTED_STATES[state]: 1}})
+            db.query(Recipient).filter(Recipient.id == recipient_id).update(
+                {Recipient.status: recipient_status}, synchronize_session=False)
+
+    def fail(self, item_id, recipient_id, attempts, error):
+        """
+        Records a failed attempt: the item is retried after an exponential, jittered
+        delay, or marked failed (with its recipient) once max_attempts is reached.
+        Returns True when final.
+        """
+        if attempts >= self.max_attempts:
+            self.finish(item_id, recipient_id, FAILED, 'failed', error)
+            return True
+        delay = backoff_delay(attempts, self.retry_seconds, self.max_retry_seconds)
+        now = datetime.utcnow()
+        with session_scope() as db:
+            db.query(SendQueueItem).filter(SendQueueItem.id == item_id).update({
+                SendQueueItem.state: RETRY,
+                SendQueueItem.retry_at: now + timedelta(seconds=delay),
+                SendQueueItem.lease_expires_at: None,
+                SendQueueItem.last_error: error,
+                SendQueueItem.updated_at: now,
+            }, synchronize_session=False)
+        return False
+
+    def release(self, item_id, recipient_id, error):
+        """
+        Hands back an item whose send broke off with an unexpected error (before or
+        after its claim): counted as a failed attempt, like fail(). Returns True when final.
+        """
+        with session_scope() as db:
+            attempts = db.query(SendQueueItem.attempts).filter(
+                SendQueueItem.id == item_id,
+                SendQueueItem.state.not_in(DONE_STATES)
+            ).scalar()
+        if attempts is None:
+            return False  # finished meanwhile
+        return self.fail(item_id, recipient_id, max(attempts, 1), error)
+
+    def defer(self, item_id, recipient_id, attempts, error=None):
+        """
+        Hands a claimed item back, ready at once for another account. The attempt
+        still counts, so a message that keeps running into throttles ends up
+        failed at max_attempts instead of going round forever. Returns True when final.
+        """
+        if attempts >= self.max_attempts:
+            self.finish(item_id, recipient_id, FAILED, 'failed', error)
+            return True
+        now = datetime.utcnow()
+        with session_scope() as db:
+            db.query(SendQueueItem).filter(SendQueueItem.id == item_id).update({
+                SendQueueItem.state: RETRY,
+                SendQueueItem.retry_at: now,
+                SendQueueItem.lease_expires_at: None,
+                SendQueueItem.last_error: error,
+                SendQueueItem.updated_at: now,
+            }, synchronize_session=False)
+        return False
+
+
+send_queue = SendQueue()
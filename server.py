@@ -1,18 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Response, Depends, Header
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Response, Depends, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import uvicorn
+import asyncio
 import os
-import csv
-import io
 import json
-from sqlalchemy.orm import Session
-from database import get_db, Recipient, CampaignLog, Schedule, SMTPConfig, Unsubscribe, init_db
+from datetime import datetime, timedelta
+from sqlalchemy import cast, delete, func, select, Text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import (get_async_db, get_async_read_db, async_session_scope, async_engine, AsyncReadSessionLocal,
+                      pool_stats, CampaignLog, ImportJob, Recipient, Schedule, Unsubscribe, init_db)
 from email_manager import EmailManager
-from supabase_client import verify_token
+from supabase_client import AuthUser, verify_token_async, issue_stream_token, verify_stream_token, STREAM_TOKEN_SECONDS, close_async_client
+from smtp_pool import smtp_pool
+from import_jobs import import_jobs
+from campaign_logger import campaign_log, format_line
+from paging import page_size, encode_cursor, decode_cursor, after, prefix_filter, BadCursor
+from suppression import suppression, normalize as normalize_email
+from tracking import tracking, verify_link, verify_pixel
+import counters
+import segments
+from template_store import template_store
 
 app = FastAPI()
 
@@ -43,8 +55,9 @@ from scheduler import CampaignScheduler
 # Active Managers: user_id -> EmailManager
 managers: Dict[str, EmailManager] = {}
 
-def get_current_user(authorization: Optional[str] = Header(None)):
-    # ... (existing code)
+STREAM_KEEPALIVE_SECONDS = 15
+
+async def authenticate(authorization: Optional[str]):
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization Header")
     
@@ -53,14 +66,28 @@ def get_current_user(authorization: Optional[str] = Header(None)):
         if scheme.lower() != 'bearer':
             raise HTTPException(status_code=401, detail="Invalid Authentication Scheme")
         
-        user = verify_token(token)
+        # Verified locally against the project JWT secret when possible (cached per token)
+        user = await verify_token_async(token)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid Token")
         
-        return user.user
+        return user
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
 
+async def get_current_user(authorization: Optional[str] = Header(None)):
+    return await authenticate(authorization)
+
+async def get_stream_user(token: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    # EventSource can't send headers, so browsers pass a stream token from
+    # /status/stream-token as ?token= (never the access token, which would end up in logs)
+    if authorization:
+        return await authenticate(authorization)
+    user_id = verify_stream_token(token) if token else None
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream token")
+    return AuthUser(user_id)
+
 def get_manager(user_id: str) -> EmailManager:
     if user_id not in managers:
         managers[user_id] = EmailManager(user_id)
@@ -69,14 +96,28 @@ def get_manager(user_id: str) -> EmailManager:
 # Initialize Scheduler
 scheduler = CampaignScheduler(get_manager)
 
+# A finished import changes the counts shown on the dashboard
+import_jobs.on_complete = lambda user_id: get_manager(user_id).invalidate_status()
+
 @app.on_event("startup")
 def startup_event():
     init_db()
+    import_jobs.fail_interrupted()
+    # Also resumes campaigns whose worker died, now and whenever a live lease could have lapsed
     scheduler.start_scheduler()
 
 @app.on_event("shutdown")
 def shutdown_event():
     scheduler.stop_scheduler()
+    import_jobs.shutdown()
+    smtp_pool.close_all()
+    campaign_log.shutdown()
+    tracking.shutdown()
+
+@app.on_event("shutdown")
+async def close_async_resources():
+    await async_engine.dispose()
+    await close_async_client()
 
 # ... (rest of models)
 class ConfigUpdate(BaseModel):
@@ -99,18 +140,84 @@ class ScheduleCreate(BaseModel):
 class UnsubscribeRemove(BaseModel):
     email: str
 
+class SegmentRequest(BaseModel):
+    # Attribute -> value or list of values, e.g. {"city": "Accra"} (see segments.py)
+    segment: Optional[Dict[str, Any]] = None
+
 # --- Endpoints ---
+# Endpoints run on the event loop with an AsyncSession: get_async_read_db for
+# reads (autocommit), get_async_db where several writes must commit together.
+# Those that start or stop campaigns, talk to SMTP or write through the sync
+# helpers stay plain "def", so FastAPI runs them on its threadpool instead.
 
 @app.get("/status")
-def get_status(user = Depends(get_current_user)):
+async def get_status(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
     manager = get_manager(user.id)
-    return manager.get_status()
+    return await manager.get_status_async(db)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/status/stream-token")
+async def create_stream_token(user = Depends(get_current_user)):
+    return {"token": issue_stream_token(user.id), "expires_in": STREAM_TOKEN_SECONDS}
+
+@app.get("/status/stream")
+async def status_stream(request: Request, user = Depends(get_stream_user)):
+    """
+    Server-Sent Events: a full "snapshot" on connect, then "status" and "log"
+    events pushed by the EmailManager as they happen.
+    """
+    manager = get_manager(user.id)
+    queue = manager.subscribe(asyncio.get_running_loop())
+
+    async def snapshot():
+        async with AsyncReadSessionLocal() as db:
+            return await manager.get_status_async(db)
+
+    async def events():
+        try:
+            yield _sse("snapshot", await snapshot())
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event == "resync":
+                    yield _sse("snapshot", await snapshot())
+                else:
+                    yield _sse(event, data)
+        finally:
+            manager.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+def _checked_segment(segment):
+    try:
+        return segments.validate(segment) if segment is not None else None
+    except segments.InvalidSegment as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/start")
-def start_process(user = Depends(get_current_user)):
+def start_process(data: Optional[SegmentRequest] = None, user = Depends(get_current_user)):
     manager = get_manager(user.id)
-    manager.start_process()
-    return {"message": "Started"}
+    started = manager.start_process(_checked_segment(data.segment if data else None))
+    return {"message": "Started" if started else "Already running"}
+
+@app.post("/segments/preview")
+async def preview_segment(data: SegmentRequest, user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    # The pending recipients a campaign started with this segment would send to
+    conditions = (Recipient.user_id == user.id, Recipient.status == 'pending',
+                  segments.segment_filter(_checked_segment(data.segment or {})))
+    sample = await db.scalars(select(Recipient.email).where(*conditions).order_by(Recipient.id).limit(10))
+    return {
+        "pending": await db.scalar(select(func.count(Recipient.id)).where(*conditions)),
+        "sample": sample.all(),
+    }
 
 @app.post("/stop")
 def stop_process(user = Depends(get_current_user)):
@@ -119,11 +226,11 @@ def stop_process(user = Depends(get_current_user)):
     return {"message": "Stopped"}
 
 @app.get("/config")
-def get_config(user = Depends(get_current_user)):
+async def get_config(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
     manager = get_manager(user.id)
     return {
-        "configs": manager.get_configs(),
-        "public_url": manager.public_url
+        "configs": await manager.get_configs_async(db),
+        "public_url": await manager.get_public_url_async(db)
     }
 
 @app.post("/config")
@@ -135,81 +242,147 @@ def update_config(data: ConfigUpdate, user = Depends(get_current_user)):
 @app.post("/config/url")
 def update_public_url(data: PublicUrlUpdate, user = Depends(get_current_user)):
     manager = get_manager(user.id)
-    manager.public_url = data.url.rstrip("/")
-    # TODO: Persist public_url in DB (AppConfig table)
+    manager.save_public_url(data.url.rstrip("/"))
     return {"message": "Public URL Updated"}
 
 @app.get("/analytics")
-def get_analytics(user = Depends(get_current_user)):
+async def get_analytics(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
     manager = get_manager(user.id)
-    return manager.get_analytics()
+    return await manager.get_analytics_async(db)
+
+@app.get("/analytics/daily")
+async def get_daily_analytics(days: int = 30, campaign_id: Optional[str] = None, user = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_async_read_db)):
+    since = datetime.utcnow().date() - timedelta(days=min(max(days, 1), 366) - 1)
+    rows = (await db.execute(counters.daily_query(user.id, since, campaign_id))).all()
+    return {"days": counters.as_daily(rows)}
+
+@app.get("/analytics/campaigns")
+async def get_campaign_analytics(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    rows = (await db.execute(counters.by_campaign_query(user.id))).all()
+    return {"campaigns": counters.as_campaigns(rows)}
+
+@app.get("/metrics/pool")
+async def get_pool_metrics(user = Depends(get_current_user)):
+    return pool_stats()
+
+@app.get("/metrics/tracking")
+async def get_tracking_metrics(user = Depends(get_current_user)):
+    return tracking.stats()
+
+# Both lists are keyset-paginated: pass back next_cursor (null on the last page)
+# with the same filters and sort, and every page costs the same as the first.
+
+def _json_page(key, items, next_cursor):
+    # items are already JSON text; skips FastAPI's per-field encoding
+    body = f'{{"{key}":[{",".join(items)}],"next_cursor":{json.dumps(next_cursor)}}}'
+    return Response(content=body, media_type="application/json")
 
 @app.get("/history")
-def get_history(user = Depends(get_current_user)):
-    manager = get_manager(user.id)
-    return {"logs": manager.get_recent_logs(200)}
+async def get_history(cursor: Optional[str] = None, limit: int = 200, type: Optional[str] = None, q: Optional[str] = None,
+                      order: str = "desc", user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    limit = page_size(limit)
+    descending = order == "desc"
+    keys = (CampaignLog.timestamp, CampaignLog.id)
+    # Lines still buffered by the log writer belong on the first page
+    if campaign_log.pending():
+        await run_in_threadpool(campaign_log.flush)
+    query = select(CampaignLog.id, CampaignLog.timestamp, CampaignLog.message).where(CampaignLog.user_id == user.id)
+    if type:
+        query = query.where(CampaignLog.type == type)
+    if q:
+        query = query.where(CampaignLog.message.contains(q, autoescape=True))
+    if cursor:
+        try:
+            query = query.where(after(keys, decode_cursor(cursor, datetime, int), descending))
+        except BadCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(query.order_by(*(k.desc() if descending else k for k in keys)).limit(limit + 1))).all()
+    next_cursor = encode_cursor(rows[limit - 1].timestamp, rows[limit - 1].id) if len(rows) > limit else None
+    return _json_page("logs", [json.dumps(format_line(r.timestamp, r.message)) for r in rows[:limit]], next_cursor)
+
+RECIPIENT_SORTS = {"id": (Recipient.id, int), "email": (Recipient.email, str)}
 
 @app.get("/recipients")
-def get_recipients(user = Depends(get_current_user), db: Session = Depends(get_db)):
-    recipients = db.query(Recipient).filter(Recipient.user_id == user.id).limit(100).all()
-    result = []
-    for r in recipients:
-        data = json.loads(r.data) if r.data else {}
-        data['email'] = r.email
-        data['status'] = r.status
-        result.append(data)
-    return {"recipients": result}
-
-@app.post("/upload_csv")
-async def upload_csv(file: UploadFile = File(...), user = Depends(get_current_user), db: Session = Depends(get_db)):
-    try:
-        content = await file.read()
-        csv_text = content.decode('utf-8')
-        reader = csv.DictReader(io.StringIO(csv_text))
-        
-        # Clear existing recipients for THIS user
-        db.query(Recipient).filter(Recipient.user_id == user.id).delete()
-        
-        count = 0
-        for row in reader:
-            email = row.get('email')
-            if not email:
-                continue
-            
-            extra_data = {k: v for k, v in row.items() if k != 'email'}
-            
-            recipient = Recipient(
-                user_id=user.id,
-                email=email,
-                data=json.dumps(extra_data),
-                status='pending'
-            )
-            db.add(recipient)
-            count += 1
-            
-        db.commit()
-        return {"message": f"Uploaded {count} recipients"}
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_recipients(cursor: Optional[str] = None, limit: int = 100, status: Optional[str] = None, q: Optional[str] = None,
+                         sort: str = "id", order: str = "asc", user = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_async_read_db)):
+    if sort not in RECIPIENT_SORTS or order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="sort must be id or email, order asc or desc")
+    limit = page_size(limit)
+    descending = order == "desc"
+    key, key_type = RECIPIENT_SORTS[sort]
+    data_json = cast(Recipient.data, Text).label("data")
+    query = select(Recipient.id, Recipient.email, Recipient.status, data_json).where(Recipient.user_id == user.id)
+    if status:
+        query = query.where(Recipient.status == status)
+    prefix = normalize_email(q)
+    if prefix:
+        # Emails are stored normalized, so a byte-order (user_id, email) index serves the prefix
+        query = query.where(prefix_filter(Recipient.email, prefix))
+    if cursor:
+        try:
+            query = query.where(after((key,), decode_cursor(cursor, key_type), descending))
+        except BadCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.execute(query.order_by(key.desc() if descending else key).limit(limit + 1))).all()
+    next_cursor = encode_cursor(getattr(rows[limit - 1], sort)) if len(rows) > limit else None
+
+    items = []
+    for r in rows[:limit]:
+        # data is read as JSON text: splice it instead of decoding and re-encoding
+        fields = f'"email":{json.dumps(r.email)},"status":{json.dumps(r.status)}}}'
+        data = (r.data or "").strip()
+        items.append(f"{data[:-1]},{fields}" if data.startswith("{") and len(data) > 2 else "{" + fields)
+    return _json_page("recipients", items, next_cursor)
+
+@app.post("/upload_csv", status_code=202)
+def upload_csv(file: UploadFile = File(...), user = Depends(get_current_user)):
+    # The upload is spooled to disk and imported by a background job
+    job_id = import_jobs.submit(user.id, file.file, file.filename)
+    return {"message": "Import started", "job_id": job_id}
+
+@app.get("/imports")
+async def list_imports(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    jobs = await db.scalars(select(ImportJob).where(ImportJob.user_id == user.id).order_by(ImportJob.created_at.desc()).limit(10))
+    return {"imports": [import_jobs.to_dict(j, include_rejects=False) for j in jobs]}
+
+@app.get("/imports/{job_id}")
+async def get_import(job_id: str, user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    # Polled by the dashboard while an import runs
+    job = await db.scalar(select(ImportJob).where(ImportJob.id == job_id, ImportJob.user_id == user.id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return import_jobs.to_dict(job)
 
 @app.get("/template")
-def get_template(user = Depends(get_current_user)):
-    # TODO: DB per user
-    if os.path.exists(f"mail_{user.id}.html"):
-        with open(f"mail_{user.id}.html", "r", encoding="utf-8") as f:
-            return {"content": f.read()}
-    elif os.path.exists("mail.html"): # Fallback
-        with open("mail.html", "r", encoding="utf-8") as f:
-            return {"content": f.read()}
-    return {"content": ""}
+async def get_template(version: Optional[int] = None, if_none_match: Optional[str] = Header(None),
+                       user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    # Latest version unless one is asked for; the ETag names the version, so an
+    # unchanged template costs one primary-key lookup and a 304
+    if version:
+        template = await template_store.get_async(db, user.id, version)
+    else:
+        template = await template_store.latest_async(db, user.id)
+    if template is None:
+        if version:
+            raise HTTPException(status_code=404, detail="Template version not found")
+        return {"content": "", "version": None}
+    headers = {"ETag": template.etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and template.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"content": template.content, "version": template.version}, headers=headers)
 
 @app.post("/template")
 def update_template(data: TemplateUpdate, user = Depends(get_current_user)):
-    # Save per user
-    with open(f"mail_{user.id}.html", "w", encoding="utf-8") as f:
-        f.write(data.content)
-    return {"message": "Template updated"}
+    template = template_store.save(user.id, data.content)
+    return {"message": "Template updated", "version": template.version}
+
+@app.get("/template/versions")
+async def get_template_versions(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    return {"versions": await template_store.versions_async(db, user.id)}
 
 @app.post("/test-email")
 def send_test_email(data: TestEmailRequest, user = Depends(get_current_user)):
@@ -220,63 +393,74 @@ def send_test_email(data: TestEmailRequest, user = Depends(get_current_user)):
     return {"message": msg}
 
 # --- Tracking (Public) ---
+# 1x1 transparent GIF
+PIXEL_GIF = b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00\x21\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x44\x01\x00\x3b'
+
+# async: queueing the event never blocks, so the pixel is served on the event
+# loop without a trip through the threadpool
 @app.get("/track/open")
-def track_open(email: str, uid: str):
-    # Record open directly to DB or via manager if active
-    # Direct DB is safer as manager might not be in memory
-    # But manager.record_open handles logic.
-    # Let's use manager if active, else DB.
-    # Actually, just DB is fine for analytics.
-    # But EmailManager has 'opens' in-memory dict.
-    # Let's instantiate a temporary manager or just use DB.
-    # For simplicity, let's log to DB.
-    try:
-        # TODO: Add Open model or just log it
-        # manager = get_manager(uid) 
-        # manager.record_open(email)
-        pass # Placeholder until Open model is ready
-    except Exception:
-        pass
-    return Response(content=b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00\x21\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x44\x01\x00\x3b', media_type="image/gif")
+async def track_open(request: Request, email: str, uid: str, cid: str = "", sig: str = ""):
+    # The pixel is served either way; only one signed for this recipient is counted
+    if verify_pixel(uid, cid, email, sig):
+        tracking.record("open", uid, cid, email, request.headers.get("user-agent"))
+    return Response(content=PIXEL_GIF, media_type="image/gif", headers={"Cache-Control": "no-store, max-age=0"})
+
+@app.get("/track/click")
+async def track_click(request: Request, email: str, uid: str, url: str, sig: str, cid: str = ""):
+    # Only links signed when the email was built redirect (no open redirect)
+    if not verify_link(uid, cid, email, url, sig):
+        raise HTTPException(status_code=404, detail="Unknown link")
+    tracking.record("click", uid, cid, email, request.headers.get("user-agent"))
+    return RedirectResponse(url, status_code=302)
 
 @app.get("/unsubscribe")
-def unsubscribe(email: str, uid: str):
+async def unsubscribe(email: str, uid: str, cid: str = ""):
     # Direct DB unsubscribe
     try:
-        db = next(get_db())
-        # Check if already unsubscribed
-        exists = db.query(Unsubscribe).filter(Unsubscribe.user_id == uid, Unsubscribe.email == email).first()
-        if not exists:
-            db.add(Unsubscribe(user_id=uid, email=email))
-            db.commit()
+        address = normalize_email(email)
+        async with async_session_scope() as db:
+            # Check if already unsubscribed
+            exists = await db.scalar(select(Unsubscribe.id).where(Unsubscribe.user_id == uid, Unsubscribe.email == address))
+            if not exists:
+                row = Unsubscribe(user_id=uid, email=address, campaign_id=cid or None, created_at=datetime.utcnow())
+                db.add(row)
+                await db.run_sync(counters.count_unsubscribes, [row])
+        # Takes effect for a running campaign without a per-recipient lookup
+        suppression.add(uid, address)
     except Exception as e:
         print(f"Unsubscribe failed: {e}")
         
     return HTMLResponse(content=f"<h1>Unsubscribed</h1><p>{email} has been removed from our mailing list.</p>")
 
 @app.get("/unsubscribes")
-def get_unsubscribes(user = Depends(get_current_user), db: Session = Depends(get_db)):
-    unsubs = db.query(Unsubscribe).filter(Unsubscribe.user_id == user.id).all()
-    return {"unsubscribes": [u.email for u in unsubs]}
+async def get_unsubscribes(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    emails = await db.scalars(select(Unsubscribe.email).where(Unsubscribe.user_id == user.id))
+    return {"unsubscribes": emails.all()}
 
 @app.post("/unsubscribes/remove")
-def remove_unsubscribe(data: UnsubscribeRemove, user = Depends(get_current_user), db: Session = Depends(get_db)):
-    db.query(Unsubscribe).filter(Unsubscribe.user_id == user.id, Unsubscribe.email == data.email).delete()
-    db.commit()
+async def remove_unsubscribe(data: UnsubscribeRemove, user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # Stored normalized, like every address
+    address = normalize_email(data.email)
+    removed = (await db.scalars(select(Unsubscribe).where(Unsubscribe.user_id == user.id, Unsubscribe.email == address))).all()
+    # Removing an address that isn't listed succeeds too, as it always has
+    for row in removed:
+        await db.delete(row)
+    await db.run_sync(counters.count_unsubscribes, removed, -1)
+    await db.commit()
+    suppression.remove(user.id, address)
     return {"message": "Removed"}
 
-# --- Scheduler (DB Based) ---
+# --- Scheduler (DB backed, woken on change) ---
 @app.get("/schedules")
-def get_schedules(user = Depends(get_current_user), db: Session = Depends(get_db)):
-    schedules = db.query(Schedule).filter(Schedule.user_id == user.id).all()
+async def get_schedules(user = Depends(get_current_user), db: AsyncSession = Depends(get_async_read_db)):
+    schedules = await db.scalars(select(Schedule).where(Schedule.user_id == user.id))
     return {"schedules": [
         {"id": s.id, "name": s.name, "scheduled_time": str(s.scheduled_time), "status": s.status, "recurring": s.recurring}
         for s in schedules
     ]}
 
 @app.post("/schedules")
-def create_schedule(data: ScheduleCreate, user = Depends(get_current_user), db: Session = Depends(get_db)):
-    from datetime import datetime
+async def create_schedule(data: ScheduleCreate, user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     try:
         dt = datetime.strptime(data.scheduled_time, "%Y-%m-%d %H:%M:%S")
         schedule = Schedule(
@@ -287,15 +471,18 @@ def create_schedule(data: ScheduleCreate, user = Depends(get_current_user), db:
             status="pending"
         )
         db.add(schedule)
-        db.commit()
+        await db.commit()
+        scheduler.add(schedule.id, schedule.scheduled_time)
         return {"message": "Schedule created", "id": schedule.id}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/schedules/{schedule_id}")
-def delete_schedule(schedule_id: int, user = Depends(get_current_user), db: Session = Depends(get_db)):
-    db.query(Schedule).filter(Schedule.id == schedule_id, Schedule.user_id == user.id).delete()
-    db.commit()
+async def delete_schedule(schedule_id: int, user = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(delete(Schedule).where(Schedule.id == schedule_id, Schedule.user_id == user.id))
+    await db.commit()
+    if result.rowcount:
+        scheduler.remove(schedule_id)
     return {"message": "Deleted"}
 
 if __name__ == "__main__":
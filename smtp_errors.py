@@ -0,0 +1,93 @@
+import random
+import re
+import smtplib
+
+RETRY = "retry"          # temporary; try the recipient again later
+BOUNCE = "bounce"        # permanent for this recipient; don't retry
+THROTTLED = "throttled"  # the sending account is over a quota; park it, not the recipient
+
+# Reply text meaning the account's daily quota is used up (Gmail: 550 5.4.5)
+DAILY_LIMIT_PATTERNS = (
+    "daily user sending limit exceeded",
+    "daily sending quota exceeded",
+    "5.4.5",
+)
+# Reply text meaning the account is being rate limited for now
+THROTTLE_PATTERNS = (
+    "rate limit",
+    "sending limit",
+    "too many messages",
+    "too many connections",
+    "quota exceeded",
+    "4.7.28",
+)
+# Reply text about this one message, not the account: retry it on its own
+MESSAGE_RETRY_PATTERNS = (
+    "too many recipients",
+)
+# Enhanced status codes (RFC 3463) about the recipient: X.1.Y address, X.2.Y
+# mailbox (e.g. 552 5.2.2 mailbox full, 452 4.2.2 over quota for now)
+RECIPIENT_STATUS = re.compile(r"\b[45]\.[12]\.\d{1,3}\b")
+
+
+class SMTPFailure:
+    def __init__(self, outcome, code=None, message="", daily_limit=False):
+        self.outcome = outcome
+        self.code = code
+        self.message = message
+        self.daily_limit = daily_limit
+
+    def __str__(self):
+        return f"{self.code} {self.message}" if self.code else self.message
+
+
+def _reply(exc):
+    """The (code, text) the server answered with, if the error carries one."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and exc.recipients:
+        code, message = next(iter(exc.recipients.values()))
+    elif isinstance(exc, smtplib.SMTPResponseException):
+        code, message = exc.smtp_code, exc.smtp_error
+    else:
+        return None, str(exc) or type(exc).__name__
+    if isinstance(message, bytes):
+        message = message.decode("utf-8", "replace")
+    return code, message
+
+
+def _by_code(code, message):
+    if code and 500 <= code < 600:
+        return SMTPFailure(BOUNCE, code, message)
+    # 4xx replies, dropped connections, timeouts
+    return SMTPFailure(RETRY, code, message)
+
+
+def classify(exc):
+    """
+    Maps an exception from a send to RETRY, BOUNCE or THROTTLED. Replies about
+    the recipient are settled before the account-throttle patterns are tried, so
+    one full mailbox ("552 5.2.2 quota exceeded") never parks the account.
+    """
+    code, message = _reply(exc)
+    text = message.lower()
+    if any(p in text for p in DAILY_LIMIT_PATTERNS):
+        return SMTPFailure(THROTTLED, code, message, daily_limit=True)
+    # The account itself can't send: bad credentials or a refused sender
+    if isinstance(exc, (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused)):
+        return SMTPFailure(THROTTLED, code, message)
+    if RECIPIENT_STATUS.search(text) or any(p in text for p in MESSAGE_RETRY_PATTERNS):
+        return _by_code(code, message)
+    # Refused at RCPT TO: about this address, unless the server is shutting the session
+    if isinstance(exc, smtplib.SMTPRecipientsRefused) and code != 421:
+        return _by_code(code, message)
+    if code == 421 or any(p in text for p in THROTTLE_PATTERNS):
+        return SMTPFailure(THROTTLED, code, message)
+    return _by_code(code, message)
+
+
+def backoff_delay(attempt, base, cap, rng=random):
+    """
+    Exponential backoff with jitter for the attempt-th consecutive failure (1-based):
+    half of min(cap, base * 2^(attempt-1)) plus a random share of the other half.
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + rng.uniform(0, delay / 2)
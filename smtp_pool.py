@@ -0,0 +1,182 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+# Errors after which the SMTP session itself is still usable (the server replied,
+# smtplib already issued RSET). Anything else means the socket is in an unknown state.
+RECOVERABLE_ERRORS = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+
+
+class TrackedSMTP(smtplib.SMTP):
+    """smtplib.SMTP that notes when a message reaches DATA, after which a resend could duplicate it."""
+    data_started = False
+
+    def data(self, msg):
+        self.data_started = True
+        return super().data(msg)
+
+
+class PooledSMTPSession:
+    def __init__(self, key, smtp):
+        self.key = key
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+    def is_alive(self):
+        try:
+            code, _ = self.smtp.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated SMTP sessions open between sends, keyed by
+    (server, port, account). Idle sessions are health-checked with NOOP before
+    reuse and closed by a background reaper once they exceed IDLE_TIMEOUT.
+    """
+
+    def __init__(self, idle_timeout=240, health_check_after=15, timeout=30):
+        self.IDLE_TIMEOUT = idle_timeout
+        # Sessions idle for less than this are handed out without a NOOP round trip
+        self.HEALTH_CHECK_AFTER = health_check_after
+        self.TIMEOUT = timeout
+
+        self._idle = {}  # key -> [PooledSMTPSession]
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._reaper_stop = threading.Event()
+
+    @staticmethod
+    def key_for(config):
+        return (config["SERVER"], int(config["PORT"]), config["EMAIL"])
+
+    def _connect(self, config):
+        smtp = TrackedSMTP(config["SERVER"], int(config["PORT"]), timeout=self.TIMEOUT)
+        try:
+            smtp.starttls()
+            smtp.login(config["EMAIL"], config["PASSWORD"])
+        except Exception:
+            smtp.close()
+            raise
+        return PooledSMTPSession(self.key_for(config), smtp)
+
+    def _acquire(self, config):
+        key = self.key_for(config)
+        while True:
+            with self._lock:
+                sessions = self._idle.get(key)
+                session = sessions.pop() if sessions else None
+            if session is None:
+                return self._connect(config)
+            idle_for = time.monotonic() - session.last_used
+            if idle_for < self.HEALTH_CHECK_AFTER or session.is_alive():
+                return session
+            session.close()
+
+    def _release(self, session):
+        session.last_used = time.monotonic()
+        with self._lock:
+            self._idle.setdefault(session.key, []).append(session)
+        self._ensure_reaper()
+
+    @contextmanager
+    def connection(self, config):
+        """Yields a logged-in smtplib.SMTP for config, returning it to the pool afterwards."""
+        session = self._acquire(config)
+        try:
+            yield session.smtp
+        except RECOVERABLE_ERRORS:
+            self._release(session)
+            raise
+        except BaseException:
+            session.close()
+            raise
+        else:
+            self._release(session)
+
+    def _with_session(self, config, action):
+        # A pooled session may have been dropped by the server since its NOOP check,
+        # which shows up as SMTPServerDisconnected on the first command. Until DATA
+        # the server can't have accepted the message, so one retry on a fresh
+        # connection is safe; a disconnect during or after DATA is raised instead,
+        # since the message may have gone out already.
+        smtp = None
+        try:
+            with self.connection(config) as smtp:
+                smtp.data_started = False
+                return action(smtp)
+        except smtplib.SMTPServerDisconnected:
+            if getattr(smtp, "data_started", False):
+                raise
+            self.discard(config)
+            with self.connection(config) as smtp:
+                return action(smtp)
+
+    def send_message(self, config, msg):
+        return self._with_session(config, lambda smtp: smtp.send_message(msg))
+
+    def sendmail(self, config, from_addr, to_addrs, raw):
+        """Sends pre-serialized message bytes (see message_builder.MessageSkeleton)."""
+        return self._with_session(config, lambda smtp: smtp.sendmail(from_addr, to_addrs, raw))
+
+    def discard(self, config):
+        """Closes every idle session for config (e.g. after a password change)."""
+        key = self.key_for(config)
+        with self._lock:
+            sessions = self._idle.pop(key, [])
+        for session in sessions:
+            session.close()
+
+    def close_idle(self, max_idle=None):
+        max_idle = self.IDLE_TIMEOUT if max_idle is None else max_idle
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, sessions in list(self._idle.items()):
+                keep = []
+                for s in sessions:
+                    (expired if now - s.last_used >= max_idle else keep).append(s)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for session in expired:
+            session.close()
+        return len(expired)
+
+    def close_all(self):
+        self._reaper_stop.set()
+        self.close_idle(max_idle=0)
+
+    def stats(self):
+        with self._lock:
+            return {f"{k[2]}@{k[0]}:{k[1]}": len(v) for k, v in self._idle.items()}
+
+    def _ensure_reaper(self):
+        with self._lock:
+            if self._reaper and self._reaper.is_alive():
+                return
+            self._reaper_stop.clear()
+            self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1, min(30, self.IDLE_TIMEOUT // 4))
+        while not self._reaper_stop.wait(interval):
+            self.close_idle()
+
+
+# Shared by every EmailManager in the process
+smtp_pool = SMTPConnectionPool()
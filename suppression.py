@@ -0,0 +1,68 @@
+import threading
+import time
+from sqlalchemy import select
+from database import session_scope, Recipient, Unsubscribe
+
+
+def normalize(email):
+    return (email or "").strip().lower()
+
+
+class SuppressionList:
+    """
+    Each user's unsubscribed addresses, loaded once into a set so the send loop
+    checks them without a query per recipient. The /unsubscribe handlers update
+    the set in place; it is re-read every reload_after seconds to pick up changes
+    made by other instances.
+    """
+
+    def __init__(self, reload_after=300):
+        self.reload_after = reload_after
+        self._sets = {}  # user_id -> (loaded_at, set of emails)
+        self._lock = threading.Lock()
+
+    def _load(self, user_id):
+        with session_scope() as db:
+            rows = db.query(Unsubscribe.email).filter(Unsubscribe.user_id == user_id).all()
+        return {normalize(r.email) for r in rows}
+
+    def _get(self, user_id):
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry and time.monotonic() - entry[0] < self.reload_after:
+                return entry[1]
+        emails = self._load(user_id)
+        with self._lock:
+            self._sets[user_id] = (time.monotonic(), emails)
+        return emails
+
+    def contains(self, user_id, email):
+        return normalize(email) in self._get(user_id)
+
+    def add(self, user_id, email):
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry:
+                entry[1].add(normalize(email))
+
+    def remove(self, user_id, email):
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if entry:
+                entry[1].discard(normalize(email))
+
+    def exclude_pending(self, user_id):
+        """
+        Marks every pending recipient that is on the user's unsubscribe list as
+        'unsubscribed' in one statement. Returns the number of rows excluded.
+        """
+        suppressed = select(Unsubscribe.email).where(Unsubscribe.user_id == user_id)
+        with session_scope() as db:
+            return db.query(Recipient).filter(
+                Recipient.user_id == user_id,
+                Recipient.status == 'pending',
+                Recipient.email.in_(suppressed)
+            ).update({Recipient.status: 'unsubscribed'}, synchronize_session=False)
+
+
+suppression = SuppressionList()
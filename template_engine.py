@@ -0,0 +1,64 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# {column} placeholders, matching the keys _personalize_email used to str.replace
+PLACEHOLDER_RE = re.compile(r"\{([^{}]+)\}")
+
+CACHE_SIZE = 32
+
+
+class CompiledTemplate:
+    """
+    A template split once into alternating literal text and placeholder keys.
+    render() is a single pass that joins the pieces, so cost no longer grows with
+    the number of CSV columns.
+    """
+
+    def __init__(self, html):
+        self.literals = []
+        self.keys = []
+        pos = 0
+        for m in PLACEHOLDER_RE.finditer(html):
+            self.literals.append(html[pos:m.start()])
+            self.keys.append(m.group(1))
+            pos = m.end()
+        self.literals.append(html[pos:])
+
+    def render(self, row_data):
+        literals = self.literals
+        parts = [literals[0]]
+        for i, key in enumerate(self.keys):
+            if key in row_data:
+                value = row_data[key]
+                parts.append(str(value) if value else "")
+            else:
+                # Unknown placeholders (and CSS blocks) are left untouched
+                parts.append("{" + key + "}")
+            parts.append(literals[i + 1])
+        return "".join(parts)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def template_hash(html):
+    return hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+
+def compile_template(html):
+    """Returns the CompiledTemplate for html, compiling it once per content hash."""
+    key = template_hash(html)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+    compiled = CompiledTemplate(html)
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from sqlalchemy import exc as sa_exc, func, select
+from database import session_scope, TemplateVersion
+from template_engine import compile_template, template_hash
+
+Template = namedtuple("Template", ["version", "content", "etag"])
+
+# Where templates lived before they moved to the database
+LEGACY_FILES = ("mail_{user_id}.html", "mail.html")
+
+
+class TemplateStore:
+    """
+    Per-user email templates as immutable, numbered versions in template_versions.
+    A version never changes once written, so its content is cached in-process by
+    (user_id, version) with no invalidation; only the latest version number is
+    read from the database each time (a primary-key lookup), so a save on any
+    instance is seen by every other one at once.
+    """
+
+    def __init__(self, cache_size=256):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (user_id, version) -> Template
+        self._lock = threading.Lock()
+
+    def _remember(self, user_id, template):
+        with self._lock:
+            self._cache[(user_id, template.version)] = template
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return template
+
+    def _cached(self, user_id, version):
+        with self._lock:
+            cached = self._cache.get((user_id, version))
+            if cached is not None:
+                self._cache.move_to_end((user_id, version))
+            return cached
+
+    def _loaded(self, user_id, version, content):
+        if content is None:
+            return None
+        return self._remember(user_id, Template(version, content, f'"{version}-{template_hash(content)[:16]}"'))
+
+    @staticmethod
+    def _latest_version_query(user_id):
+        return select(func.max(TemplateVersion.version)).where(TemplateVersion.user_id == user_id)
+
+    @staticmethod
+    def _content_query(user_id, version):
+        return select(TemplateVersion.content).where(
+            TemplateVersion.user_id == user_id,
+            TemplateVersion.version == version
+        )
+
+    def latest_version(self, user_id):
+        with session_scope() as db:
+            return db.scalar(self._latest_version_query(user_id))
+
+    def get(self, user_id, version):
+        """The given version of the user's template, or None if there is no such version."""
+        cached = self._cached(user_id, version)
+        if cached is not None:
+            return cached
+        with session_scope() as db:
+            content = db.scalar(self._content_query(user_id, version))
+        return self._loaded(user_id, version, content)
+
+    def latest(self, user_id):
+        """The user's current template, or None if they never saved one."""
+        version = self.latest_version(user_id)
+        if version is None:
+            return self._import_legacy(user_id)
+        return self.get(user_id, version)
+
+    # The same reads on an AsyncSession, for the request path in server.py
+
+    async def get_async(self, db, user_id, version):
+        cached = self._cached(user_id, version)
+        if cached is not None:
+            return cached
+        return self._loaded(user_id, version, await db.scalar(self._content_query(user_id, version)))
+
+    async def latest_async(self, db, user_id):
+        version = await db.scalar(self._latest_version_query(user_id))
+        if version is None:
+            # Rare (first read after the move to the database): reads a file, so off the loop
+            return await asyncio.to_thread(self._import_legacy, user_id)
+        return await self.get_async(db, user_id, version)
+
+    def compiled(self, user_id, version):
+        template = self.get(user_id, version)
+        return compile_template(template.content) if template else None
+
+    def save(self, user_id, content):
+        """Stores content as the user's next version (unless it is unchanged) and returns it."""
+        while True:
+            current = self.latest(user_id)
+            if current and current.content == content:
+                return current
+            version = (current.version if current else 0) + 1
+            try:
+                with session_scope() as db:
+                    db.add(TemplateVersion(user_id=user_id, version=version, content=content, created_at=datetime.utcnow()))
+            except sa_exc.IntegrityError:
+                continue  # another save took this number; go again on top of it
+            return self.get(user_id, version)
+
+    async def versions_async(self, db, user_id, limit=50):
+        rows = (await db.execute(select(TemplateVersion.version, TemplateVersion.created_at).where(
+            TemplateVersion.user_id == user_id
+        ).order_by(TemplateVersion.version.desc()).limit(limit))).all()
+        return [{"version": r.version, "created_at": str(r.created_at)} for r in rows]
+
+    def _import_legacy(self, user_id):
+        # One-time move of a template file on this instance's disk into the database
+        for pattern in LEGACY_FILES:
+            path = pattern.format(user_id=user_id)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    content = f.read()
+                try:
+                    with session_scope() as db:
+                        db.add(TemplateVersion(user_id=user_id, version=1, content=content, created_at=datetime.utcnow()))
+                except sa_exc.IntegrityError:
+                    pass  # imported concurrently
+                return self.get(user_id, 1)
+        return None
+
+
+template_store = TemplateStore()
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+# database.py picks its engine at import time, so point it at a scratch SQLite
+# file (or TEST_DATABASE_URL, whose tables are emptied) before any test module
+# imports the app
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/test.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from database import Base, init_db, session_scope
+
+
+@pytest.fixture
+def db_tables():
+    """Creates the schema once and empties every table after each test."""
+    init_db()
+    yield
+    with session_scope() as db:
+        for table in reversed(Base.metadata.sorted_tables):
+            db.execute(table.delete())
+
+
+@pytest.fixture
+def client(db_tables, monkeypatch):
+    """A TestClient for the API, signed in as "api-user", without the campaign scheduler."""
+    from fastapi.testclient import TestClient
+    import server
+    from supabase_client import AuthUser
+    # Entered as a context so every request runs on one event loop, which asyncpg needs
+    monkeypatch.setattr(server.scheduler, "start_scheduler", lambda: None)
+    server.app.dependency_overrides[server.get_current_user] = lambda: AuthUser("api-user")
+    with TestClient(server.app) as client:
+        yield client
+    server.app.dependency_overrides.clear()
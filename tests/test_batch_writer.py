@@ -0,0 +1,55 @@
+import threading
+import time
+from batch_writer import BatchWriter
+
+
+class ListWriter(BatchWriter):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def _write(self, batch):
+        self.release.wait()
+        self.batches.append(batch)
+
+
+def test_items_are_written_in_batches():
+    writer = ListWriter(batch_size=3, flush_interval=0.05)
+    for i in range(7):
+        assert writer.put(i)
+    writer.flush()
+    # The thread and flush() each write what they took, so batches can land in either order
+    assert sorted(i for batch in writer.batches for i in batch) == list(range(7))
+    assert all(len(batch) <= 3 for batch in writer.batches)
+    assert writer.pending() == 0
+    writer.shutdown()
+
+
+def test_flush_waits_for_the_batch_the_thread_holds():
+    writer = ListWriter(batch_size=100, flush_interval=0.05)
+    writer.release.clear()
+    writer.put("a")
+    # The writer thread takes "a" and blocks writing it
+    while writer._queue.qsize():
+        time.sleep(0.01)
+    done = threading.Event()
+    threading.Thread(target=lambda: (writer.flush(), done.set())).start()
+    assert not done.wait(0.2)
+    assert writer.pending() == 1
+    writer.release.set()
+    assert done.wait(5)
+    assert writer.batches == [["a"]]
+    writer.shutdown()
+
+
+def test_full_queue_refuses_without_blocking():
+    writer = ListWriter(batch_size=10, flush_interval=0.05, max_pending=2)
+    writer.release.clear()
+    results = [writer.put(i) for i in range(20)]
+    assert not all(results)
+    writer.release.set()
+    writer.shutdown()
+    assert sum(len(batch) for batch in writer.batches) == sum(results)
+
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from database import session_scope, CampaignLog
+import campaign_logger
+from campaign_logger import CampaignLogWriter, format_line
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+
+def stored(user_id):
+    with session_scope() as db:
+        return [l.message for l in db.query(CampaignLog).filter(CampaignLog.user_id == user_id).order_by(CampaignLog.id)]
+
+
+@pytest.fixture
+def writer():
+    writer = CampaignLogWriter(batch_size=3, flush_interval=0.05, ring_size=4)
+    yield writer
+    writer.shutdown()
+
+
+def test_lines_are_batched_into_the_table(writer):
+    line = writer.write("l1", "Started", "success")
+    assert line.endswith("] Started")
+    for i in range(6):
+        writer.write("l1", f"line {i}")
+    writer.shutdown()
+    assert writer.pending() == 0
+    assert stored("l1") == ["Started"] + [f"line {i}" for i in range(6)]
+    with session_scope() as db:
+        assert db.query(CampaignLog).filter(CampaignLog.message == "Started").one().type == "success"
+
+
+def test_recent_reads_the_ring(writer):
+    for i in range(6):
+        writer.write("l1", f"line {i}")
+    writer.write("l2", "other user")
+    assert [l.split("] ")[1] for l in writer.recent("l1", limit=4)] == ["line 2", "line 3", "line 4", "line 5"]
+    assert [l.split("] ")[1] for l in writer.recent("l1", limit=2)] == ["line 4", "line 5"]
+    assert [l.split("] ")[1] for l in writer.recent("l2", limit=4)] == ["other user"]
+
+
+def test_ring_is_seeded_with_older_lines_from_the_table(writer):
+    then = datetime.utcnow() - timedelta(minutes=1)
+    with session_scope() as db:
+        db.add_all(CampaignLog(user_id="l1", timestamp=then + timedelta(seconds=i), message=f"old {i}") for i in range(5))
+    writer.write("l1", "new")
+    recent = writer.recent("l1", limit=4)
+    assert recent[0] == format_line(then + timedelta(seconds=2), "old 2")
+    assert [l.split("] ")[1] for l in recent] == ["old 2", "old 3", "old 4", "new"]
+    # Seeded once; the flushed line isn't read back a second time
+    writer.shutdown()
+    assert [l.split("] ")[1] for l in writer.recent("l1", limit=4)] == ["old 2", "old 3", "old 4", "new"]
+
+
+def test_recent_beyond_the_ring_reads_the_table(writer):
+    for i in range(6):
+        writer.write("l1", f"line {i}")
+    assert [l.split("] ")[1] for l in writer.recent("l1", limit=10)] == [f"line {i}" for i in range(6)]
+
+
+def test_recent_async(writer):
+    with session_scope() as db:
+        db.add(CampaignLog(user_id="l1", timestamp=datetime.utcnow() - timedelta(minutes=1), message="old"))
+    assert [l.split("] ")[1] for l in asyncio.run(writer.recent_async("l1", limit=4))] == ["old"]
+    writer.write("l1", "new")
+    assert [l.split("] ")[1] for l in asyncio.run(writer.recent_async("l1", limit=4))] == ["old", "new"]
+
+
+def test_failed_insert_is_dropped_not_retried(writer, monkeypatch):
+    def down():
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(campaign_logger, "session_scope", down)
+    writer.write("l1", "lost")
+    writer.shutdown()
+    monkeypatch.undo()
+    assert writer.pending() == 0
+    assert stored("l1") == []
@@ -0,0 +1,87 @@
+from datetime import date, datetime
+import pytest
+import counters
+from database import engine, session_scope, CampaignCounter, Recipient, Unsubscribe
+from send_queue import SendQueue, SENT, FAILED
+from tracking import TrackingWriter
+
+USER = "api-user"
+
+
+def counter_rows():
+    with session_scope() as db:
+        return sorted(
+            (r.campaign_id, r.day, tuple(getattr(r, c) for c in counters.COUNTER_COLUMNS))
+            for r in db.query(CampaignCounter).filter(CampaignCounter.user_id == USER)
+        )
+
+
+@pytest.fixture
+def activity(db_tables):
+    """A campaign that sent two messages, failed one, got opens, a click and an unsubscribe."""
+    queue = SendQueue(max_attempts=1)
+    with session_scope() as db:
+        db.add_all(Recipient(user_id=USER, email=f"r{i}@example.com", status="pending") for i in range(3))
+        # Sent before the send queue existed
+        db.add(Recipient(user_id=USER, email="old@example.com", status="sent", created_at=datetime(2024, 1, 2)))
+    campaign_id = queue.prepare(USER)[0]
+    items = queue.ready_chunk(USER, 0, 10)
+    for item, state in zip(items, (SENT, SENT, FAILED)):
+        queue.claim(item.id, "owner", f"<{item.id}@example.com>")
+        queue.finish(item.id, item.recipient_id, state, state)
+
+    writer = TrackingWriter(flush_interval=0.05)
+    for email in ("r0@example.com", "r0@example.com", "r1@example.com"):
+        writer.record("open", USER, campaign_id, email)
+    writer.record("click", USER, campaign_id, "r1@example.com")
+    writer.shutdown()
+
+    with session_scope() as db:
+        row = Unsubscribe(user_id=USER, email="r1@example.com", campaign_id=campaign_id, created_at=datetime.utcnow())
+        db.add(row)
+        counters.count_unsubscribes(db, [row])
+    return campaign_id
+
+
+def test_totals(activity):
+    with session_scope() as db:
+        assert counters.totals(db, USER) == {
+            "sent": 2, "failed": 1, "opens": 3, "unique_opens": 2, "clicks": 1, "unsubscribed": 1}
+        assert counters.totals(db, USER, activity)["sent"] == 2
+
+
+def test_rebuild_matches_the_running_counters(activity):
+    # The pre-queue send is only counted by the rebuild
+    running = counter_rows()
+    with engine.begin() as conn:
+        counters.rebuild(conn, USER)
+    rebuilt = counter_rows()
+    assert rebuilt[1:] == running
+    assert rebuilt[0] == ("", date(2024, 1, 2), (1, 0, 0, 0, 0, 0))
+
+
+def test_rebuild_only_touches_the_given_user(activity):
+    with session_scope() as db:
+        counters.increment(db, {("someone-else", "c", date(2024, 1, 1)): {"sent": 5}})
+    with engine.begin() as conn:
+        counters.rebuild(conn, USER)
+    with session_scope() as db:
+        assert counters.totals(db, "someone-else")["sent"] == 5
+
+
+def test_removed_unsubscribe_is_subtracted(activity):
+    with session_scope() as db:
+        row = db.query(Unsubscribe).one()
+        counters.count_unsubscribes(db, [row], -1)
+        assert counters.totals(db, USER)["unsubscribed"] == 0
+
+
+def test_analytics_endpoints(client, activity):
+    assert client.get("/analytics").json() == {
+        "total_sent": 2, "failed": 1, "opens": 2, "total_opens": 3, "clicks": 1, "unsubscribes": 1}
+    today = datetime.utcnow().date().isoformat()
+    days = client.get("/analytics/daily", params={"days": 7}).json()["days"]
+    assert [d["day"] for d in days] == [today]
+    assert days[0]["sent"] == 2
+    campaigns = client.get("/analytics/campaigns").json()["campaigns"]
+    assert [(c["campaign_id"], c["sent"]) for c in campaigns] == [(activity, 2)]
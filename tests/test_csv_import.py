@@ -0,0 +1,75 @@
+import io
+import pytest
+from database import session_scope, Recipient, RecipientStaging
+from csv_import import RecipientImporter, normalize_email
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+CSV = (
+    "\ufeffName,EMAIL,City\n"
+    "Ann, Ann@Example.com ,Oslo\n"
+    "Bob,not-an-email,Rome\n"
+    "Cat,,Lima\n"
+    "Ann again,ann@example.com,Oslo\n"
+    "Dan,dan@example.com,Kyiv\n"
+)
+
+
+def recipients(user_id):
+    with session_scope() as db:
+        return [(r.email, r.data, r.status) for r in
+                db.query(Recipient).filter(Recipient.user_id == user_id).order_by(Recipient.id)]
+
+
+def staged(job_id):
+    with session_scope() as db:
+        return db.query(RecipientStaging).filter(RecipientStaging.job_id == job_id).count()
+
+
+def test_normalize_email():
+    assert normalize_email("  Ann@Example.COM ") == "ann@example.com"
+    assert normalize_email("ann@example") is None
+    assert normalize_email(None) is None
+
+
+def test_stage_and_swap():
+    with session_scope() as db:
+        db.add(Recipient(user_id="imp1", email="old@example.com", status="sent"))
+        db.add(Recipient(user_id="imp2", email="other@example.com", status="pending"))
+
+    progress = []
+    importer = RecipientImporter("job1", "imp1", chunk_size=1, on_progress=lambda imp: progress.append(imp.inserted))
+    with session_scope() as db:
+        result = importer.stage(db, io.BytesIO(CSV.encode()))
+        assert recipients("imp1") == [("old@example.com", None, "sent")]
+        importer.swap(db)
+
+    assert (result["parsed"], result["inserted"], result["rejected"]) == (5, 2, 3)
+    assert result["rejects"] == [
+        {"line": 3, "email": "not-an-email", "reason": "invalid email"},
+        {"line": 4, "email": "", "reason": "missing email"},
+        {"line": 5, "email": "ann@example.com", "reason": "duplicate"},
+    ]
+    assert progress == [1, 2]
+    assert recipients("imp1") == [
+        ("ann@example.com", {"Name": "Ann", "City": "Oslo"}, "pending"),
+        ("dan@example.com", {"Name": "Dan", "City": "Kyiv"}, "pending"),
+    ]
+    assert recipients("imp2") == [("other@example.com", None, "pending")]
+    assert staged("job1") == 0
+
+
+def test_missing_email_column_is_rejected():
+    importer = RecipientImporter("job2", "imp1")
+    with session_scope() as db, pytest.raises(ValueError):
+        importer.stage(db, io.BytesIO(b"name\nAnn\n"))
+
+
+def test_discard_drops_staged_rows():
+    importer = RecipientImporter("job3", "imp1")
+    with session_scope() as db:
+        importer.stage(db, io.BytesIO(CSV.encode()))
+        assert staged("job3") == 2
+        importer.discard(db)
+    assert staged("job3") == 0
+    assert recipients("imp1") == []
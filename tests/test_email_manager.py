@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from email import message_from_bytes
+import pytest
+import email_manager
+from database import session_scope, CampaignLease, Recipient, SendQueueItem, SMTPConfig
+from email_manager import EmailManager
+from send_queue import send_queue
+from template_store import template_store
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+USER = "manager-user"
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(email_manager.smtp_pool, "sendmail", lambda config, sender, to, raw: sent.extend(to))
+    return sent
+
+
+def seed(*emails):
+    with session_scope() as db:
+        db.add_all(Recipient(user_id=USER, email=e, status="pending", data={}) for e in emails)
+        db.add(SMTPConfig(user_id=USER, server="smtp.example.com", port=587, email="sender@example.com",
+                          password="secret", display_name="Sender"))
+    return template_store.save(USER, "<html><body>Hi</body></html>").version
+
+
+def manager():
+    m = EmailManager(USER)
+    m.RATE_LIMITS = {"minute": 10 ** 6}
+    return m
+
+
+def crashed_run(*emails):
+    # A worker queued the run and died holding its campaign lease
+    version = seed(*emails)
+    send_queue.prepare(USER, template_version=version)
+    with session_scope() as db:
+        db.add(CampaignLease(user_id=USER, owner="dead-worker", expires_at=datetime.utcnow() - timedelta(seconds=1)))
+
+
+def test_resume_waits_for_items_a_crashed_worker_had_claimed(sent):
+    crashed_run("a@example.com", "b@example.com", "c@example.com")
+    # It was sending the first item; that claim outlives the campaign lease
+    first = send_queue.ready_chunk(USER, 0, 1)[0]
+    send_queue.claim(first.id, "dead-worker", "<dead@example.com>")
+    with session_scope() as db:
+        db.get(SendQueueItem, first.id).lease_expires_at = datetime.utcnow() + timedelta(seconds=1)
+
+    m = manager()
+    m.save_public_url("https://mail.example.com")
+    assert m.start_process(resume=True)
+    m.thread.join(30)
+
+    assert m.status == "FINISHED"
+    assert sorted(sent) == ["a@example.com", "b@example.com", "c@example.com"]
+    with session_scope() as db:
+        assert {s for (s,) in db.query(SendQueueItem.state)} == {"sent"}
+        assert {s for (s,) in db.query(Recipient.status)} == {"sent"}
+
+
+def test_resumed_run_uses_the_stored_public_url(sent, monkeypatch):
+    crashed_run("a@example.com")
+    manager().save_public_url("https://mail.example.com")
+    bodies = []
+    monkeypatch.setattr(email_manager.smtp_pool, "sendmail", lambda config, sender, to, raw: bodies.append(raw))
+
+    # A fresh manager, as on another worker or after a restart
+    m = manager()
+    assert m.start_process(resume=True)
+    m.thread.join(30)
+    html = message_from_bytes(bodies[0]).get_payload()[-1].get_payload(decode=True).decode()
+    assert "https://mail.example.com/unsubscribe?" in html
+
+
+def test_no_automatic_start_without_a_public_url(sent):
+    crashed_run("a@example.com")
+    m = manager()
+    assert not m.start_process(resume=True)
+    assert not m.start_process(scheduled=True)
+    assert sent == []
+
+
+def test_account_wait_is_published_once_with_its_deadline(monkeypatch):
+    m = manager()
+    published = []
+    monkeypatch.setattr(m, "_notify_status", lambda: published.append(m._status_fields({})))
+    config = {"EMAIL": "sender@example.com"}
+    m._on_account_wait(config, 30)
+    m._on_account_wait(config, 29.5)
+    assert len(published) == 1
+    assert published[0]["accounts"] == {"sender@example.com": "Waiting"}
+    until = datetime.fromisoformat(published[0]["waiting_until"]["sender@example.com"].rstrip("Z"))
+    assert timedelta(seconds=28) < until - datetime.utcnow() <= timedelta(seconds=30)
+    # A moved deadline is published again
+    m._on_account_wait(config, 10)
+    assert len(published) == 2
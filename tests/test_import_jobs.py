@@ -0,0 +1,81 @@
+import io
+import time
+from datetime import datetime, timedelta
+import pytest
+from database import session_scope, ImportJob, Recipient, RecipientStaging
+from import_jobs import ImportJobRunner
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+CSV = "email,name\nann@example.com,Ann\nnope,Bob\ndan@example.com,Dan\n"
+
+
+def recipients(user_id):
+    with session_scope() as db:
+        return [r.email for r in db.query(Recipient).filter(Recipient.user_id == user_id).order_by(Recipient.id)]
+
+
+def staged(job_id):
+    with session_scope() as db:
+        return db.query(RecipientStaging).filter(RecipientStaging.job_id == job_id).count()
+
+
+def run_job(runner, user_id, data):
+    job_id = runner.submit(user_id, io.BytesIO(data), "list.csv")
+    runner.executor.shutdown(wait=True)
+    with session_scope() as db:
+        return runner.to_dict(db.get(ImportJob, job_id))
+
+
+def test_job_completes_and_notifies():
+    runner = ImportJobRunner()
+    completed = []
+    runner.on_complete = completed.append
+    job = run_job(runner, "imp3", CSV.encode())
+    assert job["status"] == "completed"
+    assert (job["parsed"], job["inserted"], job["rejected"]) == (3, 2, 1)
+    assert job["rejects"] == [{"line": 3, "email": "nope", "reason": "invalid email"}]
+    assert job["finished_at"]
+    assert completed == ["imp3"]
+    assert recipients("imp3") == ["ann@example.com", "dan@example.com"]
+
+
+def test_failed_job_keeps_the_old_list():
+    with session_scope() as db:
+        db.add(Recipient(user_id="imp4", email="old@example.com", status="pending"))
+    job = run_job(ImportJobRunner(), "imp4", b"name\nAnn\n")
+    assert job["status"] == "failed"
+    assert job["error"] == "CSV has no 'email' column"
+    assert recipients("imp4") == ["old@example.com"]
+
+
+def test_fail_interrupted():
+    old = datetime.utcnow() - timedelta(minutes=10)
+    with session_scope() as db:
+        db.add(ImportJob(id="stale", user_id="imp5", status="running", updated_at=old))
+        db.add(ImportJob(id="fresh", user_id="imp5", status="running", updated_at=datetime.utcnow()))
+        db.add(RecipientStaging(job_id="stale", user_id="imp5", email="a@example.com", status="pending"))
+    ImportJobRunner().fail_interrupted()
+    with session_scope() as db:
+        assert db.get(ImportJob, "stale").status == "failed"
+        assert db.get(ImportJob, "stale").error == "Interrupted by a server restart"
+        assert db.get(ImportJob, "fresh").status == "running"
+    assert staged("stale") == 0
+
+
+def test_upload_endpoint(client, monkeypatch):
+    # The app's runner is shut down with every test client
+    import server
+    monkeypatch.setattr(server, "import_jobs", ImportJobRunner())
+    r = client.post("/upload_csv", files={"file": ("list.csv", CSV.encode(), "text/csv")})
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+    for _ in range(100):
+        job = client.get(f"/imports/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "completed"
+    assert [j["job_id"] for j in client.get("/imports").json()["imports"]] == [job_id]
+    assert "rejects" not in client.get("/imports").json()["imports"][0]
+    assert client.get("/imports/nope").status_code == 404
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+import pytest
+from database import session_scope, CampaignLease
+from leases import CampaignLeases
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+
+@pytest.fixture
+def leases():
+    leases = CampaignLeases(ttl=60, heartbeat=3600)
+    yield leases
+    leases.shutdown()
+
+
+def expire(user_id):
+    with session_scope() as db:
+        db.query(CampaignLease).filter(CampaignLease.user_id == user_id).update(
+            {CampaignLease.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+
+
+def test_only_one_holder(leases):
+    token = leases.acquire("u1")
+    assert token
+    assert leases.acquire("u1") is None
+    assert leases.holder("u1") == token
+    assert leases.acquire("u2")
+
+
+def test_release_frees_the_lease(leases):
+    token = leases.acquire("u1")
+    leases.release(token)
+    assert leases.holder("u1") is None
+    assert leases.acquire("u1")
+
+
+def test_expired_lease_is_taken_over_once(leases):
+    leases.acquire("u1")
+    expire("u1")
+    assert leases.expired_users() == ["u1"]
+    token = leases.acquire("u1", expired_only=True)
+    assert token
+    assert leases.holder("u1") == token
+    assert leases.acquire("u1", expired_only=True) is None
+    assert leases.expired_users() == []
+
+
+def test_expired_only_never_starts_a_run(leases):
+    assert leases.acquire("u1", expired_only=True) is None
+    assert leases.holder("u1") is None
+
+
+def test_taken_over_lease_cannot_be_renewed(leases):
+    token = leases.acquire("u1")
+    expire("u1")
+    assert leases.acquire("u1")
+    assert leases._renew(token) is None
+
+
+def test_stop_request_reaches_the_holder(leases):
+    token = leases.acquire("u1")
+    assert leases.request_stop("u1")
+    assert leases._renew(token) is True
+
+
+def test_next_expiry_only_counts_live_leases(leases):
+    assert leases.next_expiry() is None
+    leases.acquire("u1")
+    expire("u1")
+    assert leases.next_expiry() is None
+    leases.acquire("u2")
+    assert 55 < leases.next_expiry() <= 60
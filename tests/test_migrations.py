@@ -0,0 +1,98 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, exc, inspect, text
+from database import Base
+from migrations import MIGRATIONS, run_migrations
+
+# The tables as they were before migration 1, with their single-column indexes
+BASELINE_SCHEMA = [
+    "CREATE TABLE recipients (id INTEGER PRIMARY KEY, user_id VARCHAR NOT NULL, email VARCHAR NOT NULL,"
+    " data TEXT, status VARCHAR, created_at DATETIME)",
+    "CREATE INDEX ix_recipients_user_id ON recipients (user_id)",
+    "CREATE INDEX ix_recipients_email ON recipients (email)",
+    "CREATE TABLE campaign_logs (id INTEGER PRIMARY KEY, user_id VARCHAR NOT NULL, timestamp DATETIME,"
+    " message TEXT NOT NULL, type VARCHAR)",
+    "CREATE INDEX ix_campaign_logs_user_id ON campaign_logs (user_id)",
+    "CREATE TABLE unsubscribes (id INTEGER PRIMARY KEY, user_id VARCHAR NOT NULL, email VARCHAR NOT NULL,"
+    " created_at DATETIME)",
+    "CREATE INDEX ix_unsubscribes_user_id ON unsubscribes (user_id)",
+    "CREATE INDEX ix_unsubscribes_email ON unsubscribes (email)",
+    "CREATE TABLE app_configs (key VARCHAR PRIMARY KEY, user_id VARCHAR NOT NULL, value TEXT NOT NULL)",
+    "CREATE INDEX ix_app_configs_key ON app_configs (key)",
+    "CREATE INDEX ix_app_configs_user_id ON app_configs (user_id)",
+]
+
+
+def baseline_db(tmp_path):
+    # A database of its own: migrations must run against the pre-change tables
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    now = datetime(2024, 1, 2)
+    with engine.begin() as conn:
+        for ddl in BASELINE_SCHEMA:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO recipients (id, user_id, email, data, status, created_at) VALUES (:id, :u, :e, '{}', :s, :t)"), [
+            {"id": 1, "u": "m1", "e": "ann@example.com", "s": "pending", "t": now},
+            {"id": 2, "u": "m1", "e": "ann@example.com", "s": "sent", "t": now},
+            {"id": 3, "u": "m1", "e": "bob@example.com", "s": "pending", "t": now},
+            {"id": 4, "u": "m1", "e": "bob@example.com", "s": "pending", "t": now},
+            {"id": 5, "u": "m2", "e": "ann@example.com", "s": "pending", "t": now},
+        ])
+        conn.execute(text("INSERT INTO unsubscribes (id, user_id, email, created_at) VALUES (:id, :u, :e, :t)"), [
+            {"id": 1, "u": "m1", "e": " Carol@Example.com", "t": now},
+            {"id": 2, "u": "m1", "e": "carol@example.com", "t": now},
+        ])
+        conn.execute(text("INSERT INTO app_configs (key, user_id, value) VALUES ('public_url', 'm1', 'https://a.example')"))
+    return engine
+
+
+def migrate(engine):
+    # What init_db() does on startup
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+
+def test_migrates_a_baseline_database(tmp_path):
+    engine = baseline_db(tmp_path)
+    migrate(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, user_id, email, status FROM recipients ORDER BY id")).all() == [
+            (2, "m1", "ann@example.com", "sent"),
+            (3, "m1", "bob@example.com", "pending"),
+            (5, "m2", "ann@example.com", "pending"),
+        ]
+        assert conn.execute(text("SELECT user_id, email FROM unsubscribes")).all() == [("m1", "carol@example.com")]
+        assert conn.execute(text("SELECT user_id, key, value FROM app_configs")).all() == [("m1", "public_url", "https://a.example")]
+        assert conn.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars().all() == [
+            version for version, _, _ in MIGRATIONS]
+        # Migration 2 backfilled the counters from the sent recipient
+        assert conn.execute(text("SELECT user_id, campaign_id, sent FROM campaign_counters")).all() == [("m1", "", 1)]
+
+    schema = inspect(engine)
+    assert sorted(schema.get_pk_constraint("app_configs")["constrained_columns"]) == ["key", "user_id"]
+    recipient_indexes = {i["name"] for i in schema.get_indexes("recipients")}
+    assert {"uq_recipients_user_email", "ix_recipients_user_status_id", "ix_recipients_pending"} <= recipient_indexes
+    assert not {"ix_recipients_user_id", "ix_recipients_email"} & recipient_indexes
+    assert "uq_unsubscribes_user_email" in {i["name"] for i in schema.get_indexes("unsubscribes")}
+    assert {i["name"] for i in schema.get_indexes("campaign_logs")} >= {"ix_campaign_logs_user_timestamp"}
+    assert "ix_campaign_logs_user_id" not in {i["name"] for i in schema.get_indexes("campaign_logs")}
+
+    # Per-user keys and per-user addresses are now enforced
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO app_configs (key, user_id, value) VALUES ('public_url', 'm2', 'https://b.example')"))
+    with engine.connect() as conn, pytest.raises(exc.IntegrityError):
+        conn.execute(text("INSERT INTO recipients (user_id, email, status) VALUES ('m1', 'bob@example.com', 'pending')"))
+
+
+def test_migrations_run_once(tmp_path, capsys):
+    engine = baseline_db(tmp_path)
+    migrate(engine)
+    assert "Applied migration 1" in capsys.readouterr().out
+    migrate(engine)
+    assert capsys.readouterr().out == ""
+
+
+def test_fresh_database_is_already_current(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    migrate(engine)
+    with engine.connect() as conn:
+        assert len(conn.execute(text("SELECT version FROM schema_migrations")).all()) == len(MIGRATIONS)
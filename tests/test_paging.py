@@ -0,0 +1,79 @@
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from database import session_scope, Recipient
+from paging import BadCursor, after, decode_cursor, encode_cursor, page_size, prefix_filter
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+
+def test_cursor_round_trip():
+    when = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(when, 42)
+    assert decode_cursor(cursor, datetime, int) == [when, 42]
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", encode_cursor(1), encode_cursor("x", "y")])
+def test_bad_cursor(cursor):
+    with pytest.raises(BadCursor):
+        decode_cursor(cursor, datetime, int)
+
+
+def test_page_size_is_clamped():
+    assert page_size(None) == 100
+    assert page_size(0) == 100
+    assert page_size(-5) == 1
+    assert page_size(10 ** 6) == 1000
+
+
+def add(emails, statuses=("pending",)):
+    with session_scope() as db:
+        db.add_all(Recipient(user_id="u1", email=e, status=statuses[i % len(statuses)]) for i, e in enumerate(emails))
+
+
+def pages(order_by, descending, limit):
+    # Walks the table the way the API does: fetch limit + 1, continue after the last row
+    seen, cursor = [], None
+    keys = (order_by, Recipient.id)
+    while True:
+        query = select(order_by.label("key"), Recipient.id).where(Recipient.user_id == "u1")
+        if cursor:
+            query = query.where(after(keys, decode_cursor(cursor, str, int), descending))
+        ordering = [k.desc() if descending else k for k in keys]
+        with session_scope() as db:
+            rows = db.execute(query.order_by(*ordering).limit(limit + 1)).all()
+        seen.extend((r.key, r.id) for r in rows[:limit])
+        if len(rows) <= limit:
+            return seen
+        cursor = encode_cursor(rows[limit - 1].key, rows[limit - 1].id)
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_cover_every_row_once(descending):
+    # Few distinct statuses, so most rows are ordered by the id tiebreak
+    add([f"user{i}@example.com" for i in range(30)], statuses=("pending", "sent", "failed"))
+    seen = pages(Recipient.status, descending, limit=4)
+    assert len(seen) == 30
+    assert len(set(seen)) == 30
+    assert seen == sorted(seen, reverse=descending)
+
+
+def test_prefix_filter():
+    add(["ann@example.com", "anna@example.com", "bob@example.com", "an_x@example.com", "a-z@example.com"])
+    with session_scope() as db:
+        def matching(prefix):
+            query = select(Recipient.email).where(prefix_filter(Recipient.email, prefix))
+            return sorted(db.scalars(query))
+        assert matching("ann") == ["ann@example.com", "anna@example.com"]
+        assert matching("an_") == ["an_x@example.com"]
+        assert matching("a-") == ["a-z@example.com"]
+        assert len(matching("")) == 5
+
+
+def test_prefix_range_is_in_byte_order_on_postgres(monkeypatch):
+    import paging
+    monkeypatch.setattr(paging, "engine", SimpleNamespace(dialect=postgresql.dialect()))
+    sql = str(select(Recipient.id).where(prefix_filter(Recipient.email, "ann")).compile(dialect=postgresql.dialect()))
+    assert sql.count('recipients.email COLLATE "C"') == 2
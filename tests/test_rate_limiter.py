@@ -0,0 +1,52 @@
+import pytest
+from database import session_scope, RateLimitState
+from rate_limiter import AccountRateLimiter, TokenBucket, rate_limit_store
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+LIMITS = {"minute": 2, "hour": 100}
+
+
+def limiter():
+    return AccountRateLimiter("u1", "sender@example.com", LIMITS, store=rate_limit_store)
+
+
+def test_bucket_refills_evenly():
+    bucket = TokenBucket(2, 60, tokens=0, refilled_at=0)
+    assert bucket.wait_time(0) == pytest.approx(30)
+    assert bucket.wait_time(30) == 0
+
+
+def test_levels_survive_a_restart():
+    first = limiter()
+    first.record_send()
+    first.record_send()
+    assert first.delay() > 0
+    assert limiter().delay() > 0
+
+
+def test_saves_keep_one_row_per_window():
+    for _ in range(3):
+        limiter().record_send()
+    with session_scope() as db:
+        windows = sorted(r.window for r in db.query(RateLimitState))
+    assert windows == ["hour", "minute"]
+
+
+def test_parking_survives_a_restart():
+    limiter().park(600)
+    assert limiter().delay() == pytest.approx(600, abs=5)
+    # A send from the same account afterwards keeps the parking
+    other = limiter()
+    other.record_send()
+    assert limiter().delay() == pytest.approx(600, abs=5)
+
+
+def test_parking_survives_a_restart_without_limits():
+    unlimited = lambda: AccountRateLimiter("u1", "sender@example.com", {"minute": 0}, store=rate_limit_store)
+    assert unlimited().delay() == 0
+    unlimited().park(600)
+    assert unlimited().delay() == pytest.approx(600, abs=5)
+    # Limits switched on later start full, still parked
+    assert limiter().buckets["minute"].tokens == 2
+    assert limiter().delay() == pytest.approx(600, abs=5)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+import pytest
+from database import session_scope, CampaignLease, Schedule
+from scheduler import CampaignScheduler, BUSY_RETRY_SECONDS
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+
+class FakeManager:
+    def __init__(self, starts):
+        self.is_running = False
+        self.starts = starts
+
+    def start_process(self, scheduled=False, resume=False):
+        self.resumed = resume
+        return self.starts
+
+
+def due_schedule(recurring="daily"):
+    with session_scope() as db:
+        schedule = Schedule(user_id="u1", name="weekly news", scheduled_time=datetime.now() - timedelta(seconds=1),
+                            recurring=recurring, status="pending")
+        db.add(schedule)
+        db.flush()
+        return schedule.id
+
+
+def trigger(manager, schedule_id):
+    scheduler = CampaignScheduler(lambda user_id: manager)
+    with session_scope() as db:
+        scheduler._trigger_due(db, [schedule_id])
+    with session_scope() as db:
+        rows = [(s.id, s.status) for s in db.query(Schedule).order_by(Schedule.id)]
+    return scheduler, rows
+
+
+def test_started_schedule_completes_and_recurs():
+    schedule_id = due_schedule()
+    scheduler, rows = trigger(FakeManager(starts=True), schedule_id)
+    assert rows[0] == (schedule_id, "completed")
+    assert [status for _, status in rows[1:]] == ["pending"]
+    assert rows[1][0] in scheduler._due
+
+
+def test_refused_start_is_retried_later():
+    schedule_id = due_schedule()
+    scheduler, rows = trigger(FakeManager(starts=False), schedule_id)
+    assert rows == [(schedule_id, "pending")]
+    retry_at = scheduler._due[schedule_id]
+    assert retry_at > datetime.now() + timedelta(seconds=BUSY_RETRY_SECONDS - 5)
+
+
+def lease(user_id, expires_in):
+    with session_scope() as db:
+        db.add(CampaignLease(user_id=user_id, owner=f"{user_id}-worker",
+                             expires_at=datetime.utcnow() + timedelta(seconds=expires_in)))
+
+
+def test_no_sweeps_while_no_campaign_runs():
+    scheduler = CampaignScheduler(lambda user_id: pytest.fail("nothing to resume"))
+    scheduler._reload()
+    assert scheduler._sweep_at is None
+
+
+def test_reload_resumes_lapsed_leases():
+    manager = FakeManager(starts=True)
+    lease("u1", -5)
+    scheduler = CampaignScheduler(lambda user_id: manager)
+    scheduler._reload()
+    assert manager.resumed
+    # A lapsed lease nobody could resume waits for the next reconcile instead of a busy loop
+    assert scheduler._sweep_at is None
+
+
+def test_sweep_is_due_when_a_live_lease_could_lapse():
+    lease("u1", 40)
+    lease("u2", 50)
+    scheduler = CampaignScheduler(lambda user_id: pytest.fail("nothing to resume"))
+    scheduler._reload()
+    assert datetime.now() + timedelta(seconds=35) < scheduler._sweep_at < datetime.now() + timedelta(seconds=45)
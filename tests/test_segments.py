@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import select
+from database import session_scope, Recipient
+from segments import InvalidSegment, MAX_SEGMENT_KEYS, segment_filter, validate
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+PEOPLE = {
+    "ama@example.com": {"city": "Accra", "plan": "pro", "age": 31},
+    "kofi@example.com": {"city": "Kumasi", "plan": "team", "age": 40},
+    "esi@example.com": {"city": "Accra", "plan": "free", "age": 25},
+    "yaw@example.com": {"plan": "pro"},
+}
+
+
+@pytest.fixture
+def people(db_tables):
+    with session_scope() as db:
+        db.add_all(Recipient(user_id="seg-user", email=e, status="pending", data=d) for e, d in PEOPLE.items())
+
+
+def matching(segment):
+    with session_scope() as db:
+        query = select(Recipient.email).where(Recipient.user_id == "seg-user", segment_filter(segment))
+        return sorted(db.scalars(query))
+
+
+@pytest.mark.usefixtures("people")
+@pytest.mark.parametrize("segment, emails", [
+    ({"city": "Accra"}, ["ama@example.com", "esi@example.com"]),
+    ({"city": "Accra", "plan": "pro"}, ["ama@example.com"]),
+    ({"plan": ["pro", "team"]}, ["ama@example.com", "kofi@example.com", "yaw@example.com"]),
+    ({"city": "Accra", "plan": ["free", "team"]}, ["esi@example.com"]),
+    ({"age": 40}, ["kofi@example.com"]),
+    ({"city": "Tamale"}, []),
+])
+def test_segment_filter(segment, emails):
+    assert matching(segment) == emails
+
+
+@pytest.mark.parametrize("segment", [
+    None, {}, [], {"": "x"}, {'a"b': "x"}, {"a\\b": "x"}, {"city": []}, {"city": None},
+    {"city": True}, {"city": {"nested": 1}}, {f"k{i}": "v" for i in range(MAX_SEGMENT_KEYS + 1)},
+])
+def test_invalid_segments(segment):
+    with pytest.raises(InvalidSegment):
+        validate(segment)
+
+
+def test_preview_counts_pending_recipients(client):
+    with session_scope() as db:
+        db.add_all(Recipient(user_id="api-user", email=e, status="pending", data=d) for e, d in PEOPLE.items())
+        db.add(Recipient(user_id="api-user", email="sent@example.com", status="sent", data={"city": "Accra"}))
+    response = client.post("/segments/preview", json={"segment": {"city": "Accra"}})
+    assert response.json() == {"pending": 2, "sample": ["ama@example.com", "esi@example.com"]}
+    assert client.post("/segments/preview", json={"segment": {"city": []}}).status_code == 400
@@ -0,0 +1,117 @@
+import threading
+import time
+import pytest
+from send_engine import SendEngine
+
+
+class Throttle:
+    def __init__(self, wait=0.0):
+        self.wait = wait
+        self.sent = 0
+        self.failed = 0
+
+    def delay(self):
+        return self.wait
+
+    def record_send(self):
+        self.sent += 1
+
+    def record_failure(self):
+        self.failed += 1
+
+
+def engine(configs, send_one, throttles=None, stop_event=None, **kwargs):
+    throttles = throttles if throttles is not None else {}
+    return SendEngine(
+        configs,
+        send_one=send_one,
+        make_throttle=lambda config: throttles.setdefault(config, Throttle()),
+        stop_event=stop_event or threading.Event(),
+        queue_size=2,
+        **kwargs
+    )
+
+
+def test_every_recipient_is_sent_once_across_accounts():
+    sent = []
+    lock = threading.Lock()
+
+    def send_one(config, recipient):
+        with lock:
+            sent.append((config, recipient))
+        time.sleep(0.001)
+        return True
+
+    throttles = {}
+    e = engine(["a", "b", "c"], send_one, throttles)
+    e.run(iter(range(60)))
+    assert sorted(r for _, r in sent) == list(range(60))
+    assert len({c for c, _ in sent}) == 3
+    assert sum(t.sent for t in throttles.values()) == 60
+    assert e.idle()
+    assert not e.working()
+
+
+def test_results_reach_the_throttle_and_errors_are_reported():
+    errors = []
+    results = {0: True, 1: False, 2: None}
+
+    def send_one(config, recipient):
+        if recipient == 3:
+            raise RuntimeError("boom")
+        return results[recipient]
+
+    throttles = {}
+    engine(["a"], send_one, throttles, on_error=lambda c, r, e: errors.append((c, r, str(e)))).run(iter(range(4)))
+    assert (throttles["a"].sent, throttles["a"].failed) == (1, 1)
+    assert errors == [("a", 3, "boom")]
+
+
+def test_an_account_out_of_budget_waits_while_the_others_drain():
+    waits = []
+    throttles = {"slow": Throttle(wait=30)}
+    sent = []
+    e = engine(["slow", "fast"], lambda c, r: sent.append(c) or True, throttles, on_wait=lambda c, d: waits.append((c, d)))
+    started = time.monotonic()
+    e.run(iter(range(10)))
+    # The waiting account notices the list is done instead of sleeping out its delay
+    assert time.monotonic() - started < 5
+    assert sent == ["fast"] * 10
+    assert waits and all(w == ("slow", 30) for w in waits)
+
+
+def test_stop_ends_the_run_without_draining_the_list():
+    stop = threading.Event()
+    sent = []
+
+    def send_one(config, recipient):
+        sent.append(recipient)
+        if len(sent) == 5:
+            stop.set()
+        return True
+
+    def recipients():
+        yield from range(1000)
+
+    e = engine(["a", "b"], send_one, stop_event=stop)
+    e.run(recipients())
+    assert 5 <= len(sent) < 10
+    assert not e.working()
+
+
+def test_producer_stops_when_every_worker_has_died():
+    def make_throttle(config):
+        raise RuntimeError("no throttle")
+
+    produced = []
+
+    def recipients():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    e = SendEngine(["a"], lambda c, r: True, make_throttle, threading.Event(), queue_size=2)
+    with pytest.raises(RuntimeError):
+        e.run(recipients())
+    assert len(produced) < 10
+    assert not e.working()
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+import pytest
+from database import session_scope, Recipient, SendQueueItem
+from send_queue import SendQueue, QUEUED, CLAIMED, RETRY, SENT, FAILED
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+
+@pytest.fixture
+def queue():
+    return SendQueue(claim_seconds=300, max_attempts=3, retry_seconds=60)
+
+
+def add_recipients(*emails, user_id="u1", data=None):
+    with session_scope() as db:
+        rows = [Recipient(user_id=user_id, email=e, status="pending", data=data or {}) for e in emails]
+        db.add_all(rows)
+        db.flush()
+        return [r.id for r in rows]
+
+
+def item(item_id):
+    with session_scope() as db:
+        row = db.get(SendQueueItem, item_id)
+        return row.state, row.attempts
+
+
+def recipient_status(recipient_id):
+    with session_scope() as db:
+        return db.get(Recipient, recipient_id).status
+
+
+def prepared(queue, *emails):
+    add_recipients(*emails)
+    campaign_id, active, resumed, version, replaced = queue.prepare("u1", template_version=1)
+    items = queue.ready_chunk("u1", 0, 100)
+    return campaign_id, items
+
+
+def test_prepare_queues_pending_recipients_once(queue):
+    add_recipients("a@example.com", "b@example.com")
+    campaign_id, active, resumed, version, replaced = queue.prepare("u1", template_version=1)
+    assert (active, resumed, version, replaced) == (2, False, 1, False)
+    again = queue.prepare("u1", template_version=1)
+    assert again[:3] == (campaign_id, 2, True)
+
+
+def test_prepare_replaces_a_run_with_other_settings(queue):
+    add_recipients("a@example.com", data={"plan": "pro"})
+    add_recipients("b@example.com", data={"plan": "free"})
+    first, active, _, _, _ = queue.prepare("u1", segment={"plan": "pro"}, template_version=1)
+    assert active == 1
+    kept = queue.prepare("u1", segment=None, template_version=2, replace=False)
+    assert kept[0] == first and kept[3] == 1
+    second, active, resumed, version, replaced = queue.prepare("u1", template_version=2)
+    assert second != first
+    assert (active, resumed, version, replaced) == (2, False, 2, True)
+
+
+def test_claim_is_exclusive(queue):
+    _, items = prepared(queue, "a@example.com")
+    item_id = items[0].id
+    attempts, message_id = queue.claim(item_id, "owner-1", "<m1@example.com>")
+    assert attempts == 1
+    assert queue.claim(item_id, "owner-2", "<m2@example.com>") is None
+    assert item(item_id) == (CLAIMED, 1)
+    assert queue.ready_chunk("u1", 0, 100) == []
+
+
+def test_lapsed_claim_is_ready_again_with_the_same_message_id(queue):
+    _, items = prepared(queue, "a@example.com")
+    item_id = items[0].id
+    queue.claim(item_id, "owner-1", "<m1@example.com>")
+    with session_scope() as db:
+        db.get(SendQueueItem, item_id).lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    assert queue.claim(item_id, "owner-2", "<m2@example.com>") == (2, "<m1@example.com>")
+
+
+def test_finish_marks_item_and_recipient(queue):
+    _, items = prepared(queue, "a@example.com")
+    item_id, recipient_id = items[0].id, items[0].recipient_id
+    queue.claim(item_id, "owner", "<m@example.com>")
+    queue.finish(item_id, recipient_id, SENT, "sent")
+    assert item(item_id) == (SENT, 1)
+    assert recipient_status(recipient_id) == "sent"
+    # A late outcome from another worker doesn't overwrite it
+    queue.finish(item_id, recipient_id, FAILED, "sent")
+    assert item(item_id)[0] == SENT
+
+
+def test_fail_retries_later_until_max_attempts(queue):
+    _, items = prepared(queue, "a@example.com")
+    item_id, recipient_id = items[0].id, items[0].recipient_id
+    attempts, _ = queue.claim(item_id, "owner", "<m@example.com>")
+    assert queue.fail(item_id, recipient_id, attempts, "451 try later") is False
+    assert item(item_id) == (RETRY, 1)
+    assert queue.claim(item_id, "owner", "<m@example.com>") is None  # not due yet
+    assert queue.next_retry_at("u1") > datetime.utcnow()
+    assert queue.fail(item_id, recipient_id, 3, "451 try later") is True
+    assert item(item_id)[0] == FAILED
+    assert recipient_status(recipient_id) == "failed"
+
+
+def test_defer_is_ready_at_once_and_counts_the_attempt(queue):
+    _, items = prepared(queue, "a@example.com")
+    item_id, recipient_id = items[0].id, items[0].recipient_id
+    for attempt in (1, 2):
+        attempts, _ = queue.claim(item_id, "owner", "<m@example.com>")
+        assert attempts == attempt
+        assert queue.defer(item_id, recipient_id, attempts, "421 throttled") is False
+        assert item(item_id) == (RETRY, attempt)
+    attempts, _ = queue.claim(item_id, "owner", "<m@example.com>")
+    assert queue.defer(item_id, recipient_id, attempts, "421 throttled") is True
+    assert item(item_id) == (FAILED, 3)
+
+
+def test_release_after_finish_is_a_no_op(queue):
+    _, items = prepared(queue, "a@example.com")
+    item_id, recipient_id = items[0].id, items[0].recipient_id
+    queue.claim(item_id, "owner", "<m@example.com>")
+    queue.finish(item_id, recipient_id, SENT, "sent")
+    assert queue.release(item_id, recipient_id, "boom") is False
+    assert item(item_id)[0] == SENT
+
+
+def test_release_counts_a_failed_attempt(queue):
+    _, items = prepared(queue, "a@example.com")
+    item_id, recipient_id = items[0].id, items[0].recipient_id
+    assert queue.release(item_id, recipient_id, "boom") is False
+    assert item(item_id) == (RETRY, 0)
@@ -0,0 +1,55 @@
+import random
+import smtplib
+import pytest
+from smtp_errors import classify, backoff_delay, RETRY, BOUNCE, THROTTLED
+
+
+def refused(code, message):
+    return smtplib.SMTPRecipientsRefused({"to@example.com": (code, message.encode())})
+
+
+@pytest.mark.parametrize("exc, outcome", [
+    (smtplib.SMTPDataError(552, b"5.2.2 Mailbox quota exceeded"), BOUNCE),
+    (smtplib.SMTPDataError(452, b"4.2.2 Mailbox over quota"), RETRY),
+    (refused(550, "5.1.1 User unknown"), BOUNCE),
+    (refused(450, "Mailbox busy"), RETRY),
+    (refused(452, "Too many recipients"), RETRY),
+    (smtplib.SMTPDataError(452, b"4.5.3 Too many recipients"), RETRY),
+    (smtplib.SMTPDataError(550, b"Message rejected as spam"), BOUNCE),
+    (smtplib.SMTPDataError(451, b"Temporary local problem"), RETRY),
+    (smtplib.SMTPServerDisconnected("Connection unexpectedly closed"), RETRY),
+    (TimeoutError(), RETRY),
+])
+def test_recipient_and_message_errors(exc, outcome):
+    assert classify(exc).outcome == outcome
+
+
+@pytest.mark.parametrize("exc", [
+    smtplib.SMTPDataError(421, b"4.7.0 Try again later, closing connection"),
+    smtplib.SMTPDataError(450, b"4.7.28 Rate limit exceeded"),
+    smtplib.SMTPDataError(451, b"Too many messages, slow down"),
+    refused(421, "Service not available"),
+    smtplib.SMTPAuthenticationError(535, b"5.7.8 Username and Password not accepted"),
+    smtplib.SMTPSenderRefused(553, b"Sender address rejected", "me@example.com"),
+])
+def test_account_throttles(exc):
+    failure = classify(exc)
+    assert failure.outcome == THROTTLED
+    assert not failure.daily_limit
+
+
+def test_daily_limit():
+    failure = classify(smtplib.SMTPDataError(550, b"5.4.5 Daily user sending limit exceeded"))
+    assert failure.outcome == THROTTLED
+    assert failure.daily_limit
+
+
+def test_failure_text():
+    assert str(classify(refused(550, "5.1.1 User unknown"))) == "550 5.1.1 User unknown"
+
+
+def test_backoff_grows_and_is_capped():
+    rng = random.Random(1)
+    for attempt, full in [(1, 60), (2, 120), (3, 240), (10, 3600)]:
+        delay = backoff_delay(attempt, 60, 3600, rng)
+        assert full / 2 <= delay <= full
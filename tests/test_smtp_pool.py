@@ -0,0 +1,80 @@
+import smtplib
+import pytest
+from smtp_pool import PooledSMTPSession, SMTPConnectionPool, TrackedSMTP
+
+CONFIG = {"SERVER": "smtp.example.com", "PORT": 587, "EMAIL": "sender@example.com", "PASSWORD": "secret"}
+
+
+class ScriptedSMTP(TrackedSMTP):
+    """Answers 250 to every command, except that it hangs up on drop_at."""
+
+    def __init__(self, drop_at=None):
+        super().__init__()
+        self.drop_at = drop_at
+        self.commands = []
+        self.sent = []
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def has_extn(self, name):
+        return False
+
+    def putcmd(self, cmd, args=""):
+        self.commands.append(cmd.lower())
+        if cmd.lower() == self.drop_at:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+
+    def getreply(self):
+        if self.commands[-1] == "data" and len(self.sent) < self.commands.count("data"):
+            return 354, b"go ahead"
+        return 250, b"ok"
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def noop(self):
+        return 250, b"ok"
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ScriptedPool(SMTPConnectionPool):
+    def __init__(self, *sessions):
+        super().__init__()
+        self.sessions = list(sessions)
+        self.connects = 0
+
+    def _connect(self, config):
+        self.connects += 1
+        return PooledSMTPSession(self.key_for(config), self.sessions.pop(0))
+
+
+def test_disconnect_before_data_retries_on_a_fresh_session():
+    stale, fresh = ScriptedSMTP(drop_at="mail"), ScriptedSMTP()
+    pool = ScriptedPool(stale, fresh)
+    pool.sendmail(CONFIG, "sender@example.com", ["to@example.com"], b"Subject: hi\r\n\r\nhello")
+    assert pool.connects == 2
+    assert fresh.sent
+
+
+def test_disconnect_during_data_is_not_retried():
+    dropped, spare = ScriptedSMTP(drop_at="data"), ScriptedSMTP()
+    pool = ScriptedPool(dropped, spare)
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.sendmail(CONFIG, "sender@example.com", ["to@example.com"], b"Subject: hi\r\n\r\nhello")
+    assert pool.connects == 1
+    assert not spare.commands
+
+
+def test_session_is_reused():
+    session = ScriptedSMTP()
+    pool = ScriptedPool(session)
+    for _ in range(3):
+        pool.sendmail(CONFIG, "sender@example.com", ["to@example.com"], b"Subject: hi\r\n\r\nhello")
+    assert pool.connects == 1
+    assert session.commands.count("data") == 3
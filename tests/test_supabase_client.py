@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+import pytest
+from supabase_client import decode_local, InvalidToken, issue_stream_token, verify_stream_token, STREAM_TOKEN_SECONDS
+
+SECRET = "test-secret"
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def token(claims, secret=SECRET, alg="HS256"):
+    header = b64(json.dumps({"alg": alg, "typ": "JWT"}).encode())
+    payload = b64(json.dumps(claims).encode())
+    signature = hmac.new(secret.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64(signature)}"
+
+
+def claims(**overrides):
+    return {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 3600, **overrides}
+
+
+def test_valid_token():
+    assert decode_local(token(claims()), SECRET)["sub"] == "user-1"
+
+
+def test_expired_token():
+    with pytest.raises(InvalidToken, match="expired"):
+        decode_local(token(claims(exp=int(time.time()) - 3600)), SECRET)
+
+
+def test_expiry_allows_clock_skew():
+    assert decode_local(token(claims(exp=int(time.time()) - 5)), SECRET)
+
+
+@pytest.mark.parametrize("exp", [None, "tomorrow", True])
+def test_token_without_usable_expiry(exp):
+    body = claims()
+    if exp is None:
+        del body["exp"]
+    else:
+        body["exp"] = exp
+    with pytest.raises(InvalidToken, match="no expiry"):
+        decode_local(token(body), SECRET)
+
+
+def test_bad_signature_is_left_to_supabase():
+    assert decode_local(token(claims(), secret="other"), SECRET) is None
+
+
+def test_other_algorithm_is_left_to_supabase():
+    assert decode_local(token(claims(), alg="RS256"), SECRET) is None
+
+
+def test_no_secret_configured():
+    assert decode_local(token(claims()), "") is None
+
+
+def test_wrong_audience():
+    with pytest.raises(InvalidToken, match="audience"):
+        decode_local(token(claims(aud="anon")), SECRET)
+
+
+def test_missing_subject():
+    with pytest.raises(InvalidToken, match="subject"):
+        decode_local(token(claims(sub="")), SECRET)
+
+
+@pytest.mark.parametrize("value", ["", "abc", "a.b", "a.b.c.d", "!!.??.##"])
+def test_malformed(value):
+    with pytest.raises(InvalidToken, match="Malformed"):
+        decode_local(value, SECRET)
+
+
+def test_stream_token():
+    now = time.time()
+    stream_token = issue_stream_token("user-1", now=now)
+    assert verify_stream_token(stream_token, now=now) == "user-1"
+    assert verify_stream_token(stream_token, now=now + STREAM_TOKEN_SECONDS + 1) is None
+    expires, signature, user_id = stream_token.split(".", 2)
+    assert verify_stream_token(f"{expires}.{signature}.user-2", now=now) is None
+    assert verify_stream_token(f"{int(expires) + 3600}.{signature}.{user_id}", now=now) is None
+
+
+@pytest.mark.parametrize("value", ["", "abc", "x.y.z", None, token(claims())])
+def test_malformed_stream_token(value):
+    assert verify_stream_token(value) is None
+
+
+def test_stream_accepts_stream_tokens_only(client):
+    import asyncio
+    import server
+    from fastapi import HTTPException
+    stream_token = client.post("/status/stream-token").json()["token"]
+    assert asyncio.run(server.get_stream_user(token=stream_token, authorization=None)).id == "api-user"
+    # An access token in the URL is refused, so it never has a reason to end up in logs
+    assert client.get("/status/stream", params={"token": token(claims())}).status_code == 401
+    with pytest.raises(HTTPException):
+        asyncio.run(server.get_stream_user(token=None, authorization=None))
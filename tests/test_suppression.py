@@ -0,0 +1,67 @@
+import pytest
+from database import session_scope, Recipient, Unsubscribe
+from suppression import SuppressionList, normalize
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+
+def unsubscribe(user_id, email):
+    with session_scope() as db:
+        db.add(Unsubscribe(user_id=user_id, email=email))
+
+
+def test_normalize():
+    assert normalize("  Ann@Example.COM ") == "ann@example.com"
+    assert normalize(None) == ""
+
+
+def test_contains_is_per_user_and_case_insensitive():
+    unsubscribe("s1", "ann@example.com")
+    suppression = SuppressionList()
+    assert suppression.contains("s1", "ANN@example.com ")
+    assert not suppression.contains("s2", "ann@example.com")
+
+
+def test_set_is_updated_in_place_until_reloaded():
+    suppression = SuppressionList(reload_after=3600)
+    assert not suppression.contains("s1", "bob@example.com")
+    suppression.add("s1", "Bob@example.com")
+    assert suppression.contains("s1", "bob@example.com")
+    suppression.remove("s1", "bob@example.com")
+    assert not suppression.contains("s1", "bob@example.com")
+    # Another instance's change shows up on the next reload
+    unsubscribe("s1", "carol@example.com")
+    assert not suppression.contains("s1", "carol@example.com")
+    suppression.reload_after = 0
+    assert suppression.contains("s1", "carol@example.com")
+
+
+def test_exclude_pending():
+    unsubscribe("s1", "ann@example.com")
+    with session_scope() as db:
+        db.add_all([
+            Recipient(user_id="s1", email="ann@example.com", status="pending"),
+            Recipient(user_id="s1", email="bob@example.com", status="pending"),
+            Recipient(user_id="s2", email="ann@example.com", status="pending"),
+        ])
+    assert SuppressionList().exclude_pending("s1") == 1
+    with session_scope() as db:
+        statuses = {(r.user_id, r.email): r.status for r in db.query(Recipient)}
+    assert statuses == {
+        ("s1", "ann@example.com"): "unsubscribed",
+        ("s1", "bob@example.com"): "pending",
+        ("s2", "ann@example.com"): "pending",
+    }
+
+
+def test_unsubscribe_and_remove_through_the_api(client):
+    page = client.get("/unsubscribe", params={"email": " Dan@Example.com", "uid": "api-user", "cid": "c1"})
+    assert page.status_code == 200
+    client.get("/unsubscribe", params={"email": "dan@example.com", "uid": "api-user"})
+    assert client.get("/unsubscribes").json() == {"unsubscribes": ["dan@example.com"]}
+
+    assert client.post("/unsubscribes/remove", json={"email": "DAN@example.com "}).json() == {"message": "Removed"}
+    assert client.get("/unsubscribes").json() == {"unsubscribes": []}
+    # Not listed (any more): still a success, as before
+    response = client.post("/unsubscribes/remove", json={"email": "dan@example.com"})
+    assert response.status_code == 200
@@ -0,0 +1,85 @@
+import pytest
+from database import session_scope, TemplateVersion
+from template_store import TemplateStore
+
+pytestmark = pytest.mark.usefixtures("db_tables")
+
+
+def test_save_numbers_versions_and_skips_unchanged():
+    store = TemplateStore()
+    assert store.latest("t1") is None
+    first = store.save("t1", "<p>Hi {name}</p>")
+    assert first.version == 1
+    assert store.save("t1", "<p>Hi {name}</p>") == first
+    second = store.save("t1", "<p>Hello {name}</p>")
+    assert second.version == 2
+    assert second.etag != first.etag
+    assert store.latest("t1") == second
+    assert store.get("t1", 1).content == "<p>Hi {name}</p>"
+    assert store.get("t1", 3) is None
+    assert store.latest("t2") is None
+    assert store.compiled("t1", 2).render({"name": "Ann"}) == "<p>Hello Ann</p>"
+
+
+def test_other_instances_see_a_save_at_once():
+    a, b = TemplateStore(), TemplateStore()
+    a.save("t1", "one")
+    assert b.latest("t1").content == "one"
+    a.save("t1", "two")
+    assert b.latest("t1").content == "two"
+
+
+def test_concurrent_save_takes_the_next_number(monkeypatch):
+    a, b = TemplateStore(), TemplateStore()
+    a.save("t1", "one")
+    stale = a.latest("t1")
+    b.save("t1", "two")
+    # a's first attempt still builds on version 1, collides with b's version 2 and goes again
+    seen = [stale, b.latest("t1")]
+    monkeypatch.setattr(a, "latest", lambda user_id: seen.pop(0))
+    assert a.save("t1", "three").version == 3
+    assert seen == []
+
+
+def test_cache_is_bounded():
+    store = TemplateStore(cache_size=2)
+    for content in ("one", "two", "three"):
+        store.save("t1", content)
+    assert len(store._cache) == 2
+    assert store.get("t1", 1).content == "one"
+
+
+def test_legacy_file_is_imported_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "mail_t3.html").write_text("<p>per user</p>", encoding="utf-8")
+    (tmp_path / "mail.html").write_text("<p>shared</p>", encoding="utf-8")
+    store = TemplateStore()
+    assert store.latest("t3") == (1, "<p>per user</p>", store.get("t3", 1).etag)
+    assert store.latest("t4").content == "<p>shared</p>"
+    (tmp_path / "mail_t3.html").unlink()
+    assert store.latest("t3").content == "<p>per user</p>"
+    with session_scope() as db:
+        assert db.query(TemplateVersion).filter(TemplateVersion.user_id == "t3").count() == 1
+
+
+def test_template_endpoints(client, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "template_store", TemplateStore())
+    assert client.get("/template").json() == {"content": "", "version": None}
+    assert client.post("/template", json={"content": "one"}).json()["version"] == 1
+    assert client.post("/template", json={"content": "two"}).json()["version"] == 2
+
+    r = client.get("/template")
+    assert r.json() == {"content": "two", "version": 2}
+    etag = r.headers["ETag"]
+    assert client.get("/template", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/template", headers={"If-None-Match": f'"x", W/{etag}'}).status_code == 304
+
+    old = client.get("/template", params={"version": 1}, headers={"If-None-Match": etag})
+    assert old.status_code == 200
+    assert old.json() == {"content": "one", "version": 1}
+    assert client.get("/template", params={"version": 9}).status_code == 404
+
+    client.post("/template", json={"content": "three"})
+    assert client.get("/template", headers={"If-None-Match": etag}).status_code == 200
+    assert [v["version"] for v in client.get("/template/versions").json()["versions"]] == [3, 2, 1]
@@ -0,0 +1,42 @@
+from urllib.parse import parse_qs, urlsplit
+import pytest
+import tracking
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(tracking, "TRACKING_SECRET", "test-secret")
+
+
+def pixel_params(*args):
+    query = parse_qs(urlsplit(tracking.pixel_url("https://mail.example.com", *args)).query)
+    return {k: v[0] for k, v in query.items()}
+
+
+def test_signed_pixel_verifies_only_for_its_recipient(secret):
+    params = pixel_params("u1", "c1", "a@example.com")
+    assert tracking.verify_pixel("u1", "c1", "a@example.com", params["sig"])
+    assert not tracking.verify_pixel("u1", "c1", "b@example.com", params["sig"])
+    assert not tracking.verify_pixel("u2", "c1", "a@example.com", params["sig"])
+    assert not tracking.verify_pixel("u1", "c1", "a@example.com", "")
+
+
+def test_pixel_signature_is_not_a_link_signature(secret):
+    sig = pixel_params("u1", "c1", "a@example.com")["sig"]
+    assert not tracking.verify_link("u1", "c1", "a@example.com", "", sig)
+
+
+def test_unsigned_pixel_without_a_secret(monkeypatch):
+    monkeypatch.setattr(tracking, "TRACKING_SECRET", "")
+    assert "sig" not in pixel_params("u1", "c1", "a@example.com")
+    assert tracking.verify_pixel("u1", "c1", "a@example.com", "")
+
+
+def test_signed_links(secret):
+    html = '<a href="https://example.com/?a=1&amp;b=2">x</a>'
+    rewritten = tracking.rewrite_links(html, "https://mail.example.com", "u1", "c1", "a@example.com")
+    href = rewritten.split('"')[1].replace("&amp;", "&")
+    params = {k: v[0] for k, v in parse_qs(urlsplit(href).query).items()}
+    assert params["url"] == "https://example.com/?a=1&b=2"
+    assert tracking.verify_link("u1", "c1", "a@example.com", params["url"], params["sig"])
+    assert not tracking.verify_link("u1", "c1", "a@example.com", "https://evil.example.com/", params["sig"])
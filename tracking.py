@@ -0,0 +1,149 @@
+import atexit
+import hashlib
+import hmac
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlencode
+from batch_writer import BatchWriter
+from database import session_scope, upsert_insert, TrackingEvent, CampaignOpen
+import counters
+
+# Signs click-tracking links so /track/click can't be used as an open redirect,
+# and open pixels so opens can't be counted for made-up recipients. Without it,
+# links are left as they are and opens are tracked unsigned.
+TRACKING_SECRET = os.environ.get("TRACKING_SECRET", "")
+
+HREF_RE = re.compile(r'href="(https?://[^"]+)"', re.IGNORECASE)
+
+
+def _link_signature(user_id, campaign_id, email, url):
+    payload = "\n".join((user_id, campaign_id, email, url)).encode("utf-8")
+    return hmac.new(TRACKING_SECRET.encode(), payload, hashlib.sha256).hexdigest()[:32]
+
+
+def verify_link(user_id, campaign_id, email, url, signature):
+    if not TRACKING_SECRET:
+        return False
+    return hmac.compare_digest(_link_signature(user_id, campaign_id, email, url), signature or "")
+
+
+def _pixel_signature(user_id, campaign_id, email):
+    # Its own message shape, so a pixel signature never verifies as a link's
+    payload = "\n".join(("open", user_id, campaign_id, email)).encode("utf-8")
+    return hmac.new(TRACKING_SECRET.encode(), payload, hashlib.sha256).hexdigest()[:32]
+
+
+def verify_pixel(user_id, campaign_id, email, signature):
+    if not TRACKING_SECRET:
+        return True
+    return hmac.compare_digest(_pixel_signature(user_id, campaign_id, email), signature or "")
+
+
+def pixel_url(public_url, user_id, campaign_id, email):
+    params = {"email": email, "uid": user_id, "cid": campaign_id}
+    if TRACKING_SECRET:
+        params["sig"] = _pixel_signature(user_id, campaign_id, email)
+    return f"{public_url}/track/open?" + urlencode(params)
+
+
+def rewrite_links(html, public_url, user_id, campaign_id, email):
+    """Points every absolute link in html at /track/click, which records it and redirects."""
+    if not TRACKING_SECRET:
+        return html
+
+    def tracked(match):
+        url = match.group(1).replace("&amp;", "&")
+        query = urlencode({
+            "email": email, "uid": user_id, "cid": campaign_id, "url": url,
+            "sig": _link_signature(user_id, campaign_id, email, url),
+        })
+        return f'href="{public_url}/track/click?{query.replace("&", "&amp;")}"'
+
+    return HREF_RE.sub(tracked, html)
+
+
+class TrackingWriter(BatchWriter):
+    """
+    Takes open/click events from the tracking endpoints without touching the
+    database: record() only appends to a bounded in-process queue (events past
+    max_pending are dropped and counted, never blocking a request). The
+    BatchWriter thread writes them in batches: one multi-row insert into
+    tracking_events, one insert-if-absent into campaign_opens to find first
+    opens, and one upsert of the per-campaign, per-day totals in campaign_counters.
+    """
+
+    def __init__(self, batch_size=1000, flush_interval=1.0, max_pending=100000):
+        super().__init__(batch_size, flush_interval, max_pending, thread_name="tracking-writer")
+        self._stats_lock = threading.Lock()
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def record(self, kind, user_id, campaign_id, email, user_agent=None):
+        event = {
+            "user_id": user_id,
+            "campaign_id": campaign_id or "",
+            "email": email,
+            "kind": kind,
+            "user_agent": user_agent,
+            "created_at": datetime.utcnow(),
+        }
+        if not self.put(event):
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.received += 1
+        return True
+
+    def _write(self, batch):
+        deltas = defaultdict(Counter)
+        for e in batch:
+            deltas[(e["user_id"], e["campaign_id"], e["created_at"].date())][counters.EVENT_COLUMNS[e["kind"]]] += 1
+
+        # Earliest open in the batch per recipient; the insert keeps only real firsts
+        firsts = {}
+        for e in batch:
+            if e["kind"] == "open":
+                firsts.setdefault((e["user_id"], e["campaign_id"], e["email"]), e)
+
+        try:
+            with session_scope() as db:
+                db.execute(TrackingEvent.__table__.insert(), batch)
+                if firsts:
+                    stmt = upsert_insert(CampaignOpen.__table__).on_conflict_do_nothing().returning(
+                        CampaignOpen.user_id, CampaignOpen.campaign_id, CampaignOpen.email)
+                    inserted = db.execute(stmt, [
+                        {"user_id": u, "campaign_id": c, "email": m, "first_opened_at": e["created_at"]}
+                        for (u, c, m), e in firsts.items()
+                    ]).all()
+                    for row in inserted:
+                        e = firsts[tuple(row)]
+                        deltas[(e["user_id"], e["campaign_id"], e["created_at"].date())]["unique_opens"] += 1
+                counters.increment(db, deltas)
+        except Exception as e:
+            print(f"Writing tracking events failed ({len(batch)} dropped): {e}")
+            with self._stats_lock:
+                self.dropped += len(batch)
+            return
+        with self._stats_lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "received": self.received,
+                "written": self.written,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "pending": self.pending(),
+            }
+
+
+tracking = TrackingWriter()
+atexit.register(tracking.shutdown)